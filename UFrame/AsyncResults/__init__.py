@@ -0,0 +1,536 @@
+"""
+Download manager for UFrame asynchronous request results.  Stream engine writes
+the NetCDF files for each asynchronous request to a directory on an Apache web
+server (the non-thredds allURLs entry of the request response) and writes a
+status.txt file to the directory once the request has completed.  Result
+directories are polled until complete, the Apache directory listings are walked
+to find the result files and the files are downloaded concurrently, streamed to
+disk in chunks.  Partially downloaded files are resumed with HTTP range requests
+and files that are already complete are skipped.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import heapq
+import random
+import datetime
+import itertools
+import requests
+try:
+    from urlparse import urljoin, urlparse
+    from urllib import unquote
+except ImportError:
+    from urllib.parse import urljoin, urlparse, unquote
+
+from UFrame.Transport import UFrameTransport
+from UFrame.Dispatch import RequestDispatcher
+
+# File written to the result directory when the request has completed
+ASYNC_STATUS_FILE = 'status.txt'
+# Extension of partially downloaded files
+PARTIAL_EXTENSION = '.part'
+# Default number of bytes written to disk at a time
+DEFAULT_CHUNK_SIZE = 1048576
+
+HTTP_STATUS_OK = 200
+HTTP_STATUS_PARTIAL_CONTENT = 206
+HTTP_STATUS_RANGE_NOT_SATISFIABLE = 416
+HTTP_STATUS_NOT_FOUND = 404
+
+# Request the files unencoded, so that the bytes written to disk are the bytes
+# counted by the Content-Length and Content-Range headers.  requests decodes
+# gzip and deflate content encodings by default.
+_download_headers = {'Accept-Encoding' : 'identity'}
+
+_href_regexp = re.compile(r'<a\s[^>]*href\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+_content_range_regexp = re.compile(r'^bytes\s+(\d+)-(\d+)/(\d+|\*)$')
+
+# Sequence number used to name responses without a request UUID
+_response_sequence = itertools.count()
+
+def async_result_destination(url, root=None, user=None, prefix=None):
+    '''Return the local directory for the asynchronous result url.  The default
+    destination is root/user/product, where user and product are the last 2
+    components of the url, ie:
+
+    https://opendap.oceanobservatories.org/async_results/fujj/20160816T045513-CE05MOAS-GL311-05-CTDGVM000-telemetered-ctdgv_m_glider_instrument
+
+    is written to:
+
+    root/fujj/20160816T045513-CE05MOAS-GL311-05-CTDGVM000-telemetered-ctdgv_m_glider_instrument
+
+    Parameters:
+        url: asynchronous result directory url
+        root: root directory (Default is the current working directory)
+        user: alternate user directory name
+        prefix: alternate product directory name
+    '''
+
+    tokens = url.rstrip('/').split('/')
+
+    return os.path.join(os.path.realpath(root or os.curdir),
+        user or unquote(tokens[-2]),
+        prefix or unquote(tokens[-1]))
+
+def async_request_file_name(response):
+    '''Return the JSON (*.request.json) file name send_async_requests.py writes
+    the asynchronous request response to.  Concurrent requests for the same
+    stream may complete within the same second, so the name contains the
+    completion time, in microseconds, and the UFrame request UUID or, if the
+    response does not contain one, a sequence number.'''
+
+    request_id = None
+    if isinstance(response['response'], dict):
+        request_id = response['response'].get('requestUUID')
+    if not request_id:
+        request_id = '{:06d}'.format(next(_response_sequence))
+
+    return '{:s}-{:s}-{:s}.request.json'.format(response['stream'],
+        datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S.%f'),
+        request_id)
+
+def load_async_request(json_file):
+    '''Return the asynchronous request job for a saved send_async_requests.py
+    response (*.request.json) file or None if the file does not contain a
+    successful asynchronous request response.  The job is a dictionary containing
+    the json_file, stream, requestUrl and the asynchronous result directory url.'''
+
+    try:
+        with open(json_file, 'r') as fid:
+            response = json.load(fid)
+    except (IOError, ValueError) as e:
+        sys.stderr.write('{:s}: {:s}\n'.format(json_file, e))
+        return None
+
+    if type(response) != dict or type(response.get('response')) != dict:
+        sys.stderr.write('Invalid JSON response object: {:s}\n'.format(json_file))
+        return None
+
+    # The async result directory is the url that does not contain 'thredds'
+    async_urls = [url for url in response['response'].get('allURLs', []) if url.find('thredds') == -1]
+    if not async_urls:
+        sys.stderr.write('No async result URL found: {:s}\n'.format(json_file))
+        return None
+
+    return {'json_file' : json_file,
+        'stream' : response.get('stream'),
+        'requestUrl' : response.get('requestUrl'),
+        'url' : async_urls[0]}
+
+class AsyncRequestPoller(object):
+    '''Poll the status files of submitted asynchronous requests until the requests
+    have completed.  Each request is checked with a single HEAD request for its
+    status.txt file.  The interval between checks of a request that has not
+    completed grows exponentially, with random jitter so that checks for requests
+    submitted together are spread out, and grows faster while the server is
+    returning errors.  The number of checks in flight is capped for all requests.
+
+    Parameters:
+        concurrency: maximum number of status checks in flight (Default is 4)
+        initial_interval: number of seconds between the first and second checks
+            of each request (Default is 30 seconds)
+        max_interval: maximum number of seconds between checks of each request
+            (Default is 900 seconds)
+        backoff: factor the check interval is multiplied by after each check
+            (Default is 2)
+        rate_limit: optional maximum number of checks per second sent to any
+            single host
+        timeout: request timeout, in seconds (Default is 120 seconds)
+        transport: optional UFrame.Transport.UFrameTransport used to send all
+            requests
+    '''
+
+    def __init__(self, concurrency=4, initial_interval=30, max_interval=900, backoff=2, rate_limit=None, timeout=120, transport=None):
+
+        if concurrency < 1:
+            raise ValueError('concurrency must be a positive integer')
+
+        self._concurrency = concurrency
+        self._initial_interval = initial_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._rate_limit = rate_limit
+        self._transport = transport or UFrameTransport(timeout=timeout, pool_maxsize=concurrency)
+        self._pending = {}
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    @property
+    def transport(self):
+        return self._transport
+
+    @property
+    def pending(self):
+        '''Jobs that had not completed when the last poll returned'''
+        return [job for n in sorted(self._pending.keys()) for job in self._pending[n]]
+
+    def check(self, url):
+        '''Return True if the request writing to the asynchronous result directory
+        url has completed, False if it has not or None if the status could not be
+        determined'''
+
+        try:
+            r = self._transport.head(urljoin(_directory_url(url), ASYNC_STATUS_FILE), allow_redirects=True)
+        except requests.RequestException as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return None
+
+        if r.status_code == HTTP_STATUS_OK:
+            return True
+        elif r.status_code == HTTP_STATUS_NOT_FOUND:
+            return False
+
+        return None
+
+    def poll(self, jobs, callback=None, timeout=None):
+        '''Check each job until the request has completed and yield each job as
+        soon as it completes.  Jobs writing to the same result directory are checked
+        once and all of them are yielded when it completes.  Completed jobs are
+        updated with the number of status checks and the completion time.  Jobs
+        that have not completed after timeout seconds are available from the
+        pending property.
+
+        Parameters:
+            jobs: list of job dictionaries containing the asynchronous result
+                directory url (see load_async_request)
+            callback: optional function called with each completed job
+            timeout: maximum number of seconds to poll
+        '''
+
+        start_time = time.time()
+
+        # Check every job immediately, in submission order.  Jobs writing to the
+        # same result directory are only checked once, using the first job
+        schedule = []
+        url_jobs = {}
+        for job in jobs:
+            job['checks'] = 0
+            job['interval'] = self._initial_interval
+            if job['url'] in url_jobs:
+                url_jobs[job['url']].append(job)
+                continue
+            url_jobs[job['url']] = [job]
+            heapq.heappush(schedule, (start_time, len(schedule), job))
+
+        self._pending = {n:url_jobs[job['url']] for (t, n, job) in schedule}
+
+        dispatcher = RequestDispatcher(self._check_job,
+            concurrency=self._concurrency,
+            rate_limit=self._rate_limit)
+
+        while schedule:
+
+            now = time.time()
+            if timeout is not None and now - start_time >= timeout:
+                break
+
+            # Wait for the next check
+            if schedule[0][0] > now:
+                delay = schedule[0][0] - now
+                if timeout is not None:
+                    delay = min(delay, start_time + timeout - now)
+                time.sleep(delay)
+                continue
+
+            due = {}
+            while schedule and schedule[0][0] <= now:
+                (t, n, job) = heapq.heappop(schedule)
+                due[job['url']] = (n, job)
+
+            for (url, status) in dispatcher.dispatch(list(due.keys())):
+                (n, job) = due[url]
+                job['checks'] += 1
+
+                if status:
+                    completed = datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+                    for completed_job in self._pending.pop(n):
+                        completed_job['checks'] = job['checks']
+                        completed_job['completed'] = completed
+                        if callback:
+                            callback(completed_job)
+                        yield completed_job
+                    continue
+
+                # Back off faster while the server is returning errors
+                backoff = self._backoff
+                if status is None:
+                    backoff = self._backoff ** 2
+
+                interval = job['interval']
+                job['interval'] = min(interval * backoff, self._max_interval)
+                heapq.heappush(schedule, (time.time() + interval * random.uniform(0.8, 1.2), n, job))
+
+    def _check_job(self, url):
+
+        return (url, self.check(url))
+
+    def __repr__(self):
+        return '<AsyncRequestPoller(concurrency={:d}, max_interval={:.0f})>'.format(self._concurrency, self._max_interval)
+
+class AsyncResultDownloader(object):
+    '''Poll for and download the files created by UFrame asynchronous requests
+
+    Parameters:
+        concurrency: maximum number of files downloaded at once (Default is 4)
+        chunk_size: number of bytes written to disk at a time (Default is 1 MB)
+        timeout: request timeout, in seconds (Default is 120 seconds)
+        force: download all files, even if they have already been downloaded
+            (Default is False)
+        transport: optional UFrame.Transport.UFrameTransport used to send all
+            requests
+    '''
+
+    def __init__(self, concurrency=4, chunk_size=DEFAULT_CHUNK_SIZE, timeout=120, force=False, transport=None):
+
+        if concurrency < 1:
+            raise ValueError('concurrency must be a positive integer')
+
+        self._concurrency = concurrency
+        self._chunk_size = chunk_size
+        self._force = force
+        self._transport = transport or UFrameTransport(timeout=timeout, pool_maxsize=concurrency)
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    @property
+    def transport(self):
+        return self._transport
+
+    def is_complete(self, url):
+        '''Return True if the request writing to the asynchronous result directory
+        url has completed'''
+
+        try:
+            r = self._transport.head(urljoin(_directory_url(url), ASYNC_STATUS_FILE), allow_redirects=True)
+        except requests.RequestException as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return False
+
+        return r.status_code == HTTP_STATUS_OK
+
+    def wait(self, url, interval=30, timeout=None):
+        '''Poll the asynchronous result directory url every interval seconds until
+        the request has completed.  Returns False if the request has not completed
+        after timeout seconds'''
+
+        start_time = time.time()
+        while not self.is_complete(url):
+            if timeout is not None and time.time() - start_time + interval > timeout:
+                return False
+            time.sleep(interval)
+
+        return True
+
+    def list_files(self, url):
+        '''Walk the Apache directory listing of the asynchronous result directory
+        url and return a list of (file_url, relative_path) tuples for all files in
+        the directory and its sub-directories'''
+
+        url = _directory_url(url)
+
+        files = []
+        directories = [url]
+        while directories:
+            directory = directories.pop(0)
+
+            try:
+                r = self._transport.get(directory, retry_reads=True)
+            except requests.RequestException as e:
+                sys.stderr.write('{:s}\n'.format(e))
+                continue
+
+            if r.status_code != HTTP_STATUS_OK:
+                sys.stderr.write('Failed to list {:s}: {:s}\n'.format(directory, r.reason))
+                continue
+
+            for href in _href_regexp.findall(r.text):
+                # Skip column sorting links, parent directories and links to
+                # other hosts
+                if href.startswith('?') or href.startswith('#'):
+                    continue
+                link = urljoin(directory, href).split('?')[0].split('#')[0]
+                if not link.startswith(url) or link == directory or len(link) <= len(directory):
+                    continue
+
+                if link.endswith('/'):
+                    if link not in directories:
+                        directories.append(link)
+                    continue
+
+                if os.path.basename(urlparse(link).path).startswith('index.'):
+                    continue
+
+                files.append((link, unquote(link[len(url):])))
+
+        return files
+
+    def download_file(self, url, path):
+        '''Download url to path.  The file is written to path.part and renamed once
+        complete, so that an interrupted download is resumed from the end of the
+        partial file.  Returns a dictionary containing the url, path, status
+        (downloaded, skipped or failed), number of bytes received and reason for
+        any failure.'''
+
+        result = {'url' : url,
+            'path' : path,
+            'status' : 'failed',
+            'bytes' : 0,
+            'reason' : None}
+
+        partial_path = path + PARTIAL_EXTENSION
+
+        try:
+            if os.path.isfile(path) and not self._force:
+                size = self._remote_size(url)
+                if size is not None and os.path.getsize(path) == size:
+                    result['status'] = 'skipped'
+                    return result
+
+            destination = os.path.dirname(path)
+            if destination and not os.path.isdir(destination):
+                try:
+                    os.makedirs(destination)
+                except OSError:
+                    # Created by another download
+                    if not os.path.isdir(destination):
+                        raise
+
+            offset = 0
+            if os.path.isfile(partial_path) and not self._force:
+                offset = os.path.getsize(partial_path)
+
+            headers = dict(_download_headers)
+            if offset:
+                headers['Range'] = 'bytes={:d}-'.format(offset)
+
+            r = self._transport.get(url, headers=headers, stream=True)
+            try:
+                if r.status_code == HTTP_STATUS_RANGE_NOT_SATISFIABLE and offset:
+                    # The partial file already contains the entire file
+                    size = self._remote_size(url)
+                    if size != offset:
+                        result['reason'] = 'Partial file is larger than {:s}'.format(url)
+                        return result
+                    os.rename(partial_path, path)
+                    result['status'] = 'downloaded'
+                    return result
+
+                if r.status_code == HTTP_STATUS_PARTIAL_CONTENT:
+                    mode = 'ab'
+                    size = _content_range_size(r.headers.get('Content-Range'), offset)
+                    if size is False:
+                        result['reason'] = 'Invalid Content-Range: {:s}'.format(str(r.headers.get('Content-Range')))
+                        return result
+                elif r.status_code == HTTP_STATUS_OK:
+                    # Server does not support range requests
+                    mode = 'wb'
+                    offset = 0
+                    size = _content_length(r.headers.get('Content-Length'))
+                else:
+                    result['reason'] = '{:d} {:s}'.format(r.status_code, r.reason)
+                    return result
+
+                with open(partial_path, mode) as fid:
+                    for chunk in r.iter_content(self._chunk_size):
+                        fid.write(chunk)
+                        result['bytes'] += len(chunk)
+            finally:
+                r.close()
+
+            # Verify the file is complete before renaming it
+            if size is not None and os.path.getsize(partial_path) != size:
+                result['reason'] = 'Incomplete download: {:d} of {:d} bytes'.format(os.path.getsize(partial_path), size)
+                return result
+
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(partial_path, path)
+
+        except (requests.RequestException, IOError, OSError) as e:
+            result['reason'] = str(e)
+            return result
+
+        result['status'] = 'downloaded'
+
+        return result
+
+    def download(self, urls, destination=None, user=None, prefix=None, callback=None):
+        '''Download the files in all asynchronous result directory urls, using up
+        to concurrency simultaneous downloads, and yield the result of each file
+        download as it completes (see download_file).
+
+        Parameters:
+            urls: list of asynchronous result directory urls
+            destination: root directory for all downloads.  Files for each url are
+                written to destination/user/product (see async_result_destination)
+            user: alternate user directory name
+            prefix: alternate product directory name
+            callback: optional function called with each file download result
+        '''
+
+        paths = {}
+        for url in urls:
+            result_destination = async_result_destination(url, root=destination, user=user, prefix=prefix)
+            for (file_url, relative_path) in self.list_files(url):
+                paths[file_url] = os.path.join(result_destination, *relative_path.split('/'))
+
+        if self._concurrency == 1:
+            for file_url in sorted(paths.keys()):
+                result = self.download_file(file_url, paths[file_url])
+                if callback:
+                    callback(result)
+                yield result
+            return
+
+        dispatcher = RequestDispatcher(lambda file_url: self.download_file(file_url, paths[file_url]),
+            concurrency=self._concurrency)
+
+        for result in dispatcher.dispatch(sorted(paths.keys()), callback=callback):
+            yield result
+
+    def _remote_size(self, url):
+
+        r = self._transport.head(url, headers=_download_headers, allow_redirects=True)
+        if r.status_code != HTTP_STATUS_OK:
+            return None
+
+        return _content_length(r.headers.get('Content-Length'))
+
+    def __repr__(self):
+        return '<AsyncResultDownloader(concurrency={:d})>'.format(self._concurrency)
+
+def _directory_url(url):
+
+    url = url.strip()
+    if not url.endswith('/'):
+        url += '/'
+
+    return url
+
+def _content_length(value):
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _content_range_size(value, offset):
+    '''Return the total file size from the Content-Range header of a partial
+    response, None if it is unknown or False if the range does not begin at
+    offset'''
+
+    match = _content_range_regexp.match((value or '').strip())
+    if not match or int(match.group(1)) != offset:
+        return False
+
+    if match.group(3) == '*':
+        return None
+
+    return int(match.group(3))
@@ -0,0 +1,503 @@
+"""
+Local, on-disk cache of UFrame table of contents (TOC) responses.  Responses are
+keyed by the TOC url of the UFrame instance and stored along with the ETag and
+Last-Modified validators returned by the server so that stale entries can be
+revalidated with a conditional request instead of downloading the full TOC.
+New responses may be written with a TocCacheWriter while they are being parsed
+and are only added to the cache once they have been parsed.
+
+Asset management deployment events are cached separately, keyed by the asset
+management url of the UFrame instance and the reference designator queried.
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+
+# Default number of seconds a cached TOC is used without revalidation
+DEFAULT_TOC_TTL = 3600
+# Default number of seconds cached deployment events are used before they are
+# fetched again
+DEFAULT_DEPLOYMENT_TTL = 86400
+
+_ref_des_regexp = re.compile(r'^[\w-]+$')
+
+def default_cache_dir():
+    '''Return the default cache location, which is taken from the UFRAME_CACHE_DIR
+    environment variable, if set, or ~/.uframe/cache'''
+
+    cache_dir = os.getenv('UFRAME_CACHE_DIR')
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.uframe', 'cache')
+
+    return cache_dir
+
+class TocCache(object):
+    '''On-disk cache of UFrame table of contents responses
+
+    Parameters:
+        cache_dir: cache location (Default is taken from the UFRAME_CACHE_DIR
+            environment variable or ~/.uframe/cache)
+        ttl: number of seconds a cached TOC is used without revalidating it
+            with the server (Default is 3600 seconds)
+    '''
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_TOC_TTL):
+
+        if not cache_dir:
+            cache_dir = default_cache_dir()
+
+        self._cache_dir = os.path.join(cache_dir, 'toc')
+        self._ttl = ttl
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def ttl(self):
+        return self._ttl
+    @ttl.setter
+    def ttl(self, value):
+        self._ttl = value
+
+    def body_path(self, toc_url):
+        '''Return the location of the cached TOC response body for toc_url'''
+
+        return os.path.join(self._cache_dir, '{:s}.json'.format(self._key(toc_url)))
+
+    def meta_path(self, toc_url):
+        '''Return the location of the cached TOC metadata for toc_url'''
+
+        return os.path.join(self._cache_dir, '{:s}.meta.json'.format(self._key(toc_url)))
+
+    def snapshot_path(self, toc_url):
+        '''Return the location of the derived index snapshot for toc_url'''
+
+        return os.path.join(self._cache_dir, '{:s}.snapshot'.format(self._key(toc_url)))
+
+    def signature(self, toc_url):
+        '''Return the [size, modification time] of the cached TOC response body for
+        toc_url, which changes every time a new response is stored, or None if
+        toc_url has not been cached'''
+
+        body_file = self.body_path(toc_url)
+        if not os.path.isfile(body_file):
+            return None
+
+        stat = os.stat(body_file)
+
+        return [stat.st_size, stat.st_mtime]
+
+    def metadata(self, toc_url):
+        '''Return the cache metadata (url, etag, last_modified, fetched) for toc_url
+        or None if toc_url has not been cached'''
+
+        meta_file = self.meta_path(toc_url)
+        if not os.path.isfile(meta_file) or not os.path.isfile(self.body_path(toc_url)):
+            return None
+
+        try:
+            with open(meta_file, 'r') as fid:
+                meta = json.load(fid)
+        except (IOError, ValueError):
+            return None
+
+        if meta.get('url') != toc_url:
+            return None
+
+        return meta
+
+    def is_fresh(self, toc_url):
+        '''Return True if toc_url is cached and the entry is younger than the ttl'''
+
+        meta = self.metadata(toc_url)
+        if not meta:
+            return False
+
+        return (time.time() - meta['fetched']) < self._ttl
+
+    def validators(self, toc_url):
+        '''Return the conditional request headers (If-None-Match, If-Modified-Since)
+        for revalidating the cached toc_url response'''
+
+        headers = {}
+
+        meta = self.metadata(toc_url)
+        if not meta:
+            return headers
+
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        return headers
+
+    def load(self, toc_url):
+        '''Return the decoded cached TOC response for toc_url or None if it is not
+        cached or cannot be decoded'''
+
+        if not self.metadata(toc_url):
+            return None
+
+        try:
+            with open(self.body_path(toc_url), 'rb') as fid:
+                return json.load(fid)
+        except (IOError, ValueError):
+            return None
+
+    def iter_body(self, toc_url, chunk_size=65536):
+        '''Yield the cached raw TOC response body for toc_url in chunk_size byte
+        chunks'''
+
+        with open(self.body_path(toc_url), 'rb') as fid:
+            while True:
+                chunk = fid.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def store(self, toc_url, body, etag=None, last_modified=None):
+        '''Write the raw TOC response body and validators for toc_url to the cache.
+        body may be a byte string or an iterable of byte string chunks, which are
+        written as they are received.  Returns True if the entry was written'''
+
+        if isinstance(body, bytes):
+            body = [body]
+
+        try:
+            if not os.path.isdir(self._cache_dir):
+                os.makedirs(self._cache_dir)
+
+            self._write(self.body_path(toc_url), body)
+            self._write_meta(toc_url, etag, last_modified)
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def writer(self, toc_url, etag=None, last_modified=None):
+        '''Return a TocCacheWriter writing a new toc_url response body to the cache
+        as it is received.  The cached entry is only replaced once the writer is
+        committed.'''
+
+        return TocCacheWriter(self, toc_url, etag=etag, last_modified=last_modified)
+
+    def touch(self, toc_url):
+        '''Reset the fetch time of the cached toc_url entry after a successful
+        revalidation (HTTP 304 Not Modified)'''
+
+        meta = self.metadata(toc_url)
+        if not meta:
+            return False
+
+        try:
+            self._write_meta(toc_url, meta.get('etag'), meta.get('last_modified'))
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def clear(self, toc_url=None):
+        '''Remove the cached entry for toc_url or all cached entries if toc_url is
+        not specified'''
+
+        if not os.path.isdir(self._cache_dir):
+            return
+
+        if toc_url:
+            cached_files = [self.body_path(toc_url),
+                self.meta_path(toc_url),
+                self.snapshot_path(toc_url)]
+        else:
+            cached_files = [os.path.join(self._cache_dir, f) for f in os.listdir(self._cache_dir)]
+
+        for cached_file in cached_files:
+            if os.path.isfile(cached_file):
+                os.remove(cached_file)
+
+    def _write_meta(self, toc_url, etag, last_modified):
+
+        meta = {'url' : toc_url,
+            'etag' : etag,
+            'last_modified' : last_modified,
+            'fetched' : time.time()}
+
+        self._write(self.meta_path(toc_url), [json.dumps(meta).encode('utf-8')])
+
+    def _write(self, path, chunks):
+
+        _write_atomic(path, chunks)
+
+    def _key(self, toc_url):
+
+        return hashlib.sha1(toc_url.encode('utf-8')).hexdigest()
+
+    def __repr__(self):
+        return '<TocCache(cache_dir={:s}, ttl={:d})>'.format(self._cache_dir, int(self._ttl))
+
+class TocCacheWriter(object):
+    '''Writes a TOC response body to a temporary file as its chunks are received,
+    so that the response can be parsed and cached in a single pass.  The cached
+    entry is replaced when the writer is committed and left unchanged if it is
+    discarded.  Write errors disable the writer instead of interrupting the
+    response.
+
+    Parameters:
+        cache: TocCache instance
+        toc_url: table of contents url the response was received from
+        etag: ETag response header
+        last_modified: Last-Modified response header
+    '''
+
+    def __init__(self, cache, toc_url, etag=None, last_modified=None):
+
+        self._cache = cache
+        self._toc_url = toc_url
+        self._etag = etag
+        self._last_modified = last_modified
+
+        self._path = cache.body_path(toc_url)
+        self._tmp_path = '{:s}.{:d}.tmp'.format(self._path, os.getpid())
+        self._fid = None
+        self._failed = False
+
+    @property
+    def failed(self):
+        return self._failed
+
+    def iter_chunks(self, chunks):
+        '''Generator yielding each of the byte chunks after it is written'''
+
+        for chunk in chunks:
+            self.write(chunk)
+            yield chunk
+
+    def write(self, chunk):
+
+        if self._failed:
+            return
+
+        try:
+            if self._fid is None:
+                if not os.path.isdir(self._cache.cache_dir):
+                    os.makedirs(self._cache.cache_dir)
+                self._fid = open(self._tmp_path, 'wb')
+            self._fid.write(chunk)
+        except (IOError, OSError):
+            self.discard()
+            self._failed = True
+
+    def commit(self):
+        '''Replace the cached entry with the written response body and validators.
+        Returns True if the entry was written'''
+
+        # Empty response body
+        if self._fid is None:
+            self.write(b'')
+
+        if self._failed:
+            return False
+
+        try:
+            self._fid.close()
+            self._fid = None
+            _replace(self._tmp_path, self._path)
+            self._cache._write_meta(self._toc_url, self._etag, self._last_modified)
+        except (IOError, OSError):
+            self.discard()
+            self._failed = True
+            return False
+
+        return True
+
+    def discard(self):
+        '''Remove the written response body, leaving the cached entry unchanged'''
+
+        if self._fid is not None:
+            self._fid.close()
+            self._fid = None
+
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def __repr__(self):
+        return '<TocCacheWriter(path={:s})>'.format(self._path)
+
+class DeploymentEventCache(object):
+    '''On-disk cache of UFrame asset management deployment events.  Entries are
+    keyed by the asset management url of the UFrame instance and the reference
+    designator queried and are also kept in memory once read, so repeated lookups
+    do not read the disk.
+
+    Parameters:
+        cache_dir: cache location (Default is taken from the UFRAME_CACHE_DIR
+            environment variable or ~/.uframe/cache)
+        ttl: number of seconds cached events are used before they are fetched
+            again (Default is 86400 seconds)
+    '''
+
+    def __init__(self, cache_dir=None, ttl=DEFAULT_DEPLOYMENT_TTL):
+
+        if not cache_dir:
+            cache_dir = default_cache_dir()
+
+        self._cache_dir = os.path.join(cache_dir, 'deployments')
+        self._ttl = ttl
+        # (assets_url, ref_des) to entry
+        self._entries = {}
+
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
+    @property
+    def ttl(self):
+        return self._ttl
+    @ttl.setter
+    def ttl(self, value):
+        self._ttl = value
+
+    def entry_path(self, assets_url, ref_des):
+        '''Return the location of the cached deployment events for ref_des from
+        the asset management instance at assets_url'''
+
+        key = ref_des
+        if not _ref_des_regexp.match(ref_des):
+            key = hashlib.sha1(ref_des.encode('utf-8')).hexdigest()
+
+        return os.path.join(self._cache_dir,
+            hashlib.sha1(assets_url.encode('utf-8')).hexdigest(),
+            '{:s}.json'.format(key))
+
+    def is_fresh(self, assets_url, ref_des):
+        '''Return True if the events for ref_des are cached and the entry is
+        younger than the ttl'''
+
+        entry = self._entry(assets_url, ref_des)
+        if not entry:
+            return False
+
+        return (time.time() - entry['fetched']) < self._ttl
+
+    def fetched(self, assets_url, ref_des):
+        '''Return the unix time the events for ref_des were fetched or None if
+        they have not been cached'''
+
+        entry = self._entry(assets_url, ref_des)
+        if not entry:
+            return None
+
+        return entry['fetched']
+
+    def load(self, assets_url, ref_des, expired=False):
+        '''Return the cached deployment events for ref_des or None if they are not
+        cached or, unless expired is True, the entry is older than the ttl'''
+
+        entry = self._entry(assets_url, ref_des)
+        if not entry:
+            return None
+
+        if not expired and (time.time() - entry['fetched']) >= self._ttl:
+            return None
+
+        return entry['events']
+
+    def store(self, assets_url, ref_des, events):
+        '''Write the deployment events for ref_des to the cache.  Returns True if
+        the entry was written'''
+
+        entry = {'url' : assets_url,
+            'ref_des' : ref_des,
+            'fetched' : time.time(),
+            'events' : events}
+
+        self._entries[(assets_url, ref_des)] = entry
+
+        path = self.entry_path(assets_url, ref_des)
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+
+            _write_atomic(path, [json.dumps(entry).encode('utf-8')])
+        except (IOError, OSError):
+            return False
+
+        return True
+
+    def clear(self, assets_url=None, ref_des=None):
+        '''Remove the cached entry for ref_des, all entries for assets_url or all
+        cached entries if neither is specified'''
+
+        if ref_des and assets_url:
+            self._entries.pop((assets_url, ref_des), None)
+            cached_files = [self.entry_path(assets_url, ref_des)]
+        else:
+            self._entries = {k:v for (k, v) in self._entries.items() if assets_url and k[0] != assets_url}
+            if assets_url:
+                cached_dirs = [os.path.dirname(self.entry_path(assets_url, 'x'))]
+            elif os.path.isdir(self._cache_dir):
+                cached_dirs = [os.path.join(self._cache_dir, d) for d in os.listdir(self._cache_dir)]
+            else:
+                cached_dirs = []
+
+            cached_files = []
+            for cached_dir in cached_dirs:
+                if os.path.isdir(cached_dir):
+                    cached_files.extend([os.path.join(cached_dir, f) for f in os.listdir(cached_dir)])
+
+        for cached_file in cached_files:
+            if os.path.isfile(cached_file):
+                os.remove(cached_file)
+
+    def _entry(self, assets_url, ref_des):
+
+        entry = self._entries.get((assets_url, ref_des))
+        if entry:
+            return entry
+
+        path = self.entry_path(assets_url, ref_des)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            with open(path, 'r') as fid:
+                entry = json.load(fid)
+        except (IOError, ValueError):
+            return None
+
+        if entry.get('url') != assets_url or entry.get('ref_des') != ref_des:
+            return None
+
+        self._entries[(assets_url, ref_des)] = entry
+
+        return entry
+
+    def __repr__(self):
+        return '<DeploymentEventCache(cache_dir={:s}, ttl={:d})>'.format(self._cache_dir, int(self._ttl))
+
+def _write_atomic(path, chunks):
+
+    # Write to a temporary file and rename so that concurrent readers never see
+    # a partially written entry
+    tmp_path = '{:s}.{:d}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as fid:
+            for chunk in chunks:
+                fid.write(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    _replace(tmp_path, path)
+
+def _replace(tmp_path, path):
+
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
@@ -0,0 +1,168 @@
+"""
+Columnar, NumPy-backed table of the time coverage of every stream in the UFrame
+table of contents.  Each row is an instrument stream, identified by reference
+designator, method and stream ids, with its beginTime and endTime stored as unix
+timestamps in milliseconds, so that window overlap and clipping questions are
+answered with vectorized operations.
+"""
+
+import numpy as np
+
+class StreamCoverage(object):
+    '''Columnar time coverage table for all streams in a UFrame table of contents
+
+    Parameters:
+        toc: dictionary mapping reference designators to instrument metadata, as
+            returned by UFrame.toc.  Streams must contain beginTimeEpochMs and
+            endTimeEpochMs values.  Streams with invalid times are not included.
+        instruments: sorted list of reference designators in toc
+    '''
+
+    def __init__(self, toc, instruments):
+
+        self._instruments = instruments
+        self._methods = []
+        self._streams = []
+        self._records = []
+
+        method_ids = {}
+        stream_ids = {}
+
+        ref_des_column = []
+        method_column = []
+        stream_column = []
+        begin_column = []
+        end_column = []
+
+        for (ref_des_id, instrument) in enumerate(instruments):
+            for stream in toc[instrument]['streams']:
+
+                if stream['beginTimeEpochMs'] is None or stream['endTimeEpochMs'] is None:
+                    continue
+
+                if stream['method'] not in method_ids:
+                    method_ids[stream['method']] = len(self._methods)
+                    self._methods.append(stream['method'])
+
+                if stream['stream'] not in stream_ids:
+                    stream_ids[stream['stream']] = len(self._streams)
+                    self._streams.append(stream['stream'])
+
+                ref_des_column.append(ref_des_id)
+                method_column.append(method_ids[stream['method']])
+                stream_column.append(stream_ids[stream['stream']])
+                begin_column.append(stream['beginTimeEpochMs'])
+                end_column.append(stream['endTimeEpochMs'])
+
+                self._records.append(stream)
+
+        self._method_ids = method_ids
+        self._stream_ids = stream_ids
+
+        self._ref_des_id = np.array(ref_des_column, dtype=np.int32)
+        self._method_id = np.array(method_column, dtype=np.int32)
+        self._stream_id = np.array(stream_column, dtype=np.int32)
+        self._begin_ms = np.array(begin_column, dtype=np.int64)
+        self._end_ms = np.array(end_column, dtype=np.int64)
+
+    @property
+    def instruments(self):
+        return self._instruments
+
+    @property
+    def methods(self):
+        return self._methods
+
+    @property
+    def streams(self):
+        return self._streams
+
+    @property
+    def reference_designator_ids(self):
+        return self._ref_des_id
+
+    @property
+    def method_ids(self):
+        return self._method_id
+
+    @property
+    def stream_ids(self):
+        return self._stream_id
+
+    @property
+    def begin_ms(self):
+        return self._begin_ms
+
+    @property
+    def end_ms(self):
+        return self._end_ms
+
+    def record(self, row):
+        '''Return the table of contents stream metadata for the row index'''
+
+        return self._records[row]
+
+    def records(self, rows):
+        '''Return the table of contents stream metadata for each row index in rows'''
+
+        return [self._records[r] for r in rows]
+
+    def select(self, reference_designators=None, method=None, stream=None):
+        '''Return the row indices of all streams matching the specified reference
+        designators, method and stream.
+
+        Parameters:
+            reference_designators: list of fully-qualified reference designators
+            method: method (telemetry) name fragment, ie: telemetered, recovered
+            stream: stream name
+        '''
+
+        mask = np.ones(len(self._records), dtype=bool)
+
+        if reference_designators is not None:
+            selected = set(reference_designators)
+            ref_des_ids = [i for (i, r) in enumerate(self._instruments) if r in selected]
+            mask &= np.in1d(self._ref_des_id, ref_des_ids)
+
+        if method:
+            method_ids = [self._method_ids[m] for m in self._methods if m.find(method) >= 0]
+            mask &= np.in1d(self._method_id, method_ids)
+
+        if stream:
+            mask &= self._stream_id == self._stream_ids.get(stream, -1)
+
+        return np.flatnonzero(mask)
+
+    def overlapping(self, begin_ms, end_ms, rows=None):
+        '''Return the row indices of all streams whose coverage overlaps the
+        [begin_ms, end_ms) window.  Set rows to a subset of row indices to limit
+        the search.'''
+
+        if rows is None:
+            rows = np.arange(len(self._records))
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+
+        overlaps = (self._begin_ms[rows] < end_ms) & (self._end_ms[rows] > begin_ms)
+
+        return rows[overlaps]
+
+    def clip(self, rows, begin_ms, end_ms):
+        '''Clip request windows to the coverage of the streams in rows.  begin_ms
+        and end_ms may be scalars or arrays of the same length as rows.  Returns
+        arrays containing the clipped begin and end times and a boolean mask that
+        is False for windows that do not overlap the stream coverage.'''
+
+        rows = np.asarray(rows, dtype=np.int64)
+
+        clipped_begin_ms = np.maximum(np.asarray(begin_ms, dtype=np.int64), self._begin_ms[rows])
+        clipped_end_ms = np.minimum(np.asarray(end_ms, dtype=np.int64), self._end_ms[rows])
+
+        return (clipped_begin_ms, clipped_end_ms, clipped_begin_ms < clipped_end_ms)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __repr__(self):
+        return '<StreamCoverage(streams={:d})>'.format(len(self._records))
+
@@ -0,0 +1,147 @@
+"""
+Concurrent dispatcher for UFrame asynchronous stream requests.  Stream engine
+may take tens of seconds to queue each request, so requests are sent from a
+bounded pool of worker threads, optionally rate limited per UFrame host, and
+responses are returned as soon as each request completes.
+"""
+
+import sys
+import time
+import threading
+try:
+    import Queue as queue
+    from urlparse import urlparse
+except ImportError:
+    import queue
+    from urllib.parse import urlparse
+
+# Re-raise a worker exception with the traceback of the worker thread
+if sys.version_info[0] < 3:
+    exec('def _reraise(exc_info):\n    raise exc_info[0], exc_info[1], exc_info[2]\n')
+else:
+    def _reraise(exc_info):
+        raise exc_info[1].with_traceback(exc_info[2])
+
+class HostRateLimiter(object):
+    '''Limit the number of requests sent to each host
+
+    Parameters:
+        rate: maximum number of requests per second sent to any single host
+    '''
+
+    def __init__(self, rate):
+
+        self._rate = rate
+        self._interval = 1.0 / rate
+        self._next_request_times = {}
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def wait(self, url):
+        '''Block until a request may be sent to the host of url'''
+
+        host = urlparse(url).netloc
+
+        with self._lock:
+            now = time.time()
+            send_time = max(now, self._next_request_times.get(host, now))
+            self._next_request_times[host] = send_time + self._interval
+
+        delay = send_time - now
+        if delay > 0:
+            time.sleep(delay)
+
+class RequestDispatcher(object):
+    '''Send request urls concurrently using a bounded pool of worker threads
+
+    Parameters:
+        send_request: function taking a single request url and returning the
+            request response
+        concurrency: maximum number of requests in flight (Default is 4)
+        rate_limit: optional maximum number of requests per second sent to any
+            single host
+    '''
+
+    def __init__(self, send_request, concurrency=4, rate_limit=None):
+
+        if concurrency < 1:
+            raise ValueError('concurrency must be a positive integer')
+
+        self._send_request = send_request
+        self._concurrency = concurrency
+        self._rate_limiter = None
+        if rate_limit:
+            self._rate_limiter = HostRateLimiter(rate_limit)
+
+    @property
+    def concurrency(self):
+        return self._concurrency
+
+    def dispatch(self, urls, callback=None):
+        '''Send all urls and yield each response as soon as the request completes.
+        Responses are yielded in completion order, not request order.  The optional
+        callback function is called with each response before it is yielded.  No
+        more requests are sent once a request or the callback raises an exception
+        or the caller stops iterating over the responses.'''
+
+        tasks = queue.Queue()
+        results = queue.Queue()
+        for url in urls:
+            tasks.put(url)
+
+        num_urls = tasks.qsize()
+        if not num_urls:
+            return
+
+        # Set to stop the workers from sending the remaining requests
+        stop = threading.Event()
+
+        try:
+            for n in range(min(self._concurrency, num_urls)):
+                worker = threading.Thread(target=self._work, args=(tasks, results, stop))
+                worker.daemon = True
+                worker.start()
+
+            for n in range(num_urls):
+                (response, exc_info) = self._next_result(results)
+                if exc_info:
+                    _reraise(exc_info)
+                if callback:
+                    callback(response)
+                yield response
+        finally:
+            stop.set()
+
+    def _work(self, tasks, results, stop):
+
+        while not stop.is_set():
+            try:
+                url = tasks.get_nowait()
+            except queue.Empty:
+                return
+
+            if self._rate_limiter:
+                self._rate_limiter.wait(url)
+                if stop.is_set():
+                    return
+
+            try:
+                results.put((self._send_request(url), None))
+            except Exception:
+                results.put((None, sys.exc_info()))
+
+    def _next_result(self, results):
+
+        # Poll with a timeout so that the consumer remains interruptible
+        while True:
+            try:
+                return results.get(True, 1)
+            except queue.Empty:
+                continue
+
+    def __repr__(self):
+        return '<RequestDispatcher(concurrency={:d})>'.format(self._concurrency)
+
@@ -1,55 +1,109 @@
+import numpy as np
 
-import json
-import time
-
+# Grouping keys supported by group_instrument_deployment_events
+GROUP_KEYS = ['array', 'subsite', 'node', 'class']
 
 def group_instrument_deployment_events_by_subsite(deployment_events):
-    
-    subsites = []
-    
-    deployment_keys = ['endDate',
-        'startDate',
-        'deploymentNumber']   
-    
+
+    return group_instrument_deployment_events(deployment_events, group_by='subsite')
+
+def group_instrument_deployment_events(deployment_events, group_by='subsite'):
+    '''Group the deployment events for fully-qualified reference designators
+    (instruments) by array, subsite, node or instrument class.  Returns a list of
+    groups, in the order each group first appears in deployment_events, each
+    containing the group name and the concise instrument deployments (children)
+    belonging to the group.
+
+    Parameters:
+        deployment_events: list of asset management deployment events, either
+            as returned by UFrame.get_deployment_events (eventStartTime and
+            eventStopTime) or in the older format (startDate and endDate)
+        group_by: array, subsite <Default>, node or class (ie: CTDBP)
+    '''
+
+    if group_by not in GROUP_KEYS:
+        raise ValueError('Invalid group_by key: {:s}'.format(group_by))
+
     # Grab all deployment events for fully-qualified reference designators (instruments)
     instruments = [d for d in deployment_events if d['referenceDesignator']['subsite'] and d['referenceDesignator']['node'] and d['referenceDesignator']['sensor']]
-     
-    for d in instruments:
-        
-        if not subsites or d['referenceDesignator']['subsite'] not in [s['name'] for s in subsites]:
-            s = {'array' : d['referenceDesignator']['subsite'][:2],
-                'name' : d['referenceDesignator']['subsite'],
-                'children' : []}
-            subsites.append(s)
-        
-        i = [s['name'] for s in subsites].index(d['referenceDesignator']['subsite'])
-            
-        sensor = {k:d[k] for k in deployment_keys}
-        
-        refdes = '{:s}-{:s}-{:s}'.format(d['referenceDesignator']['subsite'],
-            d['referenceDesignator']['node'],
-            d['referenceDesignator']['sensor'])
-            
-        sensor['refdes'] = refdes
+
+    start_dates = [_event_time(d, 'eventStartTime', 'startDate') for d in instruments]
+    end_dates = [_event_time(d, 'eventStopTime', 'endDate') for d in instruments]
+
+    # Format all timestamps at once
+    start_timestamps = _format_timestamps(start_dates)
+    end_timestamps = _format_timestamps(end_dates)
+
+    groups = []
+    # Group name to group
+    group_map = {}
+
+    for (n, d) in enumerate(instruments):
+
+        ref_des = d['referenceDesignator']
+
+        sensor = {'startDate' : start_dates[n],
+            'endDate' : end_dates[n],
+            'deploymentNumber' : d['deploymentNumber']}
+
+        sensor['refdes'] = '{:s}-{:s}-{:s}'.format(ref_des['subsite'],
+            ref_des['node'],
+            ref_des['sensor'])
+
         sensor['instrument'] = 'No Description'
-        if d['referenceDesignator']['vocab']:
-            sensor['instrument'] = d['referenceDesignator']['vocab']['instrument']
-            
-        sensor['sensor'] = d['referenceDesignator']['sensor']
-        sensor_tokens = sensor['sensor'].split('-')
-        sensor['class'] = sensor_tokens[1][:5]
-        
-        sensor['startDateTs'] = None
-        if sensor['startDate']:
-            sensor['startDateTs'] = time.strftime('%Y-%m-%dT%H:%M:%S',
-                time.gmtime(sensor['startDate']/1000))
-        
-        sensor['endDateTs'] = None
-        if sensor['endDate']:
-            sensor['endDateTs'] = time.strftime('%Y-%m-%dT%H:%M:%S',
-                time.gmtime(sensor['endDate']/1000))
-    
-        subsites[i]['children'].append(sensor)
-        
-    return subsites
+        if ref_des.get('vocab'):
+            sensor['instrument'] = ref_des['vocab']['instrument']
+
+        sensor['sensor'] = ref_des['sensor']
+        sensor['class'] = sensor['sensor'].split('-')[1][:5]
+
+        sensor['startDateTs'] = start_timestamps[n]
+        sensor['endDateTs'] = end_timestamps[n]
+
+        if group_by == 'array':
+            name = ref_des['subsite'][:2]
+        elif group_by == 'subsite':
+            name = ref_des['subsite']
+        elif group_by == 'node':
+            name = '{:s}-{:s}'.format(ref_des['subsite'], ref_des['node'])
+        else:
+            name = sensor['class']
+
+        group = group_map.get(name)
+        if group is None:
+            group = {'name' : name,
+                'children' : []}
+            if group_by != 'class':
+                group['array'] = name[:2]
+            group_map[name] = group
+            groups.append(group)
+
+        group['children'].append(sensor)
+
+    return groups
+
+def _event_time(event, key, old_key):
+    '''Return the unix timestamp, in milliseconds, stored in the event under key
+    or, for older asset management events, old_key'''
+
+    if key in event:
+        return event[key]
+
+    return event.get(old_key)
+
+def _format_timestamps(dates):
+    '''Return the list of YYYY-mm-ddTHH:MM:SS formatted timestamps for the list of
+    unix timestamps, in milliseconds.  None is returned for each missing (None
+    or 0) timestamp.'''
+
+    if not dates:
+        return []
+
+    valid = np.array([bool(d) for d in dates])
+
+    # Truncate to whole seconds
+    seconds = np.array([d // 1000 if d else 0 for d in dates], dtype=np.int64)
+
+    timestamps = np.datetime_as_string(seconds.astype('datetime64[s]'))
 
+    return [str(ts) if v else None for (ts, v) in zip(timestamps, valid)]
@@ -0,0 +1,100 @@
+"""
+Search index over the sorted name lists (reference designators, streams,
+parameters and arrays) created from the UFrame table of contents.  Prefix
+queries bisect the sorted names and substring queries intersect n-gram posting
+lists, so lookups do not scan every name.
+"""
+
+import bisect
+
+class NameIndex(object):
+    '''Prefix and substring index over a sorted list of names
+
+    Parameters:
+        names: sorted list of unique names
+        gram_size: maximum n-gram length indexed for substring queries (Default
+            is 3)
+    '''
+
+    def __init__(self, names, gram_size=3):
+
+        self._names = names
+        self._gram_size = gram_size
+        # n-gram posting lists are created on the first substring query
+        self._postings = None
+
+    @property
+    def names(self):
+        return self._names
+
+    def prefix(self, target_string):
+        '''Return the sorted list of names beginning with target_string'''
+
+        names = self._names
+
+        i0 = bisect.bisect_left(names, target_string)
+        i1 = i0
+        while i1 < len(names) and names[i1].startswith(target_string):
+            i1 += 1
+
+        return names[i0:i1]
+
+    def search(self, target_string):
+        '''Return the sorted list of names containing target_string'''
+
+        if not target_string:
+            return list(self._names)
+
+        postings = self._get_postings()
+
+        if len(target_string) <= self._gram_size:
+            return [self._names[i] for i in postings.get(target_string, [])]
+
+        # Intersect the posting lists of all n-grams in target_string, starting
+        # with the shortest, and verify the candidates
+        grams = set([target_string[i:i + self._gram_size] for i in range(len(target_string) - self._gram_size + 1)])
+        gram_postings = []
+        for gram in grams:
+            if gram not in postings:
+                return []
+            gram_postings.append(postings[gram])
+        gram_postings.sort(key=len)
+
+        candidates = set(gram_postings[0])
+        for posting in gram_postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        return [self._names[i] for i in sorted(candidates) if self._names[i].find(target_string) >= 0]
+
+    def _get_postings(self):
+
+        if self._postings is not None:
+            return self._postings
+
+        # Map every 1 to gram_size character substring to the ordered positions
+        # of the names containing it
+        postings = {}
+        for (i, name) in enumerate(self._names):
+            grams = set()
+            for n in range(1, self._gram_size + 1):
+                for j in range(len(name) - n + 1):
+                    grams.add(name[j:j + n])
+            for gram in grams:
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = [i]
+                else:
+                    posting.append(i)
+
+        self._postings = postings
+
+        return postings
+
+    def __len__(self):
+        return len(self._names)
+
+    def __repr__(self):
+        return '<NameIndex(names={:d})>'.format(len(self._names))
+
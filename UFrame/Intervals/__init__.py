@@ -0,0 +1,149 @@
+"""
+Static centered interval tree used to answer time-point and time-range queries
+over deployment events.  Intervals are half-open [begin, end) and an interval
+without an end (ie: an active deployment) extends indefinitely.  Each tree node
+stores the intervals containing its center point sorted by begin and by end, so
+that a query visits O(log n) nodes and bisects each node's endpoint lists
+instead of scanning every interval.
+"""
+
+import bisect
+
+_OPEN_END = float('inf')
+
+class IntervalIndex(object):
+    '''Centered interval tree over half-open [begin, end) intervals
+
+    Parameters:
+        intervals: iterable of (begin, end, item) tuples.  Set end to None for
+            intervals that have not ended.  Intervals with end <= begin are not
+            indexed.
+    '''
+
+    def __init__(self, intervals):
+
+        entries = []
+        for (begin, end, item) in intervals:
+            if end is None:
+                end = _OPEN_END
+            if end <= begin:
+                continue
+            entries.append((begin, end, len(entries), item))
+
+        self._size = len(entries)
+        self._root = _build_tree(entries)
+
+    def at(self, t):
+        '''Return the items of all intervals containing t (begin <= t < end),
+        sorted by interval begin'''
+
+        matches = []
+
+        node = self._root
+        while node:
+            (center, begins, by_begin, ends, by_end, left, right) = node
+            if t < center:
+                # Node intervals end after the center, so they contain t if they
+                # begin on or before t
+                matches.extend(by_begin[:bisect.bisect_right(begins, t)])
+                node = left
+            else:
+                # Node intervals begin on or before the center, so they contain t
+                # if they end after t
+                matches.extend(by_end[bisect.bisect_right(ends, t):])
+                node = right
+
+        return _sorted_items(matches)
+
+    def overlapping(self, begin, end=None):
+        '''Return the items of all intervals overlapping [begin, end), sorted by
+        interval begin.  Set end to None to return all intervals that end after
+        begin.'''
+
+        if end is None:
+            end = _OPEN_END
+
+        matches = []
+        if end <= begin:
+            return matches
+
+        nodes = [self._root]
+        while nodes:
+            node = nodes.pop()
+            if not node:
+                continue
+
+            (center, begins, by_begin, ends, by_end, left, right) = node
+            if end <= center:
+                matches.extend(by_begin[:bisect.bisect_left(begins, end)])
+                nodes.append(left)
+            elif begin >= center:
+                matches.extend(by_end[bisect.bisect_right(ends, begin):])
+                nodes.append(right)
+            else:
+                # The window contains the center, so every node interval overlaps
+                matches.extend(by_begin)
+                nodes.append(left)
+                nodes.append(right)
+
+        return _sorted_items(matches)
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return '<IntervalIndex(intervals={:d})>'.format(self._size)
+
+def _build_tree(entries):
+
+    if not entries:
+        return None
+
+    # Build the tree iteratively, filling in each node's children once they are
+    # created
+    root = []
+    stack = [(entries, root)]
+    while stack:
+        (node_entries, node) = stack.pop()
+
+        # The median begin is contained by at least one interval, so every node
+        # holds at least one interval
+        begins = sorted([e[0] for e in node_entries])
+        center = begins[len(begins) // 2]
+
+        left_entries = []
+        right_entries = []
+        center_entries = []
+        for entry in node_entries:
+            if entry[1] <= center:
+                left_entries.append(entry)
+            elif entry[0] > center:
+                right_entries.append(entry)
+            else:
+                center_entries.append(entry)
+
+        by_begin = sorted(center_entries, key=lambda e: (e[0], e[2]))
+        by_end = sorted(center_entries, key=lambda e: (e[1], e[2]))
+
+        node.extend([center,
+            [e[0] for e in by_begin],
+            by_begin,
+            [e[1] for e in by_end],
+            by_end,
+            None,
+            None])
+
+        if left_entries:
+            node[5] = []
+            stack.append((left_entries, node[5]))
+        if right_entries:
+            node[6] = []
+            stack.append((right_entries, node[6]))
+
+    return root
+
+def _sorted_items(entries):
+
+    entries.sort(key=lambda e: (e[0], e[2]))
+
+    return [e[3] for e in entries]
@@ -0,0 +1,207 @@
+"""
+Incremental JSON reader used to ingest the UFrame table of contents without
+holding the raw response or the full decoded document in memory.  The reader
+walks the top-level arrays and objects of the document itself and decodes one
+element at a time with the C-accelerated json decoder, reading more of the
+response only when the current element is incomplete.  Elements larger than
+max_value_size raise a ValueError, so a malformed element does not read the rest
+of the response into memory.
+"""
+
+import json
+import codecs
+
+# Default number of bytes read from the response at a time
+DEFAULT_CHUNK_SIZE = 65536
+# Default maximum number of characters in a single decoded element
+DEFAULT_MAX_VALUE_SIZE = 16777216
+
+_WHITESPACE = ' \t\n\r'
+
+class JsonStreamReader(object):
+    '''Incremental reader for a JSON document delivered as a sequence of byte chunks
+
+    Parameters:
+        chunks: iterable of utf-8 encoded byte strings, ie: the
+            requests.Response.iter_content generator or file_chunks(fid)
+        max_value_size: maximum number of characters buffered while decoding a
+            single value (Default is 16 MiB)
+    '''
+
+    def __init__(self, chunks, max_value_size=DEFAULT_MAX_VALUE_SIZE):
+
+        self._chunks = iter(chunks)
+        self._max_value_size = max_value_size
+        self._decoder = json.JSONDecoder()
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = u''
+        self._pos = 0
+        self._eof = False
+
+    def peek(self):
+        '''Return the next non-whitespace character without consuming it or None
+        at the end of the document'''
+
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            return None
+
+        return self._buffer[self._pos]
+
+    def expect(self, characters):
+        '''Consume and return the next non-whitespace character, which must be one
+        of characters'''
+
+        c = self.peek()
+        if c is None or c not in characters:
+            raise ValueError('Expected one of {:s} at offset {:d}, found {:s}'.format(characters, self._pos, repr(c)))
+
+        self._pos += 1
+
+        return c
+
+    def decode_value(self):
+        '''Decode and return the next complete JSON value.  Raises ValueError if
+        the value is invalid or longer than max_value_size characters.'''
+
+        self.peek()
+
+        while True:
+            try:
+                (value, end) = self._decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                # The value may be incomplete
+                if self._eof:
+                    raise
+                self._fill_value()
+                continue
+
+            # Numbers and literals at the end of the buffer may be incomplete
+            if end == len(self._buffer) and not self._eof:
+                self._fill_value()
+                continue
+
+            self._pos = end
+
+            return value
+
+    def iter_array(self):
+        '''Yield each element of the JSON array beginning at the current position'''
+
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+
+        while True:
+            yield self.decode_value()
+            if self.expect(',]') == ']':
+                return
+
+    def iter_object(self):
+        '''Yield each key of the JSON object beginning at the current position.  The
+        caller must consume the corresponding value (ie: with decode_value or
+        iter_array) before requesting the next key.'''
+
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            key = self.decode_value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def _skip_whitespace(self):
+
+        while True:
+            buffer_length = len(self._buffer)
+            while self._pos < buffer_length and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+
+            if self._pos < buffer_length or self._eof:
+                return
+
+            self._fill()
+
+    def _fill_value(self):
+
+        # Malformed values cannot be told apart from incomplete values, so stop
+        # reading once the value is larger than any valid element
+        pending = len(self._buffer) - self._pos
+        if pending > self._max_value_size:
+            raise ValueError('Invalid JSON value or value longer than {:d} characters'.format(self._max_value_size))
+
+        # Read at least as much as is already buffered, so that values spanning
+        # many chunks are not decoded again after every chunk, without reading
+        # far past max_value_size
+        self._fill(min(pending, self._max_value_size + 1 - pending))
+
+    def _fill(self, size=1):
+
+        # Discard the consumed part of the buffer
+        if self._pos:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+
+        # Read chunks until at least size characters are added
+        text = []
+        length = 0
+        while True:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                text.append(self._text_decoder.decode(b'', final=True))
+                self._eof = True
+                break
+
+            text.append(self._text_decoder.decode(chunk))
+            length += len(text[-1])
+            if length >= size:
+                break
+
+        self._buffer += u''.join(text)
+
+def file_chunks(fid, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Yield chunk_size byte chunks read from the open file fid'''
+
+    while True:
+        chunk = fid.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+def iter_toc_items(chunks, max_value_size=DEFAULT_MAX_VALUE_SIZE):
+    '''Yield (section, item) tuples from a UFrame table of contents response
+    delivered as a sequence of byte chunks.  Old, list-shaped responses yield
+    (None, instrument) for each instrument.  New, dictionary-shaped responses
+    yield ('instruments', instrument), ('parameter_definitions', parameter) and
+    ('parameters_by_stream', (stream, parameter_ids)) tuples, plus (key, value)
+    for any other top-level key.  ValueError is raised if the response is invalid
+    or any item is longer than max_value_size characters.'''
+
+    reader = JsonStreamReader(chunks, max_value_size=max_value_size)
+
+    c = reader.peek()
+    if c == '[':
+        for instrument in reader.iter_array():
+            yield (None, instrument)
+    elif c == '{':
+        for key in reader.iter_object():
+            if key in ['instruments', 'parameter_definitions'] and reader.peek() == '[':
+                for item in reader.iter_array():
+                    yield (key, item)
+            elif key == 'parameters_by_stream' and reader.peek() == '{':
+                for stream in reader.iter_object():
+                    yield (key, (stream, reader.decode_value()))
+            else:
+                yield (key, reader.decode_value())
+    else:
+        raise ValueError('Unknown TOC response')
+
+    if reader.peek() is not None:
+        raise ValueError('Extra data after the TOC response')
+
@@ -0,0 +1,182 @@
+"""
+Local SQLite ledger of the stream data already requested from, or downloaded
+from, UFrame.  Each entry records the (reference designator, method, stream,
+time window) of a request, so that new requests can be limited to the parts of
+a time window that are not already covered (ie: only the last day of an
+incremental daily pull).
+"""
+
+import os
+import re
+import time
+import sqlite3
+import threading
+
+from UFrame.Cache import default_cache_dir
+from UFrame.Timestamps import iso8601_to_epoch_ms
+
+LEDGER_FILE = 'ledger.sqlite'
+LEDGER_STATUSES = ('requested', 'downloaded')
+
+# Captures the subsite, node, sensor, method, stream, beginDT and endDT of a
+# stream request url
+_request_url_regexp = re.compile(r'/sensor/inv/([^/]+)/([^/]+)/([^/]+)/([^/]+)/([^/?]+)\?(?:.*&)?beginDT=([^&]+)&(?:.*&)?endDT=([^&]+)')
+
+_schema = '''CREATE TABLE IF NOT EXISTS requests (
+    reference_designator TEXT NOT NULL,
+    method TEXT NOT NULL,
+    stream TEXT NOT NULL,
+    begin_ms INTEGER NOT NULL,
+    end_ms INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS requests_stream ON requests (reference_designator, method, stream, begin_ms);'''
+
+def default_ledger_path():
+    '''Return the default ledger location, which is ledger.sqlite in the default
+    cache location (see UFrame.Cache.default_cache_dir)'''
+
+    return os.path.join(default_cache_dir(), LEDGER_FILE)
+
+def parse_request_url(url):
+    '''Return the (reference designator, method, stream, begin_ms, end_ms) tuple
+    requested by the stream request url or None if the url is not a stream
+    request'''
+
+    match = _request_url_regexp.search(url.strip())
+    if not match:
+        return None
+
+    (subsite, node, sensor, method, stream, begin_ts, end_ts) = match.groups()
+
+    try:
+        begin_ms = iso8601_to_epoch_ms(begin_ts)
+        end_ms = iso8601_to_epoch_ms(end_ts)
+    except ValueError:
+        return None
+
+    return ('{:s}-{:s}-{:s}'.format(subsite, node, sensor), method, stream, begin_ms, end_ms)
+
+class RequestLedger(object):
+    '''SQLite ledger of the requested and downloaded stream time windows
+
+    Parameters:
+        path: ledger database file (Default is ledger.sqlite in the UFrame cache
+            location)
+    '''
+
+    def __init__(self, path=None):
+
+        if not path:
+            path = default_ledger_path()
+
+        ledger_dir = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(ledger_dir):
+            os.makedirs(ledger_dir)
+
+        self._path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_schema)
+
+    @property
+    def path(self):
+        return self._path
+
+    def record(self, reference_designator, method, stream, begin_ms, end_ms, status='requested'):
+        '''Add the stream time window [begin_ms, end_ms) to the ledger.  Returns
+        False if the window is empty.'''
+
+        if status not in LEDGER_STATUSES:
+            raise ValueError('Invalid ledger status: {:s}'.format(status))
+
+        if end_ms <= begin_ms:
+            return False
+
+        with self._lock:
+            with self._db:
+                self._db.execute('INSERT INTO requests VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (reference_designator, method, stream, int(begin_ms), int(end_ms), status, time.time()))
+
+        return True
+
+    def record_url(self, url, status='requested'):
+        '''Add the stream time window requested by the request url to the ledger.
+        Returns False if the url is not a stream request.'''
+
+        request = parse_request_url(url)
+        if not request:
+            return False
+
+        return self.record(*request, status=status)
+
+    def covered(self, reference_designator, method, stream, begin_ms=None, end_ms=None, statuses=None):
+        '''Return the sorted list of merged (begin_ms, end_ms) windows of the stream
+        recorded in the ledger, optionally limited to windows overlapping
+        [begin_ms, end_ms) and to the specified statuses'''
+
+        query = 'SELECT begin_ms, end_ms FROM requests WHERE reference_designator = ? AND method = ? AND stream = ?'
+        values = [reference_designator, method, stream]
+        if end_ms is not None:
+            query += ' AND begin_ms < ?'
+            values.append(int(end_ms))
+        if begin_ms is not None:
+            query += ' AND end_ms > ?'
+            values.append(int(begin_ms))
+        if statuses:
+            query += ' AND status IN ({:s})'.format(', '.join(['?'] * len(statuses)))
+            values.extend(statuses)
+        query += ' ORDER BY begin_ms'
+
+        with self._lock:
+            rows = self._db.execute(query, values).fetchall()
+
+        windows = []
+        for (t0, t1) in rows:
+            if windows and t0 <= windows[-1][1]:
+                if t1 > windows[-1][1]:
+                    windows[-1] = (windows[-1][0], t1)
+            else:
+                windows.append((t0, t1))
+
+        return windows
+
+    def missing(self, reference_designator, method, stream, begin_ms, end_ms, statuses=None):
+        '''Return the sorted list of (begin_ms, end_ms) windows inside
+        [begin_ms, end_ms) that are not recorded in the ledger for the stream'''
+
+        windows = []
+
+        t = begin_ms
+        for (t0, t1) in self.covered(reference_designator, method, stream, begin_ms, end_ms, statuses=statuses):
+            if t0 > t:
+                windows.append((t, t0))
+            t = max(t, t1)
+
+        if t < end_ms:
+            windows.append((t, end_ms))
+
+        return windows
+
+    def clear(self, reference_designator=None):
+        '''Remove all entries, or all entries for the fully-qualified reference
+        designator, from the ledger'''
+
+        with self._lock:
+            with self._db:
+                if reference_designator:
+                    self._db.execute('DELETE FROM requests WHERE reference_designator = ?', (reference_designator,))
+                else:
+                    self._db.execute('DELETE FROM requests')
+
+    def close(self):
+
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM requests').fetchone()[0]
+
+    def __repr__(self):
+        return '<RequestLedger(path={:s})>'.format(self._path)
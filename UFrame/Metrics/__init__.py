@@ -0,0 +1,260 @@
+"""
+Counters and timing histograms collected by the UFrame client for the network,
+JSON decode and index creation phases of each call, the number of bytes
+transferred, request retries and cache hits and misses.  Every counter
+increment and histogram observation is also passed to the registered hooks, so
+the values may be forwarded to an external metrics system, and a summary may be
+written when the process exits.
+"""
+
+import sys
+import json
+import time
+import random
+import atexit
+import threading
+
+# Maximum number of observations kept by each histogram to estimate percentiles
+DEFAULT_RESERVOIR_SIZE = 1024
+
+_PERCENTILES = (50, 90, 99)
+
+class Metrics(object):
+    '''Thread-safe counters and histograms
+
+    Parameters:
+        hooks: optional list of functions called with the kind ('counter' or
+            'histogram'), name and value of every counter increment and
+            histogram observation
+        reservoir_size: maximum number of observations kept by each histogram
+            to estimate percentiles (Default is 1024)
+    '''
+
+    def __init__(self, hooks=None, reservoir_size=DEFAULT_RESERVOIR_SIZE):
+
+        self._hooks = list(hooks or [])
+        self._reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._dump_registered = False
+
+    def add_hook(self, hook):
+        '''Register a function called with the kind, name and value of every
+        counter increment and histogram observation'''
+
+        with self._lock:
+            self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+
+        with self._lock:
+            if hook in self._hooks:
+                self._hooks.remove(hook)
+
+    def increment(self, name, value=1):
+        '''Add value to the counter name'''
+
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+            hooks = self._hooks
+
+        for hook in hooks:
+            hook('counter', name, value)
+
+    def observe(self, name, value):
+        '''Add the observation value to the histogram name'''
+
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = _Histogram(self._reservoir_size)
+                self._histograms[name] = histogram
+            histogram.add(value)
+            hooks = self._hooks
+
+        for hook in hooks:
+            hook('histogram', name, value)
+
+    def timer(self, name):
+        '''Return a context manager adding the number of seconds spent in the
+        with block to the histogram name'''
+
+        return _Timer(self, name)
+
+    def counter(self, name):
+        '''Return the value of the counter name'''
+
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def histogram(self, name):
+        '''Return the count, sum, min, mean, max and estimated percentiles of the
+        histogram name or None if it has no observations'''
+
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                return None
+            return histogram.summary()
+
+    def summary(self):
+        '''Return a dictionary containing all counters and histogram summaries'''
+
+        with self._lock:
+            return {'counters' : dict(self._counters),
+                'histograms' : dict([(name, h.summary()) for (name, h) in self._histograms.items()])}
+
+    def reset(self):
+        '''Remove all counters and histograms'''
+
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+
+    def dump(self, fid=None, fmt='text'):
+        '''Write the summary to fid (Default is STDERR) as a text table or, if fmt
+        is json, as a JSON object'''
+
+        if fid is None:
+            fid = sys.stderr
+
+        summary = self.summary()
+
+        if fmt == 'json':
+            fid.write('{:s}\n'.format(json.dumps(summary, sort_keys=True)))
+            fid.flush()
+            return
+
+        if summary['counters']:
+            fid.write('{:<40s} {:>14s}\n'.format('counter', 'value'))
+            for name in sorted(summary['counters'].keys()):
+                fid.write('{:<40s} {:>14s}\n'.format(name, _format_value(summary['counters'][name])))
+
+        if summary['histograms']:
+            fid.write('{:<40s} {:>8s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s}\n'.format('histogram',
+                'count',
+                'sum',
+                'mean',
+                'p50',
+                'p90',
+                'p99',
+                'max'))
+            for name in sorted(summary['histograms'].keys()):
+                h = summary['histograms'][name]
+                fid.write('{:<40s} {:>8d} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s}\n'.format(name,
+                    h['count'],
+                    _format_value(h['sum']),
+                    _format_value(h['mean']),
+                    _format_value(h['p50']),
+                    _format_value(h['p90']),
+                    _format_value(h['p99']),
+                    _format_value(h['max'])))
+
+        fid.flush()
+
+    def dump_at_exit(self, fid=None, fmt='text'):
+        '''Write the summary (see Metrics.dump) when the process exits'''
+
+        with self._lock:
+            if self._dump_registered:
+                return
+            self._dump_registered = True
+
+        atexit.register(self.dump, fid=fid, fmt=fmt)
+
+    def __repr__(self):
+        with self._lock:
+            return '<Metrics(counters={:d}, histograms={:d})>'.format(len(self._counters), len(self._histograms))
+
+class MeteredChunks(object):
+    '''Iterable wrapping an iterable of byte chunks (ie: a streamed response body)
+    that counts the bytes and the seconds spent reading the chunks'''
+
+    def __init__(self, chunks):
+
+        self._chunks = chunks
+        self.bytes = 0
+        self.seconds = 0.
+
+    def __iter__(self):
+
+        chunks = iter(self._chunks)
+        while True:
+            t0 = time.time()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                self.seconds += time.time() - t0
+                return
+            self.seconds += time.time() - t0
+            self.bytes += len(chunk)
+            yield chunk
+
+class _Timer(object):
+
+    def __init__(self, metrics, name):
+
+        self._metrics = metrics
+        self._name = name
+        self._t0 = None
+        self.seconds = None
+
+    def __enter__(self):
+        self._t0 = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds = time.time() - self._t0
+        self._metrics.observe(self._name, self.seconds)
+
+class _Histogram(object):
+
+    def __init__(self, reservoir_size):
+
+        self._reservoir_size = reservoir_size
+        # Fixed seed so that summaries are reproducible
+        self._random = random.Random(0)
+        self._values = []
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+        # Keep a uniform sample of all observations
+        if len(self._values) < self._reservoir_size:
+            self._values.append(value)
+        else:
+            i = self._random.randint(0, self.count - 1)
+            if i < self._reservoir_size:
+                self._values[i] = value
+
+    def summary(self):
+
+        values = sorted(self._values)
+
+        summary = {'count' : self.count,
+            'sum' : self.sum,
+            'min' : self.min,
+            'mean' : float(self.sum) / self.count,
+            'max' : self.max}
+        for p in _PERCENTILES:
+            summary['p{:d}'.format(p)] = values[min(len(values) - 1, len(values) * p // 100)]
+
+        return summary
+
+def _format_value(value):
+
+    if isinstance(value, float):
+        return '{:0.4f}'.format(value)
+
+    return '{:d}'.format(value)
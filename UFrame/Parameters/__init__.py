@@ -0,0 +1,192 @@
+"""
+Catalog of the parameter definitions in the UFrame table of contents.  Each
+definition is stored once, keyed by parameter id (pdId), and indexed by particle
+key, unit and data product level, with the streams and instruments producing
+each parameter, so that parameter queries do not require copying definitions
+into every instrument record.
+"""
+
+# Definition keys used by the different table of contents formats
+_PARTICLE_KEYS = ('particle_key', 'particleKey')
+_UNIT_KEYS = ('unit', 'units')
+_LEVEL_KEYS = ('data_product_level', 'data_level', 'level')
+
+class ParameterCatalog(object):
+    '''Parameter definitions indexed by parameter id (pdId), particle key, unit
+    and data product level
+
+    Parameters:
+        stream_parameters: dictionary mapping stream names to the list of
+            parameter definitions contained in the stream, as returned by
+            UFrame.stream_parameters
+        stream_instruments: dictionary mapping stream names to the reference
+            designators producing the stream
+        instrument_parameters: dictionary mapping reference designators to the
+            list of parameter definitions produced by the instrument.  Used for
+            the old (array) table of contents, which does not map streams to
+            parameters.  Definitions containing a stream name are added to that
+            stream.
+        definitions: dictionary mapping parameter ids to parameter definitions.
+            Used to add the definitions that are not contained in any stream.
+    '''
+
+    def __init__(self, stream_parameters, stream_instruments, instrument_parameters=None, definitions=None):
+
+        self._definitions = {}
+
+        particle_key_ids = {}
+        unit_ids = {}
+        level_ids = {}
+        id_streams = {}
+        id_instruments = {}
+
+        def add(p):
+            pd_id = _parameter_id(p)
+            if pd_id in self._definitions:
+                return pd_id
+
+            self._definitions[pd_id] = p
+
+            particle_key_ids.setdefault(_first_value(p, _PARTICLE_KEYS), set()).add(pd_id)
+            unit_ids.setdefault(_first_value(p, _UNIT_KEYS), set()).add(pd_id)
+            level_ids.setdefault(_first_value(p, _LEVEL_KEYS), set()).add(pd_id)
+
+            id_streams[pd_id] = set()
+            id_instruments[pd_id] = set()
+
+            return pd_id
+
+        for (stream, stream_params) in stream_parameters.items():
+            instruments = stream_instruments.get(stream, [])
+            for p in stream_params:
+                pd_id = add(p)
+                id_streams[pd_id].add(stream)
+                id_instruments[pd_id].update(instruments)
+
+        if instrument_parameters:
+            for (instrument, instrument_params) in instrument_parameters.items():
+                for p in instrument_params:
+                    pd_id = add(p)
+                    id_instruments[pd_id].add(instrument)
+                    if p.get('stream'):
+                        id_streams[pd_id].add(p['stream'])
+
+        if definitions:
+            for p in definitions.values():
+                add(p)
+
+        # Missing units and levels are not indexed
+        unit_ids.pop(None, None)
+        level_ids.pop(None, None)
+
+        self._ids = sorted(self._definitions.keys())
+        self._particle_key_ids = _sorted_values(particle_key_ids)
+        self._unit_ids = _sorted_values(unit_ids)
+        self._level_ids = _sorted_values(level_ids)
+        self._id_streams = _sorted_values(id_streams)
+        self._id_instruments = _sorted_values(id_instruments)
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def particle_keys(self):
+        return sorted(self._particle_key_ids.keys())
+
+    @property
+    def units(self):
+        return sorted(self._unit_ids.keys())
+
+    @property
+    def levels(self):
+        return sorted(self._level_ids.keys())
+
+    def definition(self, pd_id):
+        '''Return the definition of the parameter id or None if it is not in the
+        catalog'''
+
+        return self._definitions.get(pd_id)
+
+    def definitions(self, pd_ids):
+        '''Return the list of definitions of the parameter ids in the catalog'''
+
+        return [self._definitions[pd_id] for pd_id in pd_ids if pd_id in self._definitions]
+
+    def find(self, particle_key=None, unit=None, level=None):
+        '''Return the sorted list of parameter ids matching all of the specified
+        particle key, unit and data product level.  All parameter ids are returned
+        if none are specified.
+
+        Parameters:
+            particle_key: fully-qualified particle key (ie: practical_salinity)
+            unit: parameter unit (ie: 1)
+            level: data product level (ie: L2)
+        '''
+
+        matches = None
+        for (value, index) in ((particle_key, self._particle_key_ids),
+            (unit, self._unit_ids),
+            (level, self._level_ids)):
+
+            if value is None:
+                continue
+
+            pd_ids = index.get(value, [])
+            if matches is None:
+                matches = set(pd_ids)
+            else:
+                matches.intersection_update(pd_ids)
+
+        if matches is None:
+            return list(self._ids)
+
+        return sorted(matches)
+
+    def streams(self, pd_ids):
+        '''Return the sorted list of streams containing any of the parameter ids'''
+
+        return _union(self._id_streams, pd_ids)
+
+    def instruments(self, pd_ids):
+        '''Return the sorted list of reference designators producing any of the
+        parameter ids'''
+
+        return _union(self._id_instruments, pd_ids)
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __contains__(self, pd_id):
+        return pd_id in self._definitions
+
+    def __repr__(self):
+        return '<ParameterCatalog(parameters={:d})>'.format(len(self._definitions))
+
+def _parameter_id(p):
+
+    # Old table of contents parameters may not have a parameter id
+    return p.get('pdId') or _first_value(p, _PARTICLE_KEYS)
+
+def _first_value(p, keys):
+
+    for key in keys:
+        if key in p:
+            return p[key]
+
+    return None
+
+def _sorted_values(index):
+
+    return dict([(k, sorted(v)) for (k, v) in index.items()])
+
+def _union(index, pd_ids):
+
+    if isinstance(pd_ids, str) or not hasattr(pd_ids, '__iter__'):
+        pd_ids = [pd_ids]
+
+    values = set()
+    for pd_id in pd_ids:
+        values.update(index.get(pd_id, []))
+
+    return sorted(values)
@@ -0,0 +1,120 @@
+"""
+Planning stage used to split long stream request windows into smaller time
+chunks before the request urls are created, so that stream engine does not time
+out or create very large files for multi-year, high-rate streams.  Chunks are
+either a fixed duration or sized from the estimated number of particles in the
+window, using a per-stream rate table or the stream count and time coverage from
+the table of contents, and are split at deployment boundaries when they are
+known.
+"""
+
+import math
+
+# Chunks sized from particle rates are never shorter than 1 minute
+DEFAULT_MIN_CHUNK_MS = 60000
+
+class RequestPlanner(object):
+    '''Splits stream request windows into time chunks
+
+    Parameters:
+        chunk_ms: maximum chunk duration, in milliseconds
+        max_particles: maximum estimated number of particles per chunk
+        rates: dictionary mapping stream names to the number of particles
+            produced per second.  Streams that are not in the table use the
+            table of contents particle count divided by the stream time coverage.
+        align_deployments: set to True to split windows at the deployment start
+            and stop times of the instrument
+        min_chunk_ms: minimum duration of chunks sized from max_particles, in
+            milliseconds (Default is 1 minute)
+    '''
+
+    def __init__(self, chunk_ms=None, max_particles=None, rates=None, align_deployments=False, min_chunk_ms=DEFAULT_MIN_CHUNK_MS):
+
+        if chunk_ms is not None and chunk_ms <= 0:
+            raise ValueError('chunk_ms must be a positive number')
+        if max_particles is not None and max_particles <= 0:
+            raise ValueError('max_particles must be a positive number')
+
+        self._chunk_ms = chunk_ms
+        self._max_particles = max_particles
+        self._rates = rates or {}
+        self._align_deployments = align_deployments
+        self._min_chunk_ms = min_chunk_ms
+
+    @property
+    def align_deployments(self):
+        return self._align_deployments
+
+    def rate(self, stream):
+        '''Return the estimated number of particles per millisecond produced by the
+        table of contents stream or None if it cannot be estimated'''
+
+        if stream['stream'] in self._rates:
+            return self._rates[stream['stream']] / 1000.
+
+        count = stream.get('count')
+        if not count or stream['beginTimeEpochMs'] is None or stream['endTimeEpochMs'] is None:
+            return None
+
+        duration = stream['endTimeEpochMs'] - stream['beginTimeEpochMs']
+        if duration <= 0:
+            return None
+
+        return float(count) / duration
+
+    def chunk_duration(self, stream):
+        '''Return the maximum chunk duration, in milliseconds, for the table of
+        contents stream or None if the stream requests are not split by duration'''
+
+        durations = []
+        if self._chunk_ms:
+            durations.append(self._chunk_ms)
+
+        if self._max_particles:
+            rate = self.rate(stream)
+            if rate:
+                durations.append(max(self._max_particles / rate, self._min_chunk_ms))
+
+        if not durations:
+            return None
+
+        return int(min(durations))
+
+    def split(self, stream, begin_ms, end_ms, boundaries=None):
+        '''Return the list of (begin_ms, end_ms) chunks covering the request window
+        for the table of contents stream.  The window is first split at the
+        boundaries (ie: deployment start and stop times) falling inside it and each
+        piece is then split into equal chunks no longer than the chunk duration.
+
+        Parameters:
+            stream: table of contents stream metadata
+            begin_ms: window start time, in milliseconds
+            end_ms: window end time, in milliseconds
+            boundaries: optional list of unix timestamps, in milliseconds, the
+                window is split at
+        '''
+
+        edges = [begin_ms]
+        if boundaries and self._align_deployments:
+            edges.extend(sorted(set([b for b in boundaries if begin_ms < b < end_ms])))
+        edges.append(end_ms)
+
+        duration = self.chunk_duration(stream)
+
+        chunks = []
+        for (t0, t1) in zip(edges[:-1], edges[1:]):
+
+            if not duration or t1 - t0 <= duration:
+                chunks.append((t0, t1))
+                continue
+
+            num_chunks = int(math.ceil(float(t1 - t0) / duration))
+            chunk_edges = [t0 + (t1 - t0) * i // num_chunks for i in range(num_chunks)] + [t1]
+            chunks.extend(zip(chunk_edges[:-1], chunk_edges[1:]))
+
+        return chunks
+
+    def __repr__(self):
+        return '<RequestPlanner(chunk_ms={:s}, max_particles={:s}, align_deployments={:s})>'.format(str(self._chunk_ms),
+            str(self._max_particles),
+            str(self._align_deployments))
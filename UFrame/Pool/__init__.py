@@ -0,0 +1,176 @@
+"""
+Registry of UFrame clients for working against several UFrame instances (ie:
+production, test and regional mirrors).  One client is kept per base url, so the
+table of contents and search indexes of each instance are only loaded once, and
+the least recently used client is evicted when the registry is full.  Searches
+may be fanned out to all registered instances concurrently and the results
+merged.
+"""
+
+import threading
+from collections import OrderedDict
+
+from UFrame import UFrame
+from UFrame.Dispatch import RequestDispatcher
+
+class UFramePool(object):
+    '''Least recently used registry of UFrame clients, keyed by base url
+
+    Parameters:
+        max_clients: maximum number of clients kept (Default is 8)
+        concurrency: maximum number of instances searched concurrently (Default
+            is 4)
+        uframe_kwargs: keyword arguments passed to each new UFrame client (ie:
+            timeout, use_cache, toc_ttl)
+    '''
+
+    def __init__(self, max_clients=8, concurrency=4, **uframe_kwargs):
+
+        if max_clients < 1:
+            raise ValueError('max_clients must be a positive integer')
+
+        self._max_clients = max_clients
+        self._concurrency = concurrency
+        self._uframe_kwargs = uframe_kwargs
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def max_clients(self):
+        return self._max_clients
+
+    @property
+    def base_urls(self):
+        '''Base urls of all registered clients, from least to most recently used'''
+        with self._lock:
+            return list(self._clients.keys())
+
+    def get(self, base_url):
+        '''Return the client for base_url, creating it if it is not registered.
+        The table of contents of a new client is fetched on first access.'''
+
+        with self._lock:
+            uframe = self._clients.pop(base_url, None)
+            if uframe is None:
+                uframe = UFrame(base_url=base_url, **self._uframe_kwargs)
+
+            # Most recently used clients are kept at the end
+            self._clients[base_url] = uframe
+
+            evicted = []
+            while len(self._clients) > self._max_clients:
+                evicted.append(self._clients.popitem(last=False)[1])
+
+        for client in evicted:
+            self._close(client)
+
+        return uframe
+
+    def remove(self, base_url):
+        '''Remove and close the client for base_url'''
+
+        with self._lock:
+            uframe = self._clients.pop(base_url, None)
+
+        if uframe is not None:
+            self._close(uframe)
+
+    def clear(self):
+        '''Remove and close all clients'''
+
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients = OrderedDict()
+
+        for uframe in clients:
+            self._close(uframe)
+
+    def fan_out(self, method, args=(), kwargs=None, base_urls=None):
+        '''Call the UFrame method (ie: search_instruments) with args and kwargs on
+        the client for each base url, concurrently, and return a dictionary mapping
+        each base url to the result.
+
+        Parameters:
+            method: name of the UFrame method
+            args: positional arguments passed to the method
+            kwargs: keyword arguments passed to the method
+            base_urls: base urls of the instances to call (Default is all
+                registered clients).  Raises ValueError if there are more unique
+                base urls than max_clients.
+        '''
+
+        if base_urls is None:
+            base_urls = self.base_urls
+
+        kwargs = kwargs or {}
+
+        # Creating more clients than the pool keeps would evict, and close, clients
+        # this call is about to use
+        base_urls = list(OrderedDict.fromkeys(base_urls))
+        if len(base_urls) > self._max_clients:
+            raise ValueError('Cannot call {:d} instances with max_clients={:d}'.format(len(base_urls), self._max_clients))
+
+        # Create or refresh the clients before dispatching so that clients are not
+        # evicted while they are being called
+        clients = dict([(base_url, self.get(base_url)) for base_url in base_urls])
+
+        def call(base_url):
+            return (base_url, getattr(clients[base_url], method)(*args, **kwargs))
+
+        if self._concurrency < 2 or len(base_urls) < 2:
+            return dict([call(base_url) for base_url in base_urls])
+
+        dispatcher = RequestDispatcher(call, concurrency=self._concurrency)
+
+        return dict(dispatcher.dispatch(base_urls))
+
+    def search_instruments(self, target_string, base_urls=None, by_instance=False, prefix=False):
+        '''Search the table of contents of each instance for the instrument
+        reference designators containing, or beginning with if prefix is True,
+        target_string and return the sorted list of unique reference designators
+        found on any instance.  Set by_instance to True to return a dictionary
+        mapping each base url to its results.'''
+
+        results = self.fan_out('search_instruments', (target_string,), {'prefix' : prefix}, base_urls=base_urls)
+        if by_instance:
+            return results
+
+        return _merge_names(results)
+
+    def stream_to_instrument(self, target_stream, base_urls=None, by_instance=False):
+        '''Search the table of contents of each instance for the instrument
+        reference designators producing streams containing target_stream and
+        return the sorted list of unique reference designators found on any
+        instance.  Set by_instance to True to return a dictionary mapping each base
+        url to its results.'''
+
+        results = self.fan_out('stream_to_instrument', (target_stream,), base_urls=base_urls)
+        if by_instance:
+            return results
+
+        return _merge_names(results)
+
+    def _close(self, uframe):
+
+        # Only close transports created by the clients
+        if 'transport' not in self._uframe_kwargs and hasattr(uframe.transport, 'close'):
+            uframe.transport.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    def __contains__(self, base_url):
+        with self._lock:
+            return base_url in self._clients
+
+    def __repr__(self):
+        return '<UFramePool(clients={:d}, max_clients={:d})>'.format(len(self), self._max_clients)
+
+def _merge_names(results):
+
+    names = set()
+    for instance_names in results.values():
+        names.update(instance_names)
+
+    return sorted(names)
@@ -0,0 +1,140 @@
+"""
+Multiprocess request url creation for large sets of instruments (ie: every
+instrument on every array).  The instrument list is split into contiguous shards
+that are handed to a pool of forked worker processes.  Workers share the table
+of contents and coverage table already loaded by the parent process through
+copy-on-write memory, so nothing is fetched or parsed again, and the urls of
+each shard are merged in shard order, which is the same order as
+UFrame.iter_instrument_queries.
+"""
+
+import os
+import sys
+import multiprocessing
+
+from UFrame.Ledger import RequestLedger
+
+# Number of shards created for each worker process, so that workers finishing
+# early pick up more work
+DEFAULT_SHARDS_PER_PROCESS = 4
+
+# State inherited by the forked worker processes
+_worker_state = {}
+
+class ShardedRequestBuilder(object):
+    '''Creates the request urls of UFrame.iter_instrument_queries using a pool of
+    forked worker processes
+
+    Parameters:
+        uframe: UFrame instance.  The table of contents is loaded before the
+            workers are started.
+        processes: number of worker processes (Default is the number of CPUs)
+        shards_per_process: number of instrument shards created for each worker
+            process (Default is 4)
+    '''
+
+    def __init__(self, uframe, processes=None, shards_per_process=DEFAULT_SHARDS_PER_PROCESS):
+
+        if not processes:
+            processes = multiprocessing.cpu_count()
+
+        self._uframe = uframe
+        self._processes = processes
+        self._shards_per_process = shards_per_process
+
+    @property
+    def processes(self):
+        return self._processes
+
+    def iter_queries(self, reference_designators, **kwargs):
+        '''Generator yielding the request urls for all streams produced by the
+        specified reference designators, in the same order as
+        UFrame.iter_instrument_queries.  Keyword arguments are passed to
+        UFrame.iter_instrument_queries.  The urls are created in the calling
+        process if fork is not available or only one process is used.'''
+
+        uframe = self._uframe
+
+        if not uframe.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return
+
+        if type(reference_designators) == str:
+            reference_designators = [reference_designators]
+
+        instruments = uframe.resolve_instruments(reference_designators)
+        if not instruments:
+            return
+
+        # Workers read the parent's state, so they must be forked
+        context = _fork_context()
+        if self._processes < 2 or len(instruments) < 2 or context is None:
+            for url in uframe.iter_instrument_queries(instruments, **kwargs):
+                yield url
+            return
+
+        # Fetch everything the workers would otherwise request or create
+        # separately before the workers are forked
+        uframe.coverage
+        planner = kwargs.get('planner')
+        if planner and planner.align_deployments and kwargs.get('deployment_boundaries') is None:
+            kwargs['deployment_boundaries'] = uframe.get_deployment_boundaries(instruments,
+                concurrency=kwargs.get('concurrency', 1))
+
+        # SQLite connections cannot be used across processes, so workers open the
+        # ledger again
+        ledger = kwargs.pop('ledger', None)
+
+        _worker_state['uframe'] = uframe
+        _worker_state['kwargs'] = kwargs
+        _worker_state['ledger_path'] = ledger.path if ledger is not None else None
+
+        pool = context.Pool(processes=self._processes, initializer=_init_worker)
+        try:
+            for urls in pool.imap(_build_shard, _shard(instruments, self._processes * self._shards_per_process)):
+                for url in urls:
+                    yield url
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            _worker_state.clear()
+
+    def __repr__(self):
+        return '<ShardedRequestBuilder(processes={:d})>'.format(self._processes)
+
+def _fork_context():
+    '''Return the multiprocessing context creating worker processes with fork, or
+    None if fork is not available'''
+
+    if not hasattr(os, 'fork'):
+        return None
+
+    # Python 3 may default to the spawn or forkserver start methods
+    if hasattr(multiprocessing, 'get_context'):
+        try:
+            return multiprocessing.get_context('fork')
+        except ValueError:
+            return None
+
+    # Python 2 always forks
+    return multiprocessing
+
+def _shard(instruments, num_shards):
+    '''Split the sorted instrument list into at most num_shards contiguous shards'''
+
+    num_shards = max(1, min(num_shards, len(instruments)))
+
+    return [instruments[len(instruments) * i // num_shards:len(instruments) * (i + 1) // num_shards] for i in range(num_shards)]
+
+def _init_worker():
+
+    if _worker_state.get('ledger_path'):
+        _worker_state['kwargs']['ledger'] = RequestLedger(path=_worker_state['ledger_path'])
+
+def _build_shard(instruments):
+
+    return list(_worker_state['uframe'].iter_instrument_queries(instruments, **_worker_state['kwargs']))
@@ -0,0 +1,132 @@
+"""
+Compact, versioned snapshot file format for the derived UFrame table of contents
+index.  A snapshot stores the sorted instrument, stream, parameter and array name
+lists as NUL-delimited blocks and the instrument metadata and stream-to-parameter
+mappings as marshal blocks, so loading a snapshot is a single file read and one
+marshal load per section instead of decoding and indexing the JSON table
+of contents.  Every process loading a snapshot builds its own copy of the
+index; nothing is shared between processes.
+
+File layout:
+    8 byte magic (UFTOCSNP)
+    4 byte little-endian snapshot format version
+    4 byte little-endian header length
+    JSON header (source signature, interpreter version and section offsets)
+    section blocks
+"""
+
+import os
+import sys
+import json
+import struct
+import marshal
+
+SNAPSHOT_MAGIC = b'UFTOCSNP'
+SNAPSHOT_VERSION = 4
+
+_PREAMBLE = struct.Struct('<8sII')
+_LIST_DELIMITER = u'\x00'
+
+def write_snapshot(path, source, name_lists=None, objects=None):
+    '''Write a table of contents snapshot to path.  Returns True if the snapshot
+    was written.
+
+    Parameters:
+        path: snapshot file location
+        source: JSON serializable signature of the data the snapshot was created
+            from.  read_snapshot only returns the snapshot if the same source is
+            specified.
+        name_lists: dictionary mapping section names to lists of strings
+        objects: dictionary mapping section names to marshal serializable objects
+    '''
+
+    blocks = []
+    sections = {}
+    offset = 0
+
+    for (name, values) in (name_lists or {}).items():
+        block = _LIST_DELIMITER.join(values).encode('utf-8')
+        sections[name] = ['list', offset, len(block)]
+        blocks.append(block)
+        offset += len(block)
+
+    for (name, value) in (objects or {}).items():
+        try:
+            block = marshal.dumps(value)
+        except ValueError as e:
+            sys.stderr.write('Cannot serialize snapshot section {:s}: {:s}\n'.format(name, e))
+            return False
+        sections[name] = ['marshal', offset, len(block)]
+        blocks.append(block)
+        offset += len(block)
+
+    header = json.dumps({'source' : source,
+        'python' : list(sys.version_info[:2]),
+        'marshal' : marshal.version,
+        'sections' : sections}).encode('utf-8')
+
+    tmp_path = '{:s}.{:d}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as fid:
+            fid.write(_PREAMBLE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(header)))
+            fid.write(header)
+            for block in blocks:
+                fid.write(block)
+
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as e:
+        sys.stderr.write('Failed to write TOC snapshot {:s}: {:s}\n'.format(path, e))
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    return True
+
+def read_snapshot(path, source=None):
+    '''Return a dictionary mapping section names to the values stored in the snapshot
+    at path.  None is returned if the snapshot does not exist, was written by an
+    incompatible format or interpreter version or, if specified, was not created
+    from source.'''
+
+    if not os.path.isfile(path) or not os.path.getsize(path):
+        return None
+
+    try:
+        with open(path, 'rb') as fid:
+            data = fid.read()
+    except (IOError, OSError):
+        return None
+
+    try:
+        return _read_sections(data, source)
+    except (ValueError, EOFError, TypeError, KeyError, struct.error):
+        return None
+
+def _read_sections(data, source):
+
+    (magic, version, header_length) = _PREAMBLE.unpack(data[:_PREAMBLE.size])
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+
+    data_offset = _PREAMBLE.size + header_length
+    header = json.loads(data[_PREAMBLE.size:data_offset].decode('utf-8'))
+
+    # marshal data is only readable by the same interpreter version
+    if header['python'] != list(sys.version_info[:2]) or header['marshal'] != marshal.version:
+        return None
+
+    if source is not None and header['source'] != json.loads(json.dumps(source)):
+        return None
+
+    sections = {}
+    for (name, (kind, offset, length)) in header['sections'].items():
+        block = data[data_offset + offset:data_offset + offset + length]
+        if kind == 'list':
+            sections[name] = block.decode('utf-8').split(_LIST_DELIMITER) if block else []
+        else:
+            sections[name] = marshal.loads(block)
+
+    return sections
+
@@ -0,0 +1,68 @@
+"""
+Conversion between UFrame ISO-8601 timestamps and unix timestamps, in
+milliseconds.  Timestamps in the fixed format written by UFrame
+(YYYY-mm-ddTHH:MM:SS.sssZ) are parsed without dateutil.  All other formats fall
+back to dateutil.parser.  Timestamps without a time zone are assumed to be UTC.
+"""
+
+import re
+import time
+import calendar
+from dateutil import parser
+
+_iso8601_regexp = re.compile(r'^(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?Z?$')
+
+def iso8601_to_epoch_ms(timestamp):
+    '''Return the unix timestamp, in milliseconds, for the ISO-8601 formatted
+    timestamp.  Raises ValueError if the timestamp cannot be parsed.'''
+
+    if not timestamp:
+        raise ValueError('No timestamp specified')
+
+    match = _iso8601_regexp.match(timestamp)
+    if not match:
+        return _parse_epoch_ms(timestamp)
+
+    (year, month, day, hour, minute, second, fraction) = match.groups()
+
+    ms = 0
+    if fraction:
+        ms = int((fraction + '00')[:3])
+
+    (year, month, day, hour, minute, second) = (int(year), int(month), int(day), int(hour), int(minute), int(second))
+
+    # calendar.timegm does not validate its input and rolls invalid days over
+    # into the next month (ie: 2016-02-31 is 2016-03-02)
+    if not 1 <= month <= 12:
+        raise ValueError('Invalid timestamp: {:s}'.format(timestamp))
+    if not (1 <= day <= calendar.monthrange(year, month)[1] and hour <= 23 and minute <= 59 and second <= 60):
+        raise ValueError('Invalid timestamp: {:s}'.format(timestamp))
+
+    seconds = calendar.timegm((year, month, day, hour, minute, second))
+
+    return seconds * 1000 + ms
+
+def epoch_ms_to_iso8601(epoch_ms):
+    '''Return the UFrame request formatted (YYYY-mm-ddTHH:MM:SS.ffffffZ) timestamp
+    for the unix timestamp, in milliseconds'''
+
+    t = time.gmtime(epoch_ms // 1000)
+
+    return '{:04d}-{:02d}-{:02d}T{:02d}:{:02d}:{:02d}.{:06d}Z'.format(t.tm_year,
+        t.tm_mon,
+        t.tm_mday,
+        t.tm_hour,
+        t.tm_min,
+        t.tm_sec,
+        (epoch_ms % 1000) * 1000)
+
+def _parse_epoch_ms(timestamp):
+
+    try:
+        dt = parser.parse(timestamp)
+    except (ValueError, OverflowError, TypeError) as e:
+        raise ValueError('Invalid timestamp: {:s} ({:s})'.format(timestamp, str(e)))
+
+    # utctimetuple treats naive datetimes as UTC
+    return calendar.timegm(dt.utctimetuple()) * 1000 + dt.microsecond // 1000
+
@@ -0,0 +1,153 @@
+"""
+HTTP transport shared by all requests sent to a UFrame instance.  A single
+keep-alive requests.Session is used so that connections to the TOC (12576) and
+asset management (12587) services are pooled and reused across calls instead of
+opening a new TCP/TLS connection for every request.
+
+Failures to connect, where the request never reached the server, are retried
+for every request.  Read timeouts and connection resets, where the request may
+already have been received, are only retried for requests sent with
+retry_reads=True, since a GET sent to the stream end points queues a new
+stream engine job each time it is received.
+"""
+
+import time
+import requests
+from requests.adapters import HTTPAdapter
+try:
+    from requests.packages.urllib3.util.retry import Retry
+    from requests.packages.urllib3.exceptions import MaxRetryError
+except ImportError:
+    from urllib3.util.retry import Retry
+    from urllib3.exceptions import MaxRetryError
+
+class UFrameTransport(object):
+    '''Pooled, keep-alive HTTP transport for UFrame web-service requests
+
+    Parameters:
+        timeout: default request timeout, in seconds, used when no timeout is
+            passed to get (Default is 120 seconds)
+        pool_connections: number of per-host connection pools to cache (Default is 10)
+        pool_maxsize: maximum number of connections kept alive per host (Default is 10)
+        max_retries: number of times a request is retried after failing to
+            connect to the server.  Requests sent with retry_reads=True are
+            also retried this many times after a read timeout or connection
+            reset (Default is 3)
+        read_retries: number of times every request is retried after the
+            request was sent but no response was read, which may submit the
+            request to the server more than once (Default is 0).  Requests sent
+            with retry_reads=True are retried max_retries times.
+        backoff_factor: exponential backoff factor, in seconds, applied between
+            retries (Default is 0.5)
+        host_pool_sizes: optional dictionary mapping a url prefix
+            (ie: http://uframe.host:12587) to the maximum number of connections
+            kept alive for that host
+    '''
+
+    def __init__(self, timeout=120, pool_connections=10, pool_maxsize=10, max_retries=3, read_retries=0, backoff_factor=0.5, host_pool_sizes=None):
+
+        self._timeout = timeout
+        self._pool_connections = pool_connections
+        self._pool_maxsize = pool_maxsize
+        self._max_retries = max_retries
+        self._read_retries = read_retries
+        self._backoff_factor = backoff_factor
+
+        self._session = requests.Session()
+
+        # Replace the default adapters with pooled, retrying adapters
+        for prefix in ['http://', 'https://']:
+            self._session.mount(prefix, self._create_adapter(pool_maxsize))
+
+        # Optional dedicated pools for individual hosts
+        if host_pool_sizes:
+            for (prefix, maxsize) in host_pool_sizes.items():
+                self.set_host_pool_size(prefix, maxsize)
+
+    @property
+    def timeout(self):
+        return self._timeout
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+
+    @property
+    def session(self):
+        return self._session
+
+    def set_host_pool_size(self, url_prefix, pool_maxsize):
+        '''Mount a dedicated connection pool holding up to pool_maxsize connections
+        for all requests beginning with url_prefix
+
+        Parameters:
+            url_prefix: scheme, host and optional port (ie: http://uframe.host:12587)
+            pool_maxsize: maximum number of connections kept alive for the host
+        '''
+
+        self._session.mount(url_prefix, self._create_adapter(pool_maxsize))
+
+    def get(self, url, timeout=None, retry_reads=False, **kwargs):
+        '''Send a GET request for url using the pooled session.  Additional keyword
+        arguments are passed to requests.Session.get
+
+        Parameters:
+            url: request url
+            timeout: request timeout, in seconds (Default is the transport timeout)
+            retry_reads: set to True to also retry read timeouts and connection
+                resets up to max_retries times.  Only use for idempotent requests (ie: the
+                table of contents and asset management events).
+        '''
+
+        if timeout is None:
+            timeout = self._timeout
+
+        if not retry_reads:
+            return self._session.get(url, timeout=timeout, **kwargs)
+
+        attempt = 0
+        while True:
+            try:
+                return self._session.get(url, timeout=timeout, **kwargs)
+            except requests.exceptions.ReadTimeout:
+                if attempt >= self._max_retries:
+                    raise
+            except requests.exceptions.ConnectionError as e:
+                # MaxRetryError: the adapter has already exhausted its own
+                # connect (and read_retries) retries for this request
+                if attempt >= self._max_retries or isinstance(e.args[0] if e.args else None, MaxRetryError):
+                    raise
+            time.sleep(self._backoff_factor * (2 ** attempt))
+            attempt += 1
+
+    def head(self, url, timeout=None, **kwargs):
+        '''Send a HEAD request for url using the pooled session.  Additional keyword
+        arguments are passed to requests.Session.head'''
+
+        if timeout is None:
+            timeout = self._timeout
+
+        return self._session.head(url, timeout=timeout, **kwargs)
+
+    def close(self):
+        '''Close all pooled connections'''
+
+        self._session.close()
+
+    def _create_adapter(self, pool_maxsize):
+
+        # read=False raises read timeouts and connection resets
+        # (requests.exceptions.ReadTimeout/ConnectionError) instead of
+        # retrying them, since the request may already have been received.
+        # Only requests sent with retry_reads=True are retried by get.
+        retries = Retry(total=self._max_retries,
+            connect=self._max_retries,
+            read=self._read_retries or False,
+            backoff_factor=self._backoff_factor)
+
+        return HTTPAdapter(pool_connections=self._pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retries)
+
+    def __repr__(self):
+        return '<UFrameTransport(pool_maxsize={:d}, max_retries={:d})>'.format(self._pool_maxsize, self._max_retries)
+
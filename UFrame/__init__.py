@@ -10,12 +10,30 @@ import sys
 import os
 import datetime
 import time
+import calendar
+import numbers
 import re
-from dateutil import parser
+import threading
+import numpy as np
 from dateutil.relativedelta import relativedelta as tdelta
 from pytz import timezone
+from UFrame.Transport import UFrameTransport
+from UFrame.Cache import TocCache, DeploymentEventCache, DEFAULT_TOC_TTL, DEFAULT_DEPLOYMENT_TTL
+from UFrame.Snapshot import read_snapshot, write_snapshot
+from UFrame.Dispatch import RequestDispatcher
+from UFrame.Index import NameIndex
+from UFrame.Timestamps import iso8601_to_epoch_ms, epoch_ms_to_iso8601
+from UFrame.Coverage import StreamCoverage
+from UFrame.Intervals import IntervalIndex
+from UFrame.Parameters import ParameterCatalog
+from UFrame.Metrics import Metrics, MeteredChunks
+from UFrame.JsonStream import iter_toc_items, DEFAULT_CHUNK_SIZE as TOC_CHUNK_SIZE
 
 HTTP_STATUS_OK = 200
+HTTP_STATUS_NOT_MODIFIED = 304
+
+# Captures everything after /sensor/inv/ up to the query (?) of a request url
+_async_request_regexp = re.compile('^https?:\/\/.*\/sensor\/inv\/(.*)\?')
 
 _valid_relativedeltatypes = ('years',
     'months',
@@ -25,6 +43,18 @@ _valid_relativedeltatypes = ('years',
     'minutes',
     'seconds')
 
+# Fixed length relativedelta types, in milliseconds
+_fixed_relativedelta_ms = {'weeks' : 604800000,
+    'days' : 86400000,
+    'hours' : 3600000,
+    'minutes' : 60000,
+    'seconds' : 1000}
+
+# Stream request url template.  The UFrame data services url and query parameters
+# are formatted first, leaving the reference designator, method, stream and time
+# fields.
+_request_url_template = '{:s}:{:d}/sensor/inv/{{:s}}/{{:s}}/{{:s}}-{{:s}}/{{:s}}/{{:s}}?beginDT={{:s}}&endDT={{:s}}&format=application/{:s}&limit={:d}&execDPA={:s}&include_provenance={:s}&selogging={:s}&user={:s}'
+
 class UFrame(object):
     '''Class for interacting with the OOI UFrame data-services API
     
@@ -33,36 +63,74 @@ class UFrame(object):
             be taken from the UFRAME_BASE_URL environment variable, if set.
         port: server port (Default is 12576 and should not be changed)
         timeout: timeout duration (Default is 120 seconds)
+        transport: optional UFrameTransport (or object providing a compatible
+            get(url, timeout=None, **kwargs) method) used to send all requests.
+            A pooled, keep-alive UFrameTransport is created if not specified.
+            retry_reads=True is passed for the table of contents and asset
+            management requests, which may be safely retried.
+        use_cache: set to False to disable the on-disk table of contents and
+            deployment event caches (Default is True)
+        cache_dir: alternate table of contents cache location (Default is taken
+            from the UFRAME_CACHE_DIR environment variable or ~/.uframe/cache)
+        toc_ttl: number of seconds a cached table of contents is used before it
+            is revalidated with the UFrame instance (Default is 3600 seconds)
+        refresh_toc: set to True to ignore the cached table of contents and fetch
+            it from the UFrame instance (Default is False)
+        deployment_ttl: number of seconds cached deployment events are used
+            before they are fetched again (Default is 86400 seconds)
+        metrics: optional UFrame.Metrics.Metrics instance collecting the request,
+            decode and index timings, bytes transferred, retries and cache hits
+            and misses.  May be shared by several instances.  A new instance is
+            created if not specified.
     '''
     
-    def __init__(self, base_url=None, port=12576, timeout=120, validate=False):
+    def __init__(self, base_url=None, port=12576, timeout=120, validate=False, transport=None, use_cache=True, cache_dir=None, toc_ttl=DEFAULT_TOC_TTL, refresh_toc=False, deployment_ttl=DEFAULT_DEPLOYMENT_TTL, metrics=None):
         if not base_url:
             base_url = os.getenv('UFRAME_BASE_URL')
         
         # UFrame configuration
+        self._base_url = None
         self._url = None
         self._port = port
         self._timeout = timeout
         self._validate_uframe = validate
         
-        # Table of contents
-        self._toc = []
-        self._arrays = []
-        self._instruments = []
-        self._parameters = []
-        self._streams = []
+        # Timings and counters
+        if metrics is None:
+            metrics = Metrics()
+        self._metrics = metrics
+        
+        # HTTP transport shared by all requests
+        if not transport:
+            transport = UFrameTransport(timeout=timeout)
+        self._transport = transport
+        
+        # Table of contents cache
+        self._toc_cache = None
+        if use_cache:
+            self._toc_cache = TocCache(cache_dir=cache_dir, ttl=toc_ttl)
+        self._refresh_toc = refresh_toc
+        
+        # Deployment event cache
+        self._deployment_cache = None
+        if use_cache:
+            self._deployment_cache = DeploymentEventCache(cache_dir=cache_dir, ttl=deployment_ttl)
+        
+        # Table of contents, which is fetched on first access
+        self._toc_lock = threading.RLock()
+        self._reset_toc()
         
         # Deployment Events
         self._selected_deployment_events = []
         self._filtered_deployment_events = []
         self._filtered_parsed_deployment_events = []
         self._active_deployment_events = []
+        self._deployment_index = None
         
-        # Set the base_url
+        # Set the base_url.  The UFrame Table of Contents is fetched the first time
+        # it, or any of the instruments, streams, parameters or arrays lists, is
+        # accessed
         self.base_url = base_url
-
-        # Fetch the UFrame Table of Contents
-        self._fetch_toc()
         
         # Response from the last UFrame async request sent via self.send_async_request
         self._last_request_response = None
@@ -80,7 +148,7 @@ class UFrame(object):
         # Send the base url request to see if this is a valid uframe instance
         if self._validate_uframe:
             try:
-                r = requests.get(url)
+                r = self._get(url, idempotent=True)
             except requests.RequestException as e:
                 sys.stderr.write('Invalid UFrame instance: {:s} (Reason={:s})\n'.format(url, e.message))
                 sys.stderr.flush()
@@ -97,14 +165,17 @@ class UFrame(object):
         # Create the data services url
         self._url = '{:s}:{:d}/sensor/inv'.format(self.base_url, self.port)
 
-        # Fetch the table of contents at the new url
-        self._fetch_toc()
+        # Discard the table of contents of the previous url.  The table of contents
+        # at the new url is fetched on first access
+        with self._toc_lock:
+            self._reset_toc()
         
         # Empty out the deployment event props
         self._selected_deployment_events = []
         self._filtered_deployment_events = []
         self._filtered_parsed_deployment_events = []
         self._active_deployment_events = []
+        self._deployment_index = None
         
         # Asynchronous requests
         self._last_async_request_urls = []
@@ -125,28 +196,79 @@ class UFrame(object):
     def timeout(self, value):
         self._timeout = value
 
+    @property
+    def transport(self):
+        return self._transport
+    @transport.setter
+    def transport(self, transport):
+        self._transport = transport
+
+    @property
+    def toc_cache(self):
+        return self._toc_cache
+
+    @property
+    def deployment_cache(self):
+        return self._deployment_cache
+
     @property
     def toc(self):
+        self._load_toc()
         return self._toc
         
+    @property
+    def metrics(self):
+        return self._metrics
+        
     @property
     def url(self):
         return self._url
       
+    @property
+    def toc_loaded(self):
+        return self._toc_loaded
+      
     @property
     def instruments(self):
+        self._load_toc()
         return self._instruments
         
     @property
     def parameters(self):
+        self._load_toc()
         return self._parameters
         
     @property
     def streams(self):
+        self._load_toc()
         return self._streams
         
+    @property
+    def stream_parameters(self):
+        self._load_toc()
+        return self._stream_parameters
+        
+    @property
+    def coverage(self):
+        self._load_toc()
+        if self._coverage is None:
+            with self._toc_lock:
+                if self._coverage is None:
+                    self._coverage = StreamCoverage(self._toc, self._instruments)
+        return self._coverage
+        
+    @property
+    def parameter_catalog(self):
+        self._load_toc()
+        if self._parameter_catalog is None:
+            with self._toc_lock:
+                if self._parameter_catalog is None:
+                    self._parameter_catalog = self._build_parameter_catalog()
+        return self._parameter_catalog
+        
     @property
     def arrays(self):
+        self._load_toc()
         return self._arrays
         
     @property
@@ -161,6 +283,12 @@ class UFrame(object):
     def instrument_deployments(self):
         return self._filtered_parsed_deployment_events
         
+    @property
+    def deployment_index(self):
+        if self._deployment_index is None:
+            self.build_deployment_index()
+        return self._deployment_index
+        
     @property
     def last_async_request_urls(self):
         return self._last_async_request_urls
@@ -169,40 +297,298 @@ class UFrame(object):
     def last_async_responses(self):
         return self._last_async_request_responses
     
-    def search_instrument_deployments(self, ref_des, ref_des_search_string=None, status=None, raw=False):
+    def search_instrument_deployments(self, ref_des, ref_des_search_string=None, status=None, raw=False, refresh=False):
         '''Return the list of all deployment events for the specified reference
         designator, which may be partial or fully-qualified reference designator
         identifying the subsite, node or sensor.  An optional keyword argument
         (status) may be set to all, active or inactive to return all <default>,
-        active or inactive deployment events'''
-        
-        assets_url = '{:s}:12587/events/deployment/query?refdes={:s}'.format(self.base_url,
-            ref_des)
+        active or inactive deployment events.  Cached deployment events are used
+        if they have not expired, unless refresh is set to True.'''
         
         self._selected_deployment_events = []
         self._filtered_deployment_events = []
         self._filtered_parsed_deployment_events = []
         
         # Send the request
+        events = self._get_deployment_events(ref_des, refresh=refresh)
+        if events is None:
+            return self._filtered_parsed_deployment_events
+            
+        self._selected_deployment_events = events
+        
+        (self._filtered_deployment_events, self._filtered_parsed_deployment_events) = self._parse_deployment_events(events,
+            status=status,
+            ref_des_search_string=ref_des_search_string)
+            
+        return self._filtered_parsed_deployment_events
+    
+    def get_active_deployments(self, ref_des=None, ref_des_search_string=None, concurrency=1, refresh=False):
+        '''Retrieve the list of actively deployed instruments from the entire UFrame
+        asset management schema.  A reference designator may be specified to retrieve
+        only active deployment events for that instrument or array.  Resulting
+        events may also be filtered by specifying a ref_des_search_string.  Set
+        concurrency to the maximum number of deployment event requests to send
+        concurrently (Default is 1).  Cached deployment events are used if they
+        have not expired, unless refresh is set to True.'''
+        
+        if ref_des:
+            # Get the list of fully-qualified instrument reference designators for 
+            # the specified partial or fully qualified ref_des
+            instruments = self.search_instruments(ref_des)
+        else:
+            instruments = self.instruments
+            
+        instrument_events = self._get_instrument_deployment_events(instruments,
+            concurrency=concurrency,
+            refresh=refresh)
+            
+        # Accumulate the events in instrument order
+        events = []
+        for instrument in instruments:
+            if not instrument_events[instrument]:
+                continue
+            (filtered_events, parsed_events) = self._parse_deployment_events(instrument_events[instrument],
+                status='active',
+                ref_des_search_string=ref_des_search_string)
+            events.extend(parsed_events)
+            
+        self._active_deployment_events = events
+        
+        return events
+        
+    def get_deployment_events(self, ref_des=None, ref_des_search_string=None, concurrency=1, refresh=False):
+        '''Return the valid asset management deployment events of all instruments,
+        or all instruments matching the partial or fully-qualified ref_des, in
+        instrument order.  Resulting events may also be filtered by specifying a
+        ref_des_search_string.  Set concurrency to the maximum number of deployment
+        event requests to send concurrently (Default is 1).  Cached deployment
+        events are used if they have not expired, unless refresh is set to True.'''
+        
+        if ref_des:
+            instruments = self.search_instruments(ref_des)
+        else:
+            instruments = self.instruments
+            
+        instrument_events = self._get_instrument_deployment_events(instruments,
+            concurrency=concurrency,
+            refresh=refresh)
+            
+        events = []
+        for instrument in instruments:
+            if not instrument_events[instrument]:
+                continue
+            (filtered_events, parsed_events) = self._parse_deployment_events(instrument_events[instrument],
+                ref_des_search_string=ref_des_search_string)
+            events.extend(filtered_events)
+            
+        return events
+
+    def build_deployment_index(self, ref_des=None, concurrency=1, refresh=False):
+        '''Create the time interval index over the deployment events of all
+        instruments, or all instruments matching the partial or fully-qualified
+        ref_des, used by search_deployments_at and search_deployments_overlapping.
+        Deployment events are taken from the deployment event cache, if enabled,
+        and only fetched for instruments whose cached events have expired, unless
+        refresh is set to True.  Returns the index.'''
+        
+        if ref_des:
+            instruments = self.search_instruments(ref_des)
+        else:
+            instruments = self.instruments
+            
+        instrument_events = self._get_instrument_deployment_events(instruments,
+            concurrency=concurrency,
+            refresh=refresh)
+            
+        deployments = []
+        for instrument in instruments:
+            if not instrument_events[instrument]:
+                continue
+            (filtered_events, parsed_events) = self._parse_deployment_events(instrument_events[instrument])
+            deployments.extend(parsed_events)
+            
+        self._deployment_index = IntervalIndex([(d['event_start_ms'], d['event_stop_ms'], d) for d in deployments])
+        
+        return self._deployment_index
+        
+    def search_deployments_at(self, timestamp, ref_des_search_string=None):
+        '''Return the concise deployment events of all instruments deployed at the
+        ISO-8601 formatted timestamp or unix timestamp, in milliseconds.  Results
+        may be filtered by specifying a ref_des_search_string.  The deployment index
+        is created on the first search (see build_deployment_index).'''
+        
         try:
-            r = requests.get(assets_url)
-        except requests.exceptions.MissingSchema as e:
+            t = self._timestamp_to_epoch_ms(timestamp)
+        except ValueError as e:
             sys.stderr.write('{:s}\n'.format(e))
-            return self._filtered_parsed_deployment_events
+            return []
+            
+        return self._filter_deployments(self.deployment_index.at(t), ref_des_search_string)
+        
+    def search_deployments_overlapping(self, begin_ts, end_ts=None, ref_des_search_string=None):
+        '''Return the concise deployment events of all instruments deployed at any
+        time between the begin_ts and end_ts ISO-8601 formatted timestamps or unix
+        timestamps, in milliseconds.  All deployments ending after begin_ts are
+        returned if end_ts is not specified.  Results may be filtered by specifying
+        a ref_des_search_string.  The deployment index is created on the first
+        search (see build_deployment_index).'''
+        
+        try:
+            begin_ms = self._timestamp_to_epoch_ms(begin_ts)
+            end_ms = None
+            if end_ts is not None:
+                end_ms = self._timestamp_to_epoch_ms(end_ts)
+        except ValueError as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return []
+            
+        return self._filter_deployments(self.deployment_index.overlapping(begin_ms, end_ms), ref_des_search_string)
+        
+    def instruments_deployed_at(self, timestamp, ref_des_search_string=None):
+        '''Return the sorted list of reference designators of all instruments
+        deployed at the ISO-8601 formatted timestamp or unix timestamp, in
+        milliseconds'''
+        
+        deployments = self.search_deployments_at(timestamp, ref_des_search_string=ref_des_search_string)
+        
+        return sorted(set([d['instrument']['reference_designator'] for d in deployments]))
+        
+    def _filter_deployments(self, deployments, ref_des_search_string=None):
+        
+        if not ref_des_search_string:
+            return deployments
+            
+        return [d for d in deployments if d['instrument']['reference_designator'].find(ref_des_search_string) >= 0]
+        
+    def _timestamp_to_epoch_ms(self, timestamp):
+        '''Return the unix timestamp, in milliseconds, for an ISO-8601 formatted
+        timestamp or unix timestamp, in milliseconds'''
+        
+        if isinstance(timestamp, numbers.Number):
+            return timestamp
+            
+        return iso8601_to_epoch_ms(timestamp)
+        
+    def refresh_deployment_events(self, ref_des=None, concurrency=1, force=False):
+        '''Fetch the deployment events for all instruments, or all instruments
+        matching the partial or fully-qualified ref_des, whose cached events have
+        expired and store them in the deployment event cache.  Set force to True
+        to fetch the events for all instruments.  Returns the number of instruments
+        for which events were fetched.'''
+        
+        if not self._deployment_cache:
+            sys.stderr.write('Deployment event cache is disabled\n')
+            return 0
+            
+        if ref_des:
+            instruments = self.search_instruments(ref_des)
+        else:
+            instruments = self.instruments
+            
+        if not force:
+            instruments = [i for i in instruments if not self._deployment_cache.is_fresh(self._assets_url(), i)]
+            
+        instrument_events = self._get_instrument_deployment_events(instruments,
+            concurrency=concurrency,
+            refresh=True)
+            
+        return len([i for i in instruments if instrument_events[i] is not None])
+        
+    def _assets_url(self):
+        '''Return the asset management url of the UFrame instance'''
+        
+        return '{:s}:12587'.format(self.base_url)
+        
+    def _deployment_events_url(self, ref_des):
+        '''Return the asset management deployment events query url for ref_des'''
+        
+        return '{:s}/events/deployment/query?refdes={:s}'.format(self._assets_url(),
+            ref_des)
+            
+    def _get_deployment_events(self, ref_des, refresh=False):
+        '''Return the deployment events for ref_des from the deployment event cache
+        or, if they are not cached, have expired or refresh is True, from the asset
+        management deployment events query.  None is returned if the request
+        failed.'''
+        
+        if self._deployment_cache and not refresh:
+            events = self._deployment_cache.load(self._assets_url(), ref_des)
+            if events is not None:
+                return events
+                
+        events = self._fetch_deployment_events(self._deployment_events_url(ref_des))
+        if events is not None and self._deployment_cache:
+            self._deployment_cache.store(self._assets_url(), ref_des, events)
+            
+        return events
+        
+    def _get_instrument_deployment_events(self, instruments, concurrency=1, refresh=False):
+        '''Return a dictionary mapping each reference designator in instruments to
+        its deployment events (see _get_deployment_events).  Events that are not
+        cached are fetched using up to concurrency simultaneous requests.'''
+        
+        instrument_events = {}
+        if self._deployment_cache and not refresh:
+            for instrument in instruments:
+                events = self._deployment_cache.load(self._assets_url(), instrument)
+                if events is not None:
+                    instrument_events[instrument] = events
+                    
+        # Only send requests for the events that are not cached
+        uncached = [i for i in instruments if i not in instrument_events]
+        
+        if self._deployment_cache:
+            self._metrics.increment('deployments.cache.hits', len(instrument_events))
+            self._metrics.increment('deployments.cache.misses', len(uncached))
+        
+        def fetch_deployment_events(ref_des):
+            return (ref_des, self._get_deployment_events(ref_des, refresh=True))
+            
+        if concurrency > 1 and len(uncached) > 1:
+            # Make sure the transport keeps a connection alive for each worker
+            if hasattr(self._transport, 'set_host_pool_size'):
+                self._transport.set_host_pool_size(self._assets_url(),
+                    max(concurrency, 10))
+            dispatcher = RequestDispatcher(fetch_deployment_events, concurrency=concurrency)
+            instrument_events.update(dispatcher.dispatch(uncached))
+        else:
+            instrument_events.update([fetch_deployment_events(i) for i in uncached])
+            
+        return instrument_events
+        
+
+    def _fetch_deployment_events(self, assets_url):
+        '''Send the deployment events request and return the decoded response or
+        None if the request failed'''
+        
+        try:
+            r = self._get(assets_url, idempotent=True)
+        except requests.exceptions.RequestException as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return None
         
         # Check the request status
         if r.status_code != 200:
             sys.stderr.write('{:s}\n'.format(r.reason))
-            return self._filtered_parsed_deployment_events
+            return None
          
         # Decode the json response
         try:
-            self._selected_deployment_events = r.json()
+            with self._metrics.timer('deployments.decode_seconds'):
+                return r.json()
         except ValueError as e:
-            sys.stderr.write('{:s}\n'.format(r.message))
-            return self._filtered_parsed_deployment_events
+            sys.stderr.write('{:s}\n'.format(e))
+            return None
             
-        for event in self._selected_deployment_events:
+    def _parse_deployment_events(self, events, status=None, ref_des_search_string=None):
+        '''Parse and filter the deployment events returned by the asset management
+        deployment events query.  Returns the filtered deployment events and the
+        corresponding concise instrument deployment events.'''
+        
+        filtered_events = []
+        parsed_events = []
+        
+        for event in events:
             
             # Event must have a fully qualified reference designator
             if not event['referenceDesignator']['full']:
@@ -271,36 +657,11 @@ class UFrame(object):
                     continue
                     
             # If we've made it here, add the event and deployment_event
-            self._filtered_deployment_events.append(event)
-            self._filtered_parsed_deployment_events.append(deployment_event)
+            filtered_events.append(event)
+            parsed_events.append(deployment_event)
             
-        return self._filtered_parsed_deployment_events
+        return (filtered_events, parsed_events)
     
-    def get_active_deployments(self, ref_des=None, ref_des_search_string=None):
-        '''Retrieve the list of actively deployed instruments from the entire UFrame
-        asset management schema.  A reference designator may be specified to retrieve
-        only active deployment events for that instrument or array.  Resulting
-        events may also be filtered by specifying a ref_des_search_string'''
-        
-        events = []
-
-        if ref_des:
-            # Get the list of fully-qualified instrument reference designators for 
-            # the specified partial or fully qualified ref_des
-            instruments = self.search_instruments(ref_des)
-        else:
-            instruments = self.instruments
-            
-        for i in instruments:
-            new_events = self.search_instrument_deployments(i, status='active', ref_des_search_string=ref_des_search_string)
-            if not new_events:
-                continue
-            events = events + new_events
-            
-        self._active_deployment_events = events
-        
-        return events
-
     def validate_reference_designator(self, reference_designator):
         '''Validates the reference designator'''
 
@@ -311,24 +672,31 @@ class UFrame(object):
         else:
             return False
             
-    def search_instruments(self, target_string, metadata=False):
+    def search_instruments(self, target_string, metadata=False, prefix=False):
         '''Return the list of all instrument reference designators containing the 
         target_string from the current UFrame table of contents.
         
         Parameters:
             target_string: partial or fully-qualified reference designator
             metadata: set to True to return an array of dictionaries containing the
-                instrument metadata.'''
+                instrument metadata.
+            prefix: set to True to only return reference designators beginning
+                with target_string'''
         
-        if not self._toc:
+        if not self.toc:
             sys.stderr.write('You must fetch the table of contents first\n')
             sys.stderr.flush()
             return []
             
+        if prefix:
+            instruments = self._instrument_index.prefix(target_string)
+        else:
+            instruments = self._instrument_index.search(target_string)
+            
         if metadata:
-            return [self._toc[r] for r in self._instruments if r.find(target_string) >= 0]
+            return [self._toc[r] for r in instruments]
         else:
-            return [r for r in self._instruments if r.find(target_string) >= 0]
+            return instruments
         
     def search_parameters(self, target_string, metadata=False):
         '''Return the list of all stream parameters containing the target_string
@@ -339,16 +707,37 @@ class UFrame(object):
             metadata: set to True to return an array of dictionaries containing the
                 parameter metadata.'''
         
-        if not self._toc:
+        if not self.toc:
             sys.stderr.write('You must fetch the table of contents first\n')
             sys.stderr.flush()
             return []
             
+        parameters = self._parameter_index.search(target_string)
+        
         if metadata:
-            return [p for p in self._parameters if p['particleKey'].find(target_string) >= 0]
+            catalog = self.parameter_catalog
+            return [p for name in parameters for p in catalog.definitions(catalog.find(particle_key=name))]
         else:
-            #return [p['particleKey'] for p in self._parameters if p['particleKey'].find(target_string) >= 0]
-            return [p for p in self._parameters if p.find(target_string) >= 0]
+            return parameters
+            
+    def search_parameter_definitions(self, particle_key=None, unit=None, level=None):
+        '''Return the list of parameter definitions matching all of the specified
+        fully-qualified particle key, unit and data product level, sorted by
+        parameter id (pdId).
+        
+        Parameters:
+            particle_key: fully-qualified parameter name (ie: practical_salinity)
+            unit: parameter unit
+            level: data product level (ie: L2)'''
+        
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return []
+            
+        catalog = self.parameter_catalog
+        
+        return catalog.definitions(catalog.find(particle_key=particle_key, unit=unit, level=level))
     
     def search_streams(self, target_stream):
         '''Returns a the list of all streams containing the target_stream fragment
@@ -356,27 +745,23 @@ class UFrame(object):
         Parameters:
             target_stream: partial or full stream name'''
         
-        if not self._toc:
+        if not self.toc:
             sys.stderr.write('You must fetch the table of contents first\n')
             sys.stderr.flush()
             return []
             
-        return [s for s in self._streams if s.find(target_stream) >= 0]
+        return self._stream_index.search(target_stream)
         
     def search_arrays(self, target_array):
         
         arrays = []
         
-        if not self._toc:
+        if not self.toc:
             sys.stderr.write('You must fetch the table of contents first\n')
             sys.stderr.flush()
             return arrays
             
-        # Create a dict of unique array names
-        arrays = [a for a in self._arrays if a.find(target_array) >= 0]
-        arrays.sort()
-        
-        return arrays
+        return self._array_index.search(target_array)
         
     def stream_to_instrument(self, target_stream):
         '''Returns a the list of all instrument reference designators producing
@@ -387,27 +772,83 @@ class UFrame(object):
         
         instruments = []
         
-        if not self._toc:
+        if not self.toc:
             sys.stderr.write('You must fetch the table of contents first\n')
             sys.stderr.flush()
             return instruments
             
-        for r in self._toc.keys():
-            streams = [s for s in self._toc[r]['streams'] if s['stream'].find(target_stream) >= 0]
-            if not streams:
-                continue
-            for stream in streams:
-                if stream['reference_designator'] in instruments:
-                    continue
-                instruments.append(stream['reference_designator'])
-                
-        instruments.sort()
+        return self._reverse_lookup(self._stream_index.search(target_stream), self._stream_instruments)
+        
+    def parameter_to_streams(self, target_parameter):
+        '''Returns the list of all streams containing the specified parameter
+        
+        Parameters:
+            target_parameter: partial or full parameter name'''
         
-        return instruments
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return []
+            
+        return self._reverse_lookup(self._parameter_index.search(target_parameter), self._parameter_streams)
+        
+    def parameter_to_instrument(self, target_parameter):
+        '''Returns the list of all instrument reference designators producing the
+        specified parameter
+        
+        Parameters:
+            target_parameter: partial or full parameter name'''
+        
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return []
+            
+        return self._reverse_lookup(self._parameter_index.search(target_parameter), self._parameter_instruments)
+        
+    def parameter_id_to_streams(self, pd_id):
+        '''Returns the list of all streams containing the parameter id (pdId)
+        
+        Parameters:
+            pd_id: parameter id or list of parameter ids'''
+        
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return []
+            
+        return self.parameter_catalog.streams(pd_id)
+        
+    def parameter_id_to_instrument(self, pd_id):
+        '''Returns the list of all instrument reference designators producing the
+        parameter id (pdId)
+        
+        Parameters:
+            pd_id: parameter id or list of parameter ids'''
+        
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return []
+            
+        return self.parameter_catalog.instruments(pd_id)
+        
+    def _reverse_lookup(self, names, reverse_map):
+        '''Return the sorted union of the reverse_map values of all names'''
+        
+        if len(names) == 1:
+            return list(reverse_map.get(names[0], []))
+            
+        values = set()
+        for name in names:
+            values.update(reverse_map.get(name, []))
+            
+        return sorted(values)
         
     def instrument_to_streams(self, reference_designator):
         '''Return the list of all streams produced by the partial or fully-qualified
-        reference designator.
+        reference designator.  Stream beginTime and endTime values are available
+        as unix timestamps, in milliseconds, in beginTimeEpochMs and endTimeEpochMs.
         
         Parameters:
             reference_designator: partial or fully-qualified reference designator to search
@@ -421,45 +862,84 @@ class UFrame(object):
         
         for instrument in instruments:
             
-            streams = self._toc[instrument]['streams']
-            
-            for stream in streams:
-                
-                # Add the reference designator
-                stream['reference_designator'] = instrument
-                
-                # Parse stream beginTime and endTime to create a unix timestamp, in milliseconds
-                try:
-                    stream_dt0 = parser.parse(stream['beginTime'])
-	        except ValueError as e:
-                    sys.stderr.write('{:s}: {:s} ({:s})\n'.format(stream['stream'], stream['beginTime'], e.message))
-	                sys.stderr.flush()
-	                continue
-
-                try:
-                    stream_dt1 = parser.parse(stream['endTime'])
-	        except ValueError as e:
-                    sys.stderr.write('{:s}: {:s} ({:s})\n'.format(stream['stream'], stream['endTime'], e.message))
-	                sys.stderr.flush()
-	                continue
+            for stream in self._toc[instrument]['streams']:
                 
-                # Format the endDT and beginDT values for the query
-                stream['beginTimeEpochMs'] = None
-                stream['endTimeEpochMs'] = None
-                try:
-                    stream['endTimeEpochMs'] = int(time.mktime(stream_dt1.timetuple()))*1000
-                except ValueError as e:
-                    sys.stderr.write('endTime conversion error: {:s}-{:s}: {:s}\n'.format(instrument, stream['stream'], e.message))
-
-                try:
-                    stream['beginTimeEpochMs'] = int(time.mktime(stream_dt0.timetuple()))*1000
-                except ValueError as e:
-                    sys.stderr.write('beginTime conversion error: {:s}-{:s}: {:s}\n'.format(instrument, stream['stream'], e.message))
-
+                # Skip streams with invalid beginTime or endTime values
+                if stream['beginTimeEpochMs'] is None or stream['endTimeEpochMs'] is None:
+                    continue
+                    
                 ref_des_streams.append(stream)
                 
         return ref_des_streams
         
+    def instrument_to_parameters(self, reference_designator):
+        '''Return a dictionary mapping each instrument matching the partial or
+        fully-qualified reference designator to the list of unique parameter
+        definitions produced by the instrument, in stream order.
+        
+        Parameters:
+            reference_designator: partial or fully-qualified reference designator to search
+        '''
+        
+        ref_des_parameters = {}
+        
+        instruments = self.search_instruments(reference_designator)
+        if not instruments:
+            return ref_des_parameters
+            
+        for instrument in instruments:
+            
+            # Old TOC lists the parameters in the instrument record
+            if not self._stream_parameters:
+                ref_des_parameters[instrument] = self._toc[instrument].get('instrument_parameters', [])
+                continue
+                
+            pd_ids = set()
+            parameters = []
+            for stream in self._toc[instrument]['streams']:
+                for p in self._stream_parameters.get(stream['stream'], []):
+                    if p['pdId'] in pd_ids:
+                        continue
+                    pd_ids.add(p['pdId'])
+                    parameters.append(p)
+                    
+            ref_des_parameters[instrument] = parameters
+            
+        return ref_des_parameters
+        
+    def search_stream_coverage(self, begin_ts, end_ts, reference_designator=None, telemetry=None):
+        '''Return the list of all streams with time coverage overlapping the window
+        from begin_ts to end_ts.
+        
+        Parameters:
+            begin_ts: ISO-8601 formatted window start time
+            end_ts: ISO-8601 formatted window end time
+            reference_designator: optional partial or fully-qualified reference
+                designator to restrict the search to
+            telemetry: optional telemetry type to restrict the search to
+        '''
+        
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return []
+            
+        try:
+            begin_ms = iso8601_to_epoch_ms(begin_ts)
+            end_ms = iso8601_to_epoch_ms(end_ts)
+        except ValueError as e:
+            sys.stderr.write('Invalid time window: {:s}\n'.format(e))
+            sys.stderr.flush()
+            return []
+            
+        instruments = None
+        if reference_designator:
+            instruments = self.search_instruments(reference_designator)
+            
+        rows = self.coverage.select(reference_designators=instruments, method=telemetry)
+        
+        return self.coverage.records(self.coverage.overlapping(begin_ms, end_ms, rows=rows))
+        
     def get_instrument_metadata(self, reference_designator):
         '''Returns the full metadata listing for all instruments matching the
         partial or fully qualified reference designator.
@@ -514,21 +994,21 @@ class UFrame(object):
                 sys.stderr.flush()
                 return []
         
-        begin_dt = None
-        end_dt = None
+        begin_ms = None
+        end_ms = None
         if begin_ts:
             try:
-                begin_dt = parser.parse(begin_ts)
+                begin_ms = iso8601_to_epoch_ms(begin_ts)
             except ValueError as e:
-                sys.stderr.write('Invalid begin_dt: {:s} ({:s})\n'.format(begin_ts, e.message))
+                sys.stderr.write('Invalid begin_dt: {:s} ({:s})\n'.format(begin_ts, e))
                 sys.stderr.flush()
                 return []    
                 
         if end_ts:
             try:
-                end_dt = parser.parse(end_ts)
+                end_ms = iso8601_to_epoch_ms(end_ts)
             except ValueError as e:
-                sys.stderr.write('Invalid end_dt: {:s} ({:s})\n'.format(end_ts, e.message))
+                sys.stderr.write('Invalid end_dt: {:s} ({:s})\n'.format(end_ts, e))
                 sys.stderr.flush()
                 return []
                 
@@ -568,69 +1048,51 @@ class UFrame(object):
                 if telemetry and instrument_stream['method'].find(telemetry) == -1:
                     continue
                     
-                #Figure out what we're doing for time
-                dt0 = None
-                dt1 = None
-               
-                try:
-                    stream_dt0 = parser.parse(instrument_stream['beginTime'])
-                except ValueError:
-                    sys.stderr.write('{:s}-{:s}: Invalid beginTime ({:s})\n'.format(instrument, instrument_stream['stream'], instrument_stream['beginTime']))
-                    continue
-
-                try:
-                    stream_dt1 = parser.parse(instrument_stream['endTime'])
-                except ValueError:
-                    sys.stderr.write('{:s}-{:s}: Invalid endTime ({:s})\n'.format('instrument', instrument_stream['stream'], instrument_stream['endTime']))
-                    continue
+                # Stream time coverage parsed when the table of contents was created
+                stream_ms0 = instrument_stream['beginTimeEpochMs']
+                stream_ms1 = instrument_stream['endTimeEpochMs']
                 
-                sys.stderr.flush()
-
+                #Figure out what we're doing for time
                 if time_delta_type and time_delta_value:
-                    dt1 = stream_dt1
-                    dt0 = dt1 - tdelta(**dict({time_delta_type : time_delta_value})) 
+                    ms1 = stream_ms1
+                    ms0 = self._subtract_relativedelta(ms1, time_delta_type, time_delta_value)
                 else:
-                    if begin_dt:
-                        dt0 = begin_dt
+                    if begin_ms is not None:
+                        ms0 = begin_ms
                     else:
-                        dt0 = stream_dt0
+                        ms0 = stream_ms0
                         
-                    if end_dt:
-                        dt1 = end_dt
+                    if end_ms is not None:
+                        ms1 = end_ms
                     else:
-                        dt1 = stream_dt1
+                        ms1 = stream_ms1
                 
                 # Format the endDT and beginDT values for the query
                 try:
-                    ts1 = dt1.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-                except ValueError as e:
-                    sys.stderr.write('{:s}-{:s}: {:s}\n'.format(instrument, instrument_stream['stream'], e.message))
-                    continue
-
-                try:
-                    ts0 = dt0.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+                    ts1 = epoch_ms_to_iso8601(ms1)
+                    ts0 = epoch_ms_to_iso8601(ms0)
                 except ValueError as e:
-                    sys.stderr.write('{:s}-{:s}: {:s}\n'.format(instrument, instrument_stream['stream'], e.message))
+                    sys.stderr.write('{:s}-{:s}: {:s}\n'.format(instrument, instrument_stream['stream'], e))
                     continue
                         
                 # Make sure the specified or calculated start and end time are within
                 # the stream metadata times if time_check=True
                 if time_check:
-                    if dt1 > stream_dt1:
+                    if ms1 > stream_ms1:
                         sys.stderr.write('time_check ({:s}-{:s}): End time exceeds stream endTime ({:s} > {:s})\n'.format(ref_des, instrument_stream['stream'], ts1, instrument_stream['endTime']))
                         sys.stderr.write('time_check ({:s}-{:s}): Setting request end time to stream endTime\n'.format(ref_des, instrument_stream['stream']))
                         sys.stderr.flush()
                         ts1 = instrument_stream['endTime']
+                        ms1 = stream_ms1
                     
-                    if dt0 < stream_dt0:
+                    if ms0 < stream_ms0:
                         sys.stderr.write('time_check ({:s}-{:s}): Start time is earlier than stream beginTime ({:s} < {:s})\n'.format(ref_des, instrument_stream['stream'], ts0, instrument_stream['beginTime']))
                         sys.stderr.write('time_check ({:s}-{:s}): Setting request begin time to stream beginTime\n'.format(ref_des, instrument_stream['stream']))
                         ts0 = instrument_stream['beginTime']
+                        ms0 = stream_ms0
                        
                     # Check that ts0 < ts1
-                    dt0 = parser.parse(ts0)
-                    dt1 = parser.parse(ts1)
-                    if dt0 >= dt1:
+                    if ms0 >= ms1:
                         sys.stderr.write('{:s}: Invalid time range specified ({:s} >= {:s})\n'.format(instrument_stream['stream'], ts0, ts1))
                         continue
 
@@ -662,6 +1124,214 @@ class UFrame(object):
                             
         return self._last_async_request_urls
     
+    def iter_instrument_queries(self, reference_designators, streams=None, telemetry=None, time_delta_type=None, time_delta_value=None, begin_ts=None, end_ts=None, time_check=True, exec_dpa=True, application_type='netcdf', provenance=True, limit=-1, annotations=False, user='_nouser', email=None, selogging=False, planner=None, concurrency=1, ledger=None, deployment_boundaries=None):
+        '''Generator yielding the request urls that conform to the UFrame API for
+        all streams produced by the specified reference designators.  The time and
+        query parameters are parsed once and shared by all urls, which are yielded
+        one at a time in reference designator order.  The parameters are the same
+        as UFrame.instrument_to_query, except:
+        
+        Parameters:
+            reference_designators: list of partial or fully-qualified reference
+                designators
+            streams: optional list of stream names to restrict the urls to
+            planner: optional UFrame.Planner.RequestPlanner used to split each
+                request window into time chunks, yielding one url per chunk
+            concurrency: maximum number of simultaneous deployment event requests
+                sent when the planner aligns chunks with deployments (Default is 1)
+            ledger: optional UFrame.Ledger.RequestLedger.  Only the parts of each
+                request window that are not recorded in the ledger are requested.
+            deployment_boundaries: optional dictionary mapping reference
+                designators to their deployment start and stop times, used
+                instead of fetching the deployment events when the planner aligns
+                chunks with deployments
+        '''
+        
+        if not self.toc:
+            sys.stderr.write('You must fetch the table of contents first\n')
+            sys.stderr.flush()
+            return
+            
+        if type(reference_designators) == str:
+            reference_designators = [reference_designators]
+            
+        if time_delta_type and time_delta_value:
+            if time_delta_type not in _valid_relativedeltatypes:
+                sys.stderr.write('Invalid dateutil.relativedelta type: {:s}\n'.format(time_delta_type))
+                sys.stderr.flush()
+                return
+                
+        begin_ms = None
+        end_ms = None
+        try:
+            if begin_ts:
+                begin_ms = iso8601_to_epoch_ms(begin_ts)
+            if end_ts:
+                end_ms = iso8601_to_epoch_ms(end_ts)
+        except ValueError as e:
+            sys.stderr.write('Invalid time range: {:s}\n'.format(e))
+            sys.stderr.flush()
+            return
+            
+        # Resolve the fully-qualified reference designators once
+        instruments = self.resolve_instruments(reference_designators)
+        if not instruments:
+            return
+            
+        # Select the coverage table rows for all requested streams
+        coverage = self.coverage
+        rows = coverage.select(reference_designators=instruments, method=telemetry)
+        if streams:
+            streams = set(streams)
+            stream_ids = [i for (i, s) in enumerate(coverage.streams) if s in streams]
+            rows = rows[np.in1d(coverage.stream_ids[rows], stream_ids)]
+            
+        # Calculate all request windows at once
+        stream_ms0 = coverage.begin_ms[rows]
+        stream_ms1 = coverage.end_ms[rows]
+        if time_delta_type and time_delta_value:
+            ms1 = stream_ms1
+            if time_delta_type in _fixed_relativedelta_ms:
+                ms0 = ms1 - _fixed_relativedelta_ms[time_delta_type] * time_delta_value
+            else:
+                # Calendar offsets (months, years) depend on the end time
+                ms0 = np.array([self._subtract_relativedelta(t, time_delta_type, time_delta_value) for t in ms1], dtype=np.int64)
+        else:
+            ms0 = stream_ms0 if begin_ms is None else np.full(len(rows), begin_ms, dtype=np.int64)
+            ms1 = stream_ms1 if end_ms is None else np.full(len(rows), end_ms, dtype=np.int64)
+            
+        # Clip the windows to the stream coverage if time_check=True
+        if time_check:
+            clipped0 = ms0 < stream_ms0
+            clipped1 = ms1 > stream_ms1
+            (ms0, ms1, valid) = coverage.clip(rows, ms0, ms1)
+        else:
+            valid = np.ones(len(rows), dtype=bool)
+            clipped0 = clipped1 = np.zeros(len(rows), dtype=bool)
+            
+        # Url template containing the shared query parameters
+        url_template = _request_url_template.format(self._base_url,
+            12576,
+            application_type,
+            limit,
+            str(exec_dpa).lower(),
+            str(provenance).lower(),
+            str(selogging).lower(),
+            user)
+        if email:
+            url_template = '{:s}&email={:s}'.format(url_template, email.replace('{', '{{').replace('}', '}}'))
+            
+        # Deployment start and stop times the request windows are split at
+        if not planner or not planner.align_deployments:
+            deployment_boundaries = {}
+        elif deployment_boundaries is None:
+            deployment_boundaries = self.get_deployment_boundaries(instruments, concurrency=concurrency)
+            
+        instrument_ids = coverage.reference_designator_ids[rows]
+        for (k, row) in enumerate(rows):
+            
+            instrument_stream = coverage.record(row)
+            
+            if not valid[k]:
+                sys.stderr.write('{:s}: Invalid time range specified ({:s} >= {:s})\n'.format(instrument_stream['stream'],
+                    epoch_ms_to_iso8601(int(ms0[k])),
+                    epoch_ms_to_iso8601(int(ms1[k]))))
+                continue
+                
+            instrument = coverage.instruments[instrument_ids[k]]
+            r_tokens = instrument.split('-')
+            
+            window_ms0 = int(ms0[k])
+            window_ms1 = int(ms1[k])
+            
+            # Skip the parts of the window that have already been requested
+            if ledger is not None:
+                windows = ledger.missing(instrument,
+                    instrument_stream['method'],
+                    instrument_stream['stream'],
+                    window_ms0,
+                    window_ms1)
+            else:
+                windows = [(window_ms0, window_ms1)]
+                
+            chunks = []
+            for (missing_ms0, missing_ms1) in windows:
+                if planner:
+                    chunks.extend(planner.split(instrument_stream,
+                        missing_ms0,
+                        missing_ms1,
+                        boundaries=deployment_boundaries.get(instrument)))
+                else:
+                    chunks.append((missing_ms0, missing_ms1))
+                
+            for (chunk_ms0, chunk_ms1) in chunks:
+                
+                # Windows clipped to the stream coverage use the stream metadata times
+                if clipped0[k] and chunk_ms0 == window_ms0:
+                    ts0 = instrument_stream['beginTime']
+                else:
+                    ts0 = epoch_ms_to_iso8601(chunk_ms0)
+                if clipped1[k] and chunk_ms1 == window_ms1:
+                    ts1 = instrument_stream['endTime']
+                else:
+                    ts1 = epoch_ms_to_iso8601(chunk_ms1)
+                    
+                yield url_template.format(r_tokens[0],
+                    r_tokens[1],
+                    r_tokens[2],
+                    r_tokens[3],
+                    instrument_stream['method'],
+                    instrument_stream['stream'],
+                    ts0,
+                    ts1)
+                    
+    def resolve_instruments(self, reference_designators):
+        '''Return the sorted list of valid, fully-qualified reference designators
+        matching the list of partial or fully-qualified reference designators'''
+        
+        instruments = set()
+        for ref_des in reference_designators:
+            if ref_des in self.toc:
+                instruments.add(ref_des)
+            else:
+                instruments.update(self.search_instruments(ref_des))
+                
+        return sorted([i for i in instruments if self.validate_reference_designator(i)])
+        
+    def get_deployment_boundaries(self, instruments, concurrency=1):
+        '''Return a dictionary mapping each reference designator in instruments to
+        the sorted list of its deployment start and stop times, in milliseconds.
+        The result may be passed to iter_instrument_queries as
+        deployment_boundaries.
+
+        Parameters:
+            instruments: list of fully-qualified reference designators
+            concurrency: maximum number of simultaneous deployment event requests
+                (Default is 1)
+        '''
+        
+        instrument_events = self._get_instrument_deployment_events(instruments, concurrency=concurrency)
+        
+        boundaries = {}
+        for (instrument, events) in instrument_events.items():
+            times = set()
+            for event in events or []:
+                if event.get('eventStartTime'):
+                    times.add(event['eventStartTime'])
+                if event.get('eventStopTime'):
+                    times.add(event['eventStopTime'])
+            boundaries[instrument] = sorted(times)
+            
+        return boundaries
+        
+    def _subtract_relativedelta(self, epoch_ms, time_delta_type, time_delta_value):
+        '''Subtract the calendar offset from the unix timestamp, in milliseconds'''
+        
+        dt1 = datetime.datetime.utcfromtimestamp(epoch_ms / 1000.)
+        dt0 = dt1 - tdelta(**dict({time_delta_type : time_delta_value}))
+        
+        return calendar.timegm(dt0.timetuple())*1000 + dt0.microsecond//1000
+        
     def instrument_to_deployment_query(self, ref_des, deployment_number=0, tense=None, telemetry=None, begin_ts=None, end_ts=None, time_check=True, exec_dpa=True, application_type='netcdf', provenance=True, limit=-1, annotations=False, user=None, email=None):
         
         urls = []
@@ -750,6 +1420,60 @@ class UFrame(object):
         '''Validate and send the request url directly to the UFrame instance.  The 
         request response is returned and also stored in UFrame.last_async_response'''
     
+        urls = self._async_request_urls(urls)
+        if not urls:
+            return None
+            
+        # Clear the last set of request responses    
+        self._last_async_request_responses = []
+        
+        for url in urls:
+            
+            # Store the response
+            self._last_async_request_responses.append(self._send_async_request(url))
+        
+        return self._last_async_request_responses
+        
+    def dispatch_async_requests(self, urls=[], concurrency=4, rate_limit=None, callback=None):
+        '''Validate and send the request urls concurrently to the UFrame instance.
+        Responses are returned in the order the requests complete and are also stored
+        in UFrame.last_async_responses.
+        
+        Parameters:
+            urls: single request url or list of request urls (Default is the last
+                set of request urls created by the instance)
+            concurrency: maximum number of requests in flight (Default is 4)
+            rate_limit: optional maximum number of requests per second sent to
+                the UFrame instance
+            callback: optional function called with each response as soon as the
+                request completes
+        '''
+        
+        urls = self._async_request_urls(urls)
+        if not urls:
+            return None
+            
+        # Make sure the transport keeps a connection alive for each worker
+        if hasattr(self._transport, 'set_host_pool_size'):
+            self._transport.set_host_pool_size('{:s}:{:d}'.format(self.base_url, self.port),
+                max(concurrency, 10))
+                
+        dispatcher = RequestDispatcher(self._send_async_request,
+            concurrency=concurrency,
+            rate_limit=rate_limit)
+        
+        # Clear the last set of request responses    
+        self._last_async_request_responses = []
+        
+        for response in dispatcher.dispatch(urls, callback=callback):
+            self._last_async_request_responses.append(response)
+            
+        return self._last_async_request_responses
+        
+    def _async_request_urls(self, urls):
+        '''Return the list of request urls to send, which defaults to the last batch
+        of request urls created by the instance'''
+        
         # Send the last batch of requests created by the instance if no urls
         if not urls:
             urls = self._last_async_request_urls
@@ -763,187 +1487,402 @@ class UFrame(object):
             sys.stderr.write('No urls to send\n')
             return None
             
-        # Clear the last set of request responses    
-        self._last_async_request_responses = []
+        return urls
         
-        for url in urls:
+    def _send_async_request(self, url):
+        '''Validate and send a single request url and return the response'''
+        
+        # Remove leading and trailing whitespace from the url
+        request_url = url.strip()
+        
+        response = {'requestUrl' : request_url,
+            'status' : False,
+            'status_code' : -1,
+            'response' : None,
+            'reason' : None,
+            'stream' : {},
+            'reference_designator' : None,
+            'instrument' : None,
+            'm2m' : {'status' : False, 'request_params' : None}}
+        
+        # The url must be sent to the UFrame.base_url UFrame instance
+        if not url.startswith(self.base_url):
+            response['requestUrl'] = 'URL points to alternate UFrame instance'
+            return response
+        
+        # Parse the request url and grab everything after /sensor/inv/ up to the query (?)
+        match = _async_request_regexp.match(url)
+        
+        # Match required   
+        if not match:
+            response['reason'] = 'UFrame Instance: Badly Formatted Request'
+            return response
+        
+        # A properly formatted UFrame request url will split into 5 pieces    
+        request_tokens = match.groups()[0].split('/')
+        if len(request_tokens) != 5:
+            response['reason'] = 'UFrame Instance: Badly Formatted Request'
+            return response
+        
+        # Create the stream name from the 5 tokens
+        response['reference_designator'] = '-'.join(request_tokens[:3])
+    #    response['stream'] = '-'.join(request_tokens)
+        # 2016-09-30: kerfoot@marine - new stream name
+        order = [0,1,2,4,3]
+        response['stream'] = '-'.join([request_tokens[x] for x in order])
+    
+        response['instrument'] = {'subsite' : request_tokens[0],
+            'node' : request_tokens[1],
+            'sensor' : request_tokens[2],
+            'telemetry' : request_tokens[3],
+            'stream' : request_tokens[4]}
             
-            # Remove leading and trailing whitespace from the url
-            request_url = url.strip()
-            
-            response = {'requestUrl' : request_url,
-                'status' : False,
-                'status_code' : -1,
-                'response' : None,
-                'reason' : None,
-                'stream' : {},
-                'reference_designator' : None,
-                'instrument' : None,
-                'm2m' : {'status' : False, 'request_params' : None}}
-            
-            # The url must be sent to the UFrame.base_url UFrame instance
-            if not url.startswith(self.base_url):
-                response['requestUrl'] = 'URL points to alternate UFrame instance'
-                # Store the response
-                self._last_async_request_responses.append(response)
-                continue 
-            
-            # Parse the request url and grab everything after /sensor/inv/ up to the query (?)
-            request_regexp = re.compile('^https?:\/\/.*\/sensor\/inv\/(.*)\?')
-            match = request_regexp.match(url)
-            
-            # Match required   
-            if not match:
-                response['reason'] = 'UFrame Instance: Badly Formatted Request'
-                # Store the response
-                self._last_async_request_responses.append(response)
-                continue 
-            
-            # A properly formatted UFrame request url will split into 5 pieces    
-            request_tokens = match.groups()[0].split('/')
-            if len(request_tokens) != 5:
-                response['reason'] = 'UFrame Instance: Badly Formatted Request'
-                # Store the response
-                self._last_async_request_responses.append(response)
-                continue 
-            
-            # Create the stream name from the 5 tokens
-            response['reference_designator'] = '-'.join(request_tokens[:3])
-        #    response['stream'] = '-'.join(request_tokens)
-            # 2016-09-30: kerfoot@marine - new stream name
-            order = [0,1,2,4,3]
-            response['stream'] = '-'.join([request_tokens[x] for x in order])
-        
-            response['instrument'] = {'subsite' : request_tokens[0],
-                'node' : request_tokens[1],
-                'sensor' : request_tokens[2],
-                'telemetry' : request_tokens[3],
-                'stream' : request_tokens[4]}
-                
-            try:
-                r = requests.get(request_url)
-            except requests.exceptions.RequestException as e:
-                sys.stderr.write('{:s}\n'.format(e))
-                response['reason'] = e
-                # Store the response
-                self._last_async_request_responses.append(response)
-                continue 
-            
-            response['status_code'] = r.status_code
-            response['reason'] = r.reason
-                
-            if r.status_code != 200:
-                # Store the response
-                self._last_async_request_responses.append(response)
-                continue 
+        try:
+            r = self._get(request_url)
+        except requests.exceptions.RequestException as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            response['reason'] = e
+            return response
+        
+        response['status_code'] = r.status_code
+        response['reason'] = r.reason
             
-            # Decode the json UFrame response    
-            try:
+        if r.status_code != 200:
+            self._metrics.increment('async.failures')
+            return response
+        
+        # Decode the json UFrame response    
+        try:
+            with self._metrics.timer('async.decode_seconds'):
                 response['response'] = r.json()
-                response['status'] = True
-            except requests.exceptions.ValueError as e:
-                response['reason'] = e
+            response['status'] = True
+        except ValueError as e:
+            response['reason'] = e
+        
+        return response
+        
+    def fetch_toc(self, refresh=False):
+        '''Fetch the UFrame table of contents and create the instruments, streams,
+        parameters and arrays lists.  The cached table of contents is used if it
+        is fresh, unless refresh is set to True.'''
+        
+        with self._toc_lock:
+            self._toc_loaded = self._fetch_toc(refresh=refresh)
+        
+    def _load_toc(self):
+        '''Fetch the table of contents if it has not been fetched for the current
+        base_url.  Threads accessing the table of contents while it is being
+        fetched wait for the fetch to complete.'''
+        
+        if self._toc_loaded:
+            return
             
-            # Store the response
-            self._last_async_request_responses.append(response)
+        with self._toc_lock:
+            # Fetched by another thread while waiting
+            if self._toc_loaded or not self._base_url:
+                return
+            self._toc_loaded = self._fetch_toc(refresh=self._refresh_toc)
+            
+    def _reset_toc(self):
+        '''Empty the table of contents and search indexes'''
         
-        return self._last_async_request_responses
+        self._toc = []
+        self._arrays = []
+        self._instruments = []
+        self._parameters = []
+        self._streams = []
+        self._stream_parameters = {}
+        self._parameter_definitions = {}
+        
+        # Reverse lookup maps
+        self._stream_instruments = {}
+        self._parameter_streams = {}
+        self._parameter_instruments = {}
         
-    def _fetch_toc(self):
+        # Table of contents search indexes
+        self._build_toc_indexes()
+        
+        self._toc_loaded = False
+        
+    def _fetch_toc(self, refresh=False):
         '''Fetch the response from the UFrame table of contents end point and create
         a data structure containing the streams and instruments from the Uframe instance.
         This should be the first method you call once you point the UFrame instance
-        at a URL.'''
+        at a URL.  The cached response is used if it has not expired, unless refresh
+        is set to True.  An expired cached response is used if it cannot be
+        revalidated.  Returns True if the table of contents was loaded.'''
         
         self._port = 12576
         self._url = '{:s}:{:d}/sensor/inv/toc'.format(self._base_url, self._port)
+        toc_url = self._url
+        
+        use_cache = self._toc_cache and not refresh
+        
+        # Revalidate expired cache entries.  A 304 response means the cached entry
+        # is still valid and a 200 response returns the new table of contents
+        toc_response = None
+        cache_writer = None
+        cached = use_cache and self._toc_cache.metadata(toc_url) is not None
+        cache_valid = cached and self._toc_cache.is_fresh(toc_url)
+        if not cached:
+            (status_code, toc_response, cache_writer) = self._request_toc(toc_url)
+        elif not cache_valid:
+            self._metrics.increment('toc.cache.revalidations')
+            (status_code, toc_response, cache_writer) = self._request_toc(toc_url, conditional=True)
+            cache_valid = status_code == HTTP_STATUS_NOT_MODIFIED
+            # Fall back to the expired response if the request failed
+            if not cache_valid and toc_response is None and os.path.isfile(self._toc_cache.body_path(toc_url)):
+                sys.stderr.write('Failed to revalidate TOC.  Using expired cached TOC: {:s}\n'.format(self._toc_cache.body_path(toc_url)))
+                sys.stderr.flush()
+                cache_valid = True
+            
+        if self._toc_cache:
+            self._metrics.increment('toc.cache.hits' if cache_valid else 'toc.cache.misses')
+            
+        if cache_valid:
+            # Use the derived index snapshot if it was created from the cached response
+            with self._metrics.timer('toc.snapshot_load_seconds'):
+                snapshot_loaded = self._load_toc_snapshot(toc_url)
+            if snapshot_loaded:
+                self._metrics.increment('toc.snapshot.hits')
+                return True
+            self._metrics.increment('toc.snapshot.misses')
+            if os.path.isfile(self._toc_cache.body_path(toc_url)):
+                toc_response = self._toc_cache.iter_body(toc_url, TOC_CHUNK_SIZE)
+            else:
+                (status_code, toc_response, cache_writer) = self._request_toc(toc_url)
+            
+        if toc_response is None:
+            return False
+            
+        # Read the response incrementally, creating the index as it is read.  A
+        # new response is written to the cache as it is read.
+        chunks = MeteredChunks(toc_response)
+        if not self._ingest_toc(iter_toc_items(chunks), source=chunks):
+            # Remove the invalid response so that it is fetched again instead of
+            # being loaded until the entry expires
+            if cache_writer:
+                cache_writer.discard()
+            if self._toc_cache:
+                self._toc_cache.clear(toc_url)
+            return False
+            
+        # Only cache responses that were parsed
+        if cache_writer and not cache_writer.commit():
+            sys.stderr.write('Failed to write TOC cache: {:s}\n'.format(self._toc_cache.body_path(toc_url)))
+            return True
         
+        if self._toc_cache:
+            self._write_toc_snapshot(toc_url)
+            
+        return True
+        
+    def _load_toc_snapshot(self, toc_url):
+        '''Load the derived table of contents index from the snapshot created from
+        the cached toc_url response.  Returns True if the snapshot was loaded'''
+        
+        snapshot = read_snapshot(self._toc_cache.snapshot_path(toc_url),
+            source=self._toc_cache.signature(toc_url))
+        if not snapshot:
+            return False
+            
+        self._toc = snapshot['toc']
+        self._stream_parameters = snapshot['stream_parameters']
+        self._parameter_definitions = snapshot['parameter_definitions']
+        self._instruments = snapshot['instruments']
+        self._streams = snapshot['streams']
+        self._parameters = snapshot['parameters']
+        self._arrays = snapshot['arrays']
+        self._stream_instruments = snapshot['stream_instruments']
+        self._parameter_streams = snapshot['parameter_streams']
+        self._parameter_instruments = snapshot['parameter_instruments']
+        
+        self._build_toc_indexes()
+        
+        return True
+        
+    def _write_toc_snapshot(self, toc_url):
+        '''Write the derived table of contents index to the snapshot for the cached
+        toc_url response'''
+        
+        source = self._toc_cache.signature(toc_url)
+        if not source:
+            return False
+            
+        return write_snapshot(self._toc_cache.snapshot_path(toc_url),
+            source,
+            name_lists={'instruments' : self._instruments,
+                'streams' : self._streams,
+                'parameters' : self._parameters,
+                'arrays' : self._arrays},
+            objects={'toc' : self._toc,
+                'stream_parameters' : self._stream_parameters,
+                'parameter_definitions' : self._parameter_definitions,
+                'stream_instruments' : self._stream_instruments,
+                'parameter_streams' : self._parameter_streams,
+                'parameter_instruments' : self._parameter_instruments})
+        
+    def _request_toc(self, toc_url, conditional=False):
+        '''Send the table of contents request and return the response status code,
+        the response body as an iterable of byte chunks and, if the cache is
+        enabled, the UFrame.Cache.TocCacheWriter the body is written to as it is
+        read.  The writer must be committed once the body has been parsed.  If
+        conditional is True, the cached response is revalidated and no response is
+        returned if it has not been modified.'''
+        
+        headers = {}
+        if self._toc_cache and conditional:
+            headers = self._toc_cache.validators(toc_url)
+            
         try:
-            r = requests.get(self._url)
+            r = self._get(toc_url, idempotent=True, headers=headers, stream=True)
         except requests.RequestException as e:
             sys.stderr.write('{:s} ({:s})\n'.format(e.message, type(e)))
-            return
+            return (None, None, None)
+            
+        # Cached response is still valid
+        if r.status_code == HTTP_STATUS_NOT_MODIFIED and self._toc_cache:
+            r.close()
+            self._toc_cache.touch(toc_url)
+            return (r.status_code, None, None)
             
         if r.status_code != HTTP_STATUS_OK:
-            sys.stderr.write('Failed to fetch TOC: {:s}\n'.format(r.message))
-            return
+            r.close()
+            sys.stderr.write('Failed to fetch TOC: {:s}\n'.format(r.reason))
+            return (r.status_code, None, None)
             
-        try:
-            toc_response = r.json()
-        except ValueError as e:
-            sys.stderr.write('{:s}\n'.format(e.message))
-            return
+        chunks = self._count_received_bytes(r.iter_content(TOC_CHUNK_SIZE))
+        if not self._toc_cache:
+            return (r.status_code, chunks, None)
+            
+        # Write the response to the cache while it is parsed
+        cache_writer = self._toc_cache.writer(toc_url,
+            etag=r.headers.get('ETag'),
+            last_modified=r.headers.get('Last-Modified'))
+            
+        return (r.status_code, cache_writer.iter_chunks(chunks), cache_writer)
+        
+    def _parse_toc(self, toc_response):
+        '''Create the instrument, stream, parameter and array lists from the decoded
+        table of contents response.  Returns True if the response was parsed'''
         
         # Old TOC is an array of instruments.
         # New TOC is a dictionary
         # So we need to convert based on type(toc_response)
         if type(toc_response) == list:
-            # Map the instrument metadata response to the reference designator
-            self._toc = {i['reference_designator']:i for i in toc_response}
-    
-            # Create the sorted list of reference designators
-            ref_des = self._toc.keys()
-            ref_des.sort()
-            self._instruments = ref_des
+            toc_items = [(None, i) for i in toc_response]
+        elif type(toc_response) == dict:
+            toc_items = [(key, item) for key in ['instruments', 'parameter_definitions'] for item in toc_response.get(key, [])]
+            toc_items.extend([('parameters_by_stream', item) for item in toc_response.get('parameters_by_stream', {}).items()])
+        else:
+            sys.stderr.write('Unknown TOC response\n')
+            return False
             
-            # Create a list of unique parameters
-            parameters = []
-            streams = []
-            for i in toc_response:
-                for p in i['instrument_parameters']:
-                    if not parameters:
-                        parameters.append(p['particleKey'])
-                        continue
-                    elif p['particleKey'] in parameters:
-                        continue
-                        
-                    parameters.append(p['particleKey'])
+        return self._ingest_toc(toc_items)
+        
+    def _count_received_bytes(self, chunks):
+        '''Generator yielding the chunks of a streamed response and counting the
+        bytes received'''
+        
+        for chunk in chunks:
+            self._metrics.increment('network.bytes', len(chunk))
+            yield chunk
+            
+    def _ingest_toc(self, toc_items, source=None):
+        '''Create the instrument, stream, parameter and array lists from the sequence
+        of (section, item) tuples read from the table of contents response by
+        UFrame.JsonStream.iter_toc_items.  Items are added to the index as they are
+        read, so the sequence may be a generator reading the response incrementally.
+        source is the optional UFrame.Metrics.MeteredChunks the items are decoded
+        from, used to separate the read and decode times.  Returns True if the
+        response was parsed'''
+        
+        t0 = time.time()
+        
+        toc = {}
+        
+        # Old TOC: unique parameter and stream names.  Names are interned so that
+        # every record shares a single copy of each name
+        interned = {}
+        old_parameters = set()
+        old_streams = set()
+        
+        # New TOC: parameter definitions and parameter ids by stream
+        param_defs = {}
+        parameters = []
+        parameters_by_stream = {}
+        
+        old_toc = False
+        
+        try:
+            for (section, item) in toc_items:
+                
+                if section is None:
+                    old_toc = True
+                    toc[item['reference_designator']] = item
+                    
+                    for p in item['instrument_parameters']:
+                        p['particleKey'] = interned.setdefault(p['particleKey'], p['particleKey'])
+                        old_parameters.add(p['particleKey'])
                         
-                for s in i['streams']:
-                    if not streams:
-                        streams.append(s['stream'])
-                    elif s['stream'] in streams:
-                        continue
+                    for s in item['streams']:
+                        s['stream'] = interned.setdefault(s['stream'], s['stream'])
+                        old_streams.add(s['stream'])
                         
-                    streams.append(s['stream'])
-        elif type(toc_response) == dict:
-            # Map the instrument metadata response to the reference designator
-            self._toc = {i['reference_designator']:i for i in toc_response['instruments']}
-            
-            # Create the sorted list of reference designators
-            ref_des = self._toc.keys()
-            ref_des.sort()
-            self._instruments = ref_des
-            
-            # Create a dictionary mapping parameter id (pdId) to the parameter metadata
-            param_defs = {p['pdId']:p for p in toc_response['parameter_definitions']}
-            # Loop through the toc_response['parameters_by_stream'] and create
-            # an array of dictionaries containing all paramters for the specified stream
-            stream_defs = {}
-            for s in toc_response['parameters_by_stream'].keys():
-                stream_params = [param_defs[pdId] for pdId in toc_response['parameters_by_stream'][s]]
-                for p in stream_params:
-                    p[u'stream'] = s
+                elif section == 'instruments':
+                    toc[item['reference_designator']] = item
                     
-                stream_defs[s] = stream_params
+                elif section == 'parameter_definitions':
+                    # Map the parameter id (pdId) to the parameter metadata
+                    param_defs[item['pdId']] = item
+                    parameters.append(item['particle_key'])
                     
-            # Loop through self._toc (instruments) and add the stream_params
-            for i in self._toc.keys():
-                self._toc[i]['instrument_parameters'] = []
-                for s in self._toc[i]['streams']:
-                    s['reference_designator'] = i
-                    self._toc[i]['instrument_parameters'] = self._toc[i]['instrument_parameters'] + stream_defs[s['stream']]
+                elif section == 'parameters_by_stream':
+                    (stream, pd_ids) = item
+                    parameters_by_stream[stream] = pd_ids
                     
-            # Create the full list of parameter names
-            parameters = [p['particle_key'] for p in toc_response['parameter_definitions']]
-            # Create the full list of streams
-            streams = stream_defs.keys()
+        except (ValueError, KeyError, TypeError, IOError, requests.RequestException) as e:
+            sys.stderr.write('Invalid TOC response: {:s}\n'.format(e))
+            return False
+            
+        # Time spent reading the response chunks is not part of the decode time
+        t1 = time.time()
+        read_seconds = 0.
+        if source:
+            read_seconds = source.seconds
+            self._metrics.observe('toc.read_seconds', read_seconds)
+            self._metrics.increment('toc.bytes', source.bytes)
+        self._metrics.observe('toc.decode_seconds', t1 - t0 - read_seconds)
+        
+        self._toc = toc
+        
+        # Create the sorted list of reference designators
+        ref_des = self._toc.keys()
+        ref_des.sort()
+        self._instruments = ref_des
+        
+        if old_toc:
+            # The old TOC does not map streams to parameters
+            self._stream_parameters = {}
+            self._parameter_definitions = {}
             
+            parameters = list(old_parameters)
+            streams = list(old_streams)
         else:
-            sys.stderr.write('Unknown TOC response\n')
-            return
+            # Map each stream to its parameter definitions.  Definitions are shared
+            # by all streams containing the parameter and are not copied into the
+            # instrument records.  Use instrument_to_parameters or the
+            # parameter_catalog to find the parameters of an instrument.
+            stream_defs = {}
+            for s in parameters_by_stream.keys():
+                stream_defs[s] = [param_defs[pdId] for pdId in parameters_by_stream[s]]
+                    
+            self._stream_parameters = stream_defs
+            self._parameter_definitions = param_defs
+            
+            # Create the full list of streams
+            streams = stream_defs.keys()
             
-        
         # Sort parameters
         parameters.sort()
         # Sort streams
@@ -955,7 +1894,137 @@ class UFrame(object):
         arrays = {t.split('-')[0]:True for t in self._toc.keys()}.keys()
         arrays.sort()
         self._arrays = arrays
+        
+        self._parse_stream_times()
+        
+        self._build_reverse_maps()
+        
+        self._build_toc_indexes()
+        
+        self._metrics.observe('toc.index_seconds', time.time() - t1)
+        
+        return True
+        
+    def _parse_stream_times(self):
+        '''Add the reference designator and the beginTime and endTime unix
+        timestamps, in milliseconds, (beginTimeEpochMs and endTimeEpochMs) to all
+        streams in the table of contents.  Timestamps that cannot be parsed are
+        set to None.'''
+        
+        for (instrument, metadata) in self._toc.items():
+            for stream in metadata['streams']:
+                
+                stream['reference_designator'] = instrument
+                
+                stream['beginTimeEpochMs'] = None
+                try:
+                    stream['beginTimeEpochMs'] = iso8601_to_epoch_ms(stream['beginTime'])
+                except ValueError as e:
+                    sys.stderr.write('{:s}-{:s}: Invalid beginTime ({:s})\n'.format(instrument, stream['stream'], e))
+                    
+                stream['endTimeEpochMs'] = None
+                try:
+                    stream['endTimeEpochMs'] = iso8601_to_epoch_ms(stream['endTime'])
+                except ValueError as e:
+                    sys.stderr.write('{:s}-{:s}: Invalid endTime ({:s})\n'.format(instrument, stream['stream'], e))
+        
+    def _build_reverse_maps(self):
+        '''Create the maps of stream names to the sorted list of reference
+        designators producing the stream, parameter names to the sorted list of
+        streams containing the parameter and parameter names to the sorted list of
+        reference designators producing the parameter'''
+        
+        stream_instruments = {}
+        parameter_streams = {}
+        parameter_instruments = {}
+        
+        for (instrument, metadata) in self._toc.items():
+            for stream in metadata['streams']:
+                stream_instruments.setdefault(stream['stream'], set()).add(instrument)
+                
+        if self._stream_parameters:
+            # New TOC: parameters are mapped to streams, so parameter instruments
+            # are the instruments producing any of those streams
+            for (stream, stream_params) in self._stream_parameters.items():
+                for p in stream_params:
+                    parameter_streams.setdefault(p['particle_key'], set()).add(stream)
+                    
+            for (parameter, streams) in parameter_streams.items():
+                instruments = set()
+                for stream in streams:
+                    instruments.update(stream_instruments.get(stream, []))
+                parameter_instruments[parameter] = instruments
+        else:
+            # Old TOC: parameters are listed by instrument
+            for (instrument, metadata) in self._toc.items():
+                for p in metadata['instrument_parameters']:
+                    parameter_instruments.setdefault(p['particleKey'], set()).add(instrument)
+                    if p.get('stream'):
+                        parameter_streams.setdefault(p['particleKey'], set()).add(p['stream'])
+                        
+        self._stream_instruments = {k:sorted(v) for (k, v) in stream_instruments.items()}
+        self._parameter_streams = {k:sorted(v) for (k, v) in parameter_streams.items()}
+        self._parameter_instruments = {k:sorted(v) for (k, v) in parameter_instruments.items()}
+        
+    def _build_toc_indexes(self):
+        '''Create the search indexes for the sorted instrument, stream, parameter
+        and array lists'''
+        
+        self._instrument_index = NameIndex(self._instruments)
+        self._stream_index = NameIndex(self._streams)
+        self._parameter_index = NameIndex(self._parameters)
+        self._array_index = NameIndex(self._arrays)
+        
+        # Stream coverage table and parameter catalog are created on first access
+        self._coverage = None
+        self._parameter_catalog = None
+        
+    def _build_parameter_catalog(self):
+        '''Create the parameter catalog from the stream parameter definitions or,
+        for the old TOC, the instrument parameters'''
+        
+        if self._stream_parameters:
+            return ParameterCatalog(self._stream_parameters,
+                self._stream_instruments,
+                definitions=self._parameter_definitions)
+            
+        instrument_parameters = {i:self._toc[i].get('instrument_parameters', []) for i in self._instruments}
+        
+        return ParameterCatalog({}, self._stream_instruments, instrument_parameters=instrument_parameters)
 
+    def _get(self, url, idempotent=False, **kwargs):
+        '''Send a GET request for url through the instance transport using the
+        instance timeout.  The request time, retries and, unless the response is
+        streamed, the bytes received are added to the instance metrics.  Read
+        timeouts are only retried if idempotent is True, since every stream
+        request received by UFrame queues a new job.'''
+        
+        self._metrics.increment('network.requests')
+        
+        # Only passed when set, so that transports without read retries may be
+        # used
+        if idempotent:
+            kwargs['retry_reads'] = True
+            
+        t0 = time.time()
+        try:
+            r = self._transport.get(url, timeout=self._timeout, **kwargs)
+        except requests.RequestException:
+            self._metrics.increment('network.errors')
+            raise
+        finally:
+            self._metrics.observe('network.seconds', time.time() - t0)
+            
+        # Retries made by the urllib3 connection pool
+        retries = getattr(getattr(r, 'raw', None), 'retries', None)
+        if getattr(retries, 'history', None):
+            self._metrics.increment('network.retries', len(retries.history))
+            
+        if not kwargs.get('stream') and getattr(r, 'content', None) is not None:
+            self._metrics.increment('network.bytes', len(r.content))
+            
+        return r
+        
     def __repr__(self):
         if self._base_url:
             return '<UFrame(url={:s})>'.format(self.base_url)
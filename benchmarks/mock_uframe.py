@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+try:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+# Ports used by UFrame for the data services and asset management end points
+SENSOR_PORT = 12576
+ASSETS_PORT = 12587
+
+TOC_SHAPES = ['list', 'dict']
+
+_methods = [u'telemetered', u'recovered_host', u'recovered_inst', u'streamed']
+
+def main(args):
+    '''Serve synthetic UFrame table of contents, deployment event and asynchronous
+    request responses on the UFrame data services (12576) and asset management
+    (12587) ports until interrupted.  Point a UFrame client at the server with
+    base_url=http://<host>.'''
+
+    server = MockUFrameServer(host=args.host,
+        shape=args.shape,
+        instruments=args.instruments,
+        latency=args.latency,
+        toc_latency=args.toc_latency,
+        seed=args.seed)
+
+    sys.stderr.write('Serving {:s} TOC ({:d} instruments): {:s}\n'.format(args.shape, args.instruments, server.base_url))
+
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+    return 0
+
+def create_list_toc(num_instruments, num_parameters, unique_parameters, unique_streams, rand=random):
+    '''Create a synthetic list-shaped (old) table of contents response'''
+
+    parameter_names = [u'parameter_{:05d}'.format(p) for p in range(unique_parameters)]
+    stream_names = [u'stream_{:04d}'.format(s) for s in range(unique_streams)]
+
+    toc_response = []
+    for i in range(num_instruments):
+        reference_designator = _reference_designator(i)
+        instrument = {'reference_designator' : reference_designator,
+            'streams' : [{'stream' : rand.choice(stream_names),
+                'method' : u'telemetered',
+                'beginTime' : u'2015-01-01T00:00:00.000Z',
+                'endTime' : u'2016-01-01T00:00:00.000Z'} for s in range(3)],
+            'instrument_parameters' : [{'particleKey' : rand.choice(parameter_names)} for p in range(num_parameters)]}
+        toc_response.append(instrument)
+
+    return toc_response
+
+def create_dict_toc(num_instruments, parameters_per_stream, unique_parameters, unique_streams, rand=random):
+    '''Create a synthetic dict-shaped (new) table of contents response containing
+    the instruments, parameter definitions and parameters by stream'''
+
+    parameter_definitions = [{'pdId' : u'PD{:d}'.format(p),
+        'particle_key' : u'parameter_{:05d}'.format(p),
+        'unit' : rand.choice([u'1', u'm', u's', u'degC', u'dbar']),
+        'data_product_level' : rand.choice([u'L0', u'L1', u'L2'])} for p in range(unique_parameters)]
+
+    pd_ids = [p['pdId'] for p in parameter_definitions]
+    stream_names = [u'stream_{:04d}'.format(s) for s in range(unique_streams)]
+
+    parameters_by_stream = dict([(s, rand.sample(pd_ids, parameters_per_stream)) for s in stream_names])
+
+    instruments = []
+    for i in range(num_instruments):
+        instruments.append({'reference_designator' : _reference_designator(i),
+            'streams' : [_stream(rand.choice(stream_names), rand) for s in range(3)]})
+
+    return {'instruments' : instruments,
+        'parameter_definitions' : parameter_definitions,
+        'parameters_by_stream' : parameters_by_stream}
+
+def create_deployment_events(reference_designator, num_deployments=3):
+    '''Create the asset management deployment events for a fully-qualified
+    reference designator.  The last deployment is active.'''
+
+    (subsite, node, sensor) = reference_designator.split('-', 2)
+
+    events = []
+    t0 = 1420070400000
+    for d in range(1, num_deployments + 1):
+        stop_ms = t0 + 15552000000
+        events.append({'referenceDesignator' : {'full' : True,
+                'subsite' : subsite,
+                'node' : node,
+                'sensor' : sensor,
+                'vocab' : None},
+            'eventName' : reference_designator,
+            'eventId' : d,
+            'deploymentNumber' : d,
+            'eventStartTime' : t0,
+            'eventStopTime' : None if d == num_deployments else stop_ms})
+        t0 = stop_ms
+
+    return events
+
+def _reference_designator(i):
+
+    return u'CE{:02d}ISSM-MFD{:02d}-{:02d}-CTDBPC{:05d}'.format(i % 10,
+        i % 40,
+        i % 8,
+        i)
+
+def _stream(stream, rand):
+
+    begin_year = rand.randint(2014, 2017)
+
+    return {'stream' : stream,
+        'method' : rand.choice(_methods),
+        'beginTime' : u'{:d}-{:02d}-01T00:00:00.000Z'.format(begin_year, rand.randint(1, 12)),
+        'endTime' : u'{:d}-{:02d}-15T12:30:00.500Z'.format(begin_year + rand.randint(1, 3), rand.randint(1, 12)),
+        'count' : rand.randint(1000, 10000000)}
+
+class MockUFrameServer(object):
+    '''Local stand-in for a UFrame instance, serving a synthetic table of contents,
+    asset management deployment events and asynchronous request responses on the
+    UFrame data services and asset management ports
+
+    Parameters:
+        host: address to listen on (Default is 127.0.0.1)
+        shape: table of contents shape, list (old) or dict (new) (Default is dict)
+        instruments: number of instruments in the table of contents
+        latency: number of seconds each deployment event and asynchronous request
+            response is delayed
+        toc_latency: number of seconds each table of contents response is delayed
+        seed: random seed used to create the table of contents
+    '''
+
+    def __init__(self, host='127.0.0.1', shape='dict', instruments=1000, latency=0., toc_latency=0., seed=0):
+
+        if shape not in TOC_SHAPES:
+            raise ValueError('Invalid TOC shape: {:s}'.format(shape))
+
+        self._host = host
+        self._shape = shape
+        self._instruments = instruments
+        self.latency = latency
+        self.toc_latency = toc_latency
+        self._seed = seed
+
+        self._toc_body = None
+        self._toc_etag = None
+        self._servers = []
+        self._lock = threading.Lock()
+        self._hits = {}
+
+    @property
+    def base_url(self):
+        return 'http://{:s}'.format(self._host)
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @property
+    def instruments(self):
+        return self._instruments
+
+    @property
+    def hits(self):
+        '''Dictionary mapping each end point to the number of requests received'''
+        with self._lock:
+            return dict(self._hits)
+
+    def reset_hits(self):
+        with self._lock:
+            self._hits = {}
+
+    def toc_body(self):
+        '''Return the encoded table of contents response, which is created once'''
+
+        if self._toc_body is None:
+            rand = random.Random(self._seed)
+            if self._shape == 'list':
+                toc_response = create_list_toc(self._instruments, 60, 2000, 500, rand=rand)
+            else:
+                toc_response = create_dict_toc(self._instruments, 40, 2000, 500, rand=rand)
+
+            self._toc_body = json.dumps(toc_response).encode('utf-8')
+            self._toc_etag = '"{:s}"'.format(hashlib.sha1(self._toc_body).hexdigest())
+
+        return self._toc_body
+
+    def start(self):
+        '''Start serving both ports in background threads'''
+
+        # Create the response before the first request is timed
+        self.toc_body()
+
+        for port in (SENSOR_PORT, ASSETS_PORT):
+            server = _ThreadingHTTPServer((self._host, port), _MockUFrameHandler)
+            server.mock = self
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            self._servers.append(server)
+
+    def stop(self):
+
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+
+        self._servers = []
+
+    def _hit(self, end_point):
+
+        with self._lock:
+            self._hits[end_point] = self._hits.get(end_point, 0) + 1
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def __repr__(self):
+        return '<MockUFrameServer(base_url={:s}, shape={:s}, instruments={:d})>'.format(self.base_url, self._shape, self._instruments)
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+class _MockUFrameHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # Send the headers and body of each response without waiting on delayed
+    # acknowledgements, which would dominate the timed latencies
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+
+        mock = self.server.mock
+        path = self.path.split('?')[0]
+
+        if path == '/sensor/inv/toc':
+            mock._hit('toc')
+            time.sleep(mock.toc_latency)
+            body = mock.toc_body()
+            if self.headers.get('If-None-Match') == mock._toc_etag:
+                self._respond(304, b'')
+                return
+            self._respond(200, body, {'ETag' : mock._toc_etag})
+
+        elif path == '/events/deployment/query':
+            mock._hit('deployments')
+            time.sleep(mock.latency)
+            ref_des = self.path.split('refdes=')[-1].split('&')[0]
+            events = []
+            if ref_des.count('-') >= 2:
+                events = create_deployment_events(ref_des)
+            self._respond(200, json.dumps(events).encode('utf-8'))
+
+        elif path.startswith('/sensor/inv/') and path.count('/') == 7:
+            mock._hit('async')
+            time.sleep(mock.latency)
+            request_uuid = hashlib.sha1(self.path.encode('utf-8')).hexdigest()
+            response = {'requestUUID' : request_uuid,
+                'outputURL' : 'https://{:s}/thredds/catalog/ooi/_nouser/{:s}/catalog.html'.format(mock._host, request_uuid),
+                'allURLs' : ['https://{:s}/async_results/_nouser/{:s}'.format(mock._host, request_uuid)]}
+            self._respond(200, json.dumps(response).encode('utf-8'))
+
+        else:
+            self._respond(404, b'Not Found')
+
+    def _respond(self, status_code, body, headers=None):
+
+        self.send_response(status_code)
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('-n', '--instruments',
+        type=int,
+        default=1000,
+        help='Number of instruments in the synthetic table of contents <Default:1000>')
+    arg_parser.add_argument('-s', '--shape',
+        default='dict',
+        choices=TOC_SHAPES,
+        help='Table of contents shape <Default:dict>')
+    arg_parser.add_argument('-l', '--latency',
+        type=float,
+        default=0.,
+        help='Number of seconds each deployment event and asynchronous request response is delayed <Default:0>')
+    arg_parser.add_argument('--toc_latency',
+        type=float,
+        default=0.,
+        help='Number of seconds each table of contents response is delayed <Default:0>')
+    arg_parser.add_argument('--host',
+        default='127.0.0.1',
+        help='Address to listen on <Default:127.0.0.1>')
+    arg_parser.add_argument('--seed',
+        type=int,
+        default=0,
+        help='Random seed <Default:0>')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
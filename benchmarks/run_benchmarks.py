@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import datetime
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from UFrame import UFrame
+from mock_uframe import MockUFrameServer, TOC_SHAPES
+
+BENCHMARKS = ['toc_fetch',
+    'toc_cached',
+    'search_instruments',
+    'stream_to_instrument',
+    'search_parameters',
+    'parameter_to_instrument',
+    'instrument_to_query',
+    'iter_instrument_queries',
+    'deployment_events',
+    'dispatch_async_requests']
+
+def main(args):
+    '''Time the UFrame client hot paths (table of contents fetch and parsing,
+    searches, request url creation, deployment event requests and asynchronous
+    request sending) against a local mock UFrame server serving synthetic list
+    and dict shaped tables of contents.  Results are written as a JSON document
+    that may be passed back with --baseline to compare versions.'''
+
+    benchmarks = args.benchmarks or BENCHMARKS
+    invalid = [b for b in benchmarks if b not in BENCHMARKS]
+    if invalid:
+        sys.stderr.write('Invalid benchmarks: {:s}\n'.format(', '.join(invalid)))
+        return 1
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r') as fid:
+                baseline = json.load(fid)
+        except (IOError, ValueError) as e:
+            sys.stderr.write('Invalid baseline {:s}: {:s}\n'.format(args.baseline, e))
+            return 1
+
+    results = []
+    for shape in args.shapes:
+        for num_instruments in args.instruments:
+
+            if args.verbose:
+                sys.stderr.write('Benchmarking {:s} TOC ({:d} instruments)\n'.format(shape, num_instruments))
+
+            server = MockUFrameServer(host=args.host,
+                shape=shape,
+                instruments=num_instruments,
+                latency=args.latency,
+                toc_latency=args.toc_latency,
+                seed=args.seed)
+
+            with server:
+                results.extend(run_suite(server, benchmarks, args))
+
+    if baseline:
+        compare_results(results, baseline['results'])
+
+    document = {'created' : datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python' : platform.python_version(),
+        'platform' : platform.platform(),
+        'commit' : git_commit(),
+        'config' : {'repeat' : args.repeat,
+            'queries' : args.queries,
+            'deployments' : args.deployments,
+            'requests' : args.requests,
+            'concurrency' : args.concurrency,
+            'latency' : args.latency,
+            'toc_latency' : args.toc_latency,
+            'seed' : args.seed},
+        'results' : results}
+
+    if args.output:
+        try:
+            with open(args.output, 'w') as fid:
+                json.dump(document, fid, indent=2, sort_keys=True)
+        except IOError as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return 1
+    else:
+        sys.stdout.write('{:s}\n'.format(json.dumps(document, indent=2, sort_keys=True)))
+
+    return 0
+
+def run_suite(server, benchmarks, args):
+    '''Run the benchmarks against the mock UFrame server and return the list of
+    results'''
+
+    results = []
+
+    rand = random.Random(args.seed)
+    cache_dir = tempfile.mkdtemp(prefix='uframe-benchmark-')
+
+    def record(benchmark, func):
+        if benchmark not in benchmarks:
+            return
+        server.reset_hits()
+        times = time_function(func, args.repeat)
+        result = summarize(times)
+        result.update({'benchmark' : benchmark,
+            'shape' : server.shape,
+            'instruments' : server.instruments,
+            'http_requests' : server.hits})
+        results.append(result)
+        if args.verbose:
+            sys.stderr.write('{:>24s}: {:0.4f} seconds (median)\n'.format(benchmark, result['median']))
+
+    try:
+        # Table of contents fetch and parsing without the cache
+        record('toc_fetch', lambda: UFrame(base_url=server.base_url, use_cache=False).instruments)
+
+        # Revalidation of the cached table of contents and snapshot loading
+        UFrame(base_url=server.base_url, cache_dir=cache_dir).instruments
+        record('toc_cached', lambda: UFrame(base_url=server.base_url, cache_dir=cache_dir, toc_ttl=0).instruments)
+
+        uframe = UFrame(base_url=server.base_url, use_cache=False)
+        instruments = uframe.instruments
+
+        # Search fragments taken from the table of contents names
+        instrument_queries = sample_fragments(instruments, args.queries, rand)
+        stream_queries = sample_fragments(uframe.streams, args.queries, rand)
+        parameter_queries = sample_fragments(uframe.parameters, args.queries, rand)
+
+        record('search_instruments', lambda: [uframe.search_instruments(q) for q in instrument_queries])
+        record('stream_to_instrument', lambda: [uframe.stream_to_instrument(q) for q in stream_queries])
+        record('search_parameters', lambda: [uframe.search_parameters(q) for q in parameter_queries])
+        record('parameter_to_instrument', lambda: [uframe.parameter_to_instrument(q) for q in parameter_queries])
+
+        # Request url creation
+        query_instruments = rand.sample(instruments, min(args.queries, len(instruments)))
+        record('instrument_to_query', lambda: [uframe.instrument_to_query(i) for i in query_instruments])
+        record('iter_instrument_queries', lambda: list(uframe.iter_instrument_queries(instruments)))
+
+        # Deployment event requests for a fixed number of instruments
+        deployment_instruments = instruments[:args.deployments]
+        record('deployment_events', lambda: uframe._get_instrument_deployment_events(deployment_instruments,
+            concurrency=args.concurrency,
+            refresh=True))
+
+        # Asynchronous request sending
+        request_urls = []
+        for url in uframe.iter_instrument_queries(instruments):
+            request_urls.append(url)
+            if len(request_urls) >= args.requests:
+                break
+        record('dispatch_async_requests', lambda: uframe.dispatch_async_requests(request_urls, concurrency=args.concurrency))
+
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return results
+
+def time_function(func, repeat):
+    '''Return the list of wall clock times, in seconds, of repeat calls to func'''
+
+    times = []
+    for r in range(repeat):
+        t0 = time.time()
+        func()
+        times.append(time.time() - t0)
+
+    return times
+
+def summarize(times):
+    '''Return the minimum, median, mean and maximum of the list of times'''
+
+    ordered = sorted(times)
+    n = len(ordered)
+    if n % 2:
+        median = ordered[n // 2]
+    else:
+        median = (ordered[n // 2 - 1] + ordered[n // 2]) / 2.
+
+    return {'repeat' : n,
+        'times' : times,
+        'min' : ordered[0],
+        'median' : median,
+        'mean' : sum(ordered) / n,
+        'max' : ordered[-1]}
+
+def sample_fragments(names, num_fragments, rand):
+    '''Return num_fragments random substrings of the names'''
+
+    fragments = []
+    if not names:
+        return fragments
+
+    for f in range(num_fragments):
+        name = rand.choice(names)
+        i0 = rand.randint(0, max(len(name) - 3, 0))
+        fragments.append(name[i0:i0 + rand.randint(3, 12)])
+
+    return fragments
+
+def compare_results(results, baseline_results):
+    '''Add the baseline median time and the speedup relative to the baseline to
+    each result'''
+
+    baseline_medians = dict([((r['benchmark'], r['shape'], r['instruments']), r['median']) for r in baseline_results])
+
+    for result in results:
+        baseline_median = baseline_medians.get((result['benchmark'], result['shape'], result['instruments']))
+        result['baseline_median'] = baseline_median
+        result['speedup'] = None
+        if baseline_median and result['median']:
+            result['speedup'] = baseline_median / result['median']
+
+def git_commit():
+    '''Return the commit of the working tree or None if it is not a git
+    repository'''
+
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.realpath(__file__)),
+            stderr=open(os.devnull, 'w'))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit.decode('utf-8').strip()
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('-b', '--benchmarks',
+        nargs='+',
+        help='Benchmarks to run <Default:all> ({:s})'.format(', '.join(BENCHMARKS)))
+    arg_parser.add_argument('-i', '--instruments',
+        type=int,
+        nargs='+',
+        default=[1000, 10000],
+        help='Number of instruments in each synthetic table of contents <Default:1000 10000>')
+    arg_parser.add_argument('-s', '--shapes',
+        nargs='+',
+        default=TOC_SHAPES,
+        choices=TOC_SHAPES,
+        help='Table of contents shapes <Default:list dict>')
+    arg_parser.add_argument('-r', '--repeat',
+        type=int,
+        default=3,
+        help='Number of times each benchmark is run <Default:3>')
+    arg_parser.add_argument('-q', '--queries',
+        type=int,
+        default=100,
+        help='Number of searches and instrument_to_query calls timed by each benchmark <Default:100>')
+    arg_parser.add_argument('-d', '--deployments',
+        type=int,
+        default=50,
+        help='Number of instruments whose deployment events are requested <Default:50>')
+    arg_parser.add_argument('-n', '--requests',
+        type=int,
+        default=50,
+        help='Number of asynchronous requests sent <Default:50>')
+    arg_parser.add_argument('-c', '--concurrency',
+        type=int,
+        default=4,
+        help='Maximum number of simultaneous deployment event and asynchronous requests <Default:4>')
+    arg_parser.add_argument('-l', '--latency',
+        type=float,
+        default=0.01,
+        help='Number of seconds each mock deployment event and asynchronous request response is delayed <Default:0.01>')
+    arg_parser.add_argument('--toc_latency',
+        type=float,
+        default=0.,
+        help='Number of seconds each mock table of contents response is delayed <Default:0>')
+    arg_parser.add_argument('--host',
+        default='127.0.0.1',
+        help='Mock UFrame server address <Default:127.0.0.1>')
+    arg_parser.add_argument('--seed',
+        type=int,
+        default=0,
+        help='Random seed <Default:0>')
+    arg_parser.add_argument('--baseline',
+        help='JSON results of a previous run to compare against')
+    arg_parser.add_argument('-o', '--output',
+        help='Write the JSON results to the specified file instead of STDOUT')
+    arg_parser.add_argument('-v', '--verbose',
+        action='store_true',
+        help='Print the median time of each benchmark to STDERR')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import os
+import csv
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from UFrame import UFrame
+from mock_uframe import create_list_toc
+
+def main(args):
+    '''Time parsing of synthetic, list-shaped (old) UFrame table of contents
+    responses containing an increasing number of instruments.  Results are printed
+    to STDOUT as csv records.'''
+    
+    random.seed(args.seed)
+    
+    # UFrame instance with no base url, so nothing is fetched
+    uframe = UFrame(use_cache=False)
+    
+    csv_writer = csv.writer(sys.stdout)
+    csv_writer.writerow(['instruments',
+        'parameters_per_instrument',
+        'unique_parameters',
+        'unique_streams',
+        'seconds'])
+        
+    for num_instruments in args.instruments:
+        
+        toc_response = create_list_toc(num_instruments,
+            args.parameters,
+            args.unique_parameters,
+            args.unique_streams)
+        
+        t0 = time.time()
+        uframe._parse_toc(toc_response)
+        dt = time.time() - t0
+        
+        csv_writer.writerow([num_instruments,
+            args.parameters,
+            len(uframe.parameters),
+            len(uframe.streams),
+            '{:0.4f}'.format(dt)])
+        sys.stdout.flush()
+        
+    return 0
+    
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('-i', '--instruments',
+        type=int,
+        nargs='+',
+        default=[1000, 2000, 5000, 10000, 20000],
+        help='Number of instruments in each synthetic table of contents')
+    arg_parser.add_argument('-p', '--parameters',
+        type=int,
+        default=60,
+        help='Number of parameters per instrument <Default:60>')
+    arg_parser.add_argument('--unique_parameters',
+        type=int,
+        default=2000,
+        help='Number of unique parameter names <Default:2000>')
+    arg_parser.add_argument('--unique_streams',
+        type=int,
+        default=500,
+        help='Number of unique stream names <Default:500>')
+    arg_parser.add_argument('--seed',
+        type=int,
+        default=0,
+        help='Random seed <Default:0>')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
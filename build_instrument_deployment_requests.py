@@ -35,7 +35,8 @@ def main(args):
          
     uframe = UFrame(base_url=base_url,
         timeout=args.timeout,
-        validate=args.validate_uframe)
+        validate=args.validate_uframe,
+        refresh_toc=args.refresh_toc)
     
     # Fetch the table of contents from UFrame
     if args.verbose:
@@ -43,7 +44,7 @@ def main(args):
         sys.stderr.write('Fetching and creating UFrame table of contents...')
         
     # Fetch the UFrame table of contents
-    uframe.fetch_toc()
+    uframe.fetch_toc(refresh=args.refresh_toc)
     # Fetch the UFrame events
     uframe.fetch_events()
     
@@ -134,6 +135,9 @@ if __name__ == '__main__':
         type=int,
         default=120,
         help='Specify the timeout, in seconds <Default:120>')
+    arg_parser.add_argument('--refresh_toc',
+        action='store_true',
+        help='Ignore the cached table of contents and fetch it from the UFrame instance')
     arg_parser.add_argument('-v', '--verbose',
         action='store_true',
         help='Verbose display')
@@ -3,14 +3,23 @@
 import argparse
 import os
 import sys
-import datetime
+import time
+import json
+import sqlite3
 from UFrame import UFrame
+from UFrame.Planner import RequestPlanner
+from UFrame.Ledger import RequestLedger, default_ledger_path
+from UFrame.Metrics import Metrics
+from UFrame.Sharding import ShardedRequestBuilder
 
 def main(args):
     '''Return the list of request urls that conform to the UFrame API for the 
         partial or fully-qualified reference_designator and all telemetry types.  
         The URLs request all stream L0, L1 and L2 dataset parameters over the entire 
-        time-coverage.  The urls are printed to STDOUT.
+        time-coverage.  The urls are printed to STDOUT.  Long time ranges may be
+        split into several urls by duration, estimated particle count and
+        instrument deployments.  If a request ledger is specified, only the time
+        ranges that have not already been requested are included.
     '''
     
     status = 0
@@ -27,26 +36,63 @@ def main(args):
         sys.stderr.flush()
         return 1
     
+    # Create the request planner if the requests are split into time chunks
+    planner = None
+    if args.chunk_days or args.max_particles or args.align_deployments:
+        rates = None
+        if args.rates:
+            try:
+                with open(args.rates, 'r') as fid:
+                    rates = json.load(fid)
+            except (IOError, ValueError) as e:
+                sys.stderr.write('Invalid stream rate table {:s}: {:s}\n'.format(args.rates, e))
+                return 1
+                
+        chunk_ms = None
+        if args.chunk_days:
+            chunk_ms = int(args.chunk_days * 86400000)
+            
+        try:
+            planner = RequestPlanner(chunk_ms=chunk_ms,
+                max_particles=args.max_particles,
+                rates=rates,
+                align_deployments=args.align_deployments)
+        except ValueError as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return 1
+    
+    # Open the ledger of previously requested time ranges
+    ledger = None
+    if args.ledger:
+        try:
+            ledger = RequestLedger(path=args.ledger)
+        except (OSError, sqlite3.Error) as e:
+            sys.stderr.write('Invalid request ledger {:s}: {:s}\n'.format(args.ledger, e))
+            return 1
+    
     # Create a UFrame instance   
     if args.verbose:
         sys.stderr.write('Creating UFrame API instance\n')
          
+    metrics = Metrics()
+    if args.metrics:
+        metrics.dump_at_exit(fmt=args.metrics)
+        
     uframe = UFrame(base_url=base_url,
         timeout=args.timeout,
-        validate=args.validate_uframe)
+        validate=args.validate_uframe,
+        refresh_toc=args.refresh_toc,
+        metrics=metrics)
     
     # Fetch the table of contents from UFrame
     if args.verbose:
-        t0 = datetime.datetime.utcnow()
+        t0 = time.time()
         sys.stderr.write('Fetching and creating UFrame table of contents...')
         
-    # Automatically called on instantiation of the instance
-#    uframe.fetch_toc()
-    
-    if args.verbose:
-        t1 = datetime.datetime.utcnow()
-        dt = t1 - t0
-        sys.stderr.write('Complete ({:d} seconds)\n'.format(dt.seconds))
+        # Fetched on first access
+        uframe.toc
+        
+        sys.stderr.write('Complete ({:0.2f} seconds)\n'.format(time.time() - t0))
     
     if (args.reference_designator):
         instruments = uframe.search_instruments(args.reference_designator)
@@ -57,30 +103,34 @@ def main(args):
         sys.stderr.write('No instruments found for reference designator: {:s}\n'.format(args.reference_designator))
         sys.stderr.flush()
 
-    urls = []    
-    for instrument in instruments:
+    # Build and print the urls for all instruments in a single pass, optionally
+    # sharing the instruments between several processes
+    if args.processes > 1:
+        iter_queries = ShardedRequestBuilder(uframe, processes=args.processes).iter_queries
+    else:
+        iter_queries = uframe.iter_instrument_queries
         
-        request_urls = uframe.instrument_to_query(instrument,
-            stream=args.stream,
-            telemetry=args.telemetry,
-            time_delta_type=args.time_delta_type,
-            time_delta_value=args.time_delta_value,
-            begin_ts=args.start_date,
-            end_ts=args.end_date,
-            time_check=args.time_check,
-            exec_dpa=args.no_dpa,
-            application_type=args.format,
-            provenance=args.no_provenance,
-            limit=args.limit,
-            annotations=args.no_annotations,
-            user=args.user,
-            email=args.email,
-            selogging=args.selogging)
-    
-        for request_url in request_urls:
-            urls.append(request_url)
-            
-    for url in urls:
+    request_urls = iter_queries(instruments,
+        streams=[args.stream] if args.stream else None,
+        telemetry=args.telemetry,
+        time_delta_type=args.time_delta_type,
+        time_delta_value=args.time_delta_value,
+        begin_ts=args.start_date,
+        end_ts=args.end_date,
+        time_check=args.time_check,
+        exec_dpa=args.no_dpa,
+        application_type=args.format,
+        provenance=args.no_provenance,
+        limit=args.limit,
+        annotations=args.no_annotations,
+        user=args.user,
+        email=args.email,
+        selogging=args.selogging,
+        planner=planner,
+        concurrency=args.concurrency,
+        ledger=ledger)
+        
+    for url in request_urls:
         sys.stdout.write('{:s}\n'.format(url))
         
     return status
@@ -128,6 +178,29 @@ if __name__ == '__main__':
         type=int,
         default=-1,
         help='Integer ranging from -1 to 10000.  <Default:-1> results in a non-decimated dataset')
+    arg_parser.add_argument('--chunk_days',
+        type=float,
+        help='Split each request into time chunks no longer than the specified number of days')
+    arg_parser.add_argument('--max_particles',
+        type=int,
+        help='Split each request into time chunks containing no more than the specified estimated number of particles')
+    arg_parser.add_argument('--rates',
+        help='JSON file mapping stream names to the number of particles produced per second, used with --max_particles.  Other streams use the table of contents particle count and time coverage')
+    arg_parser.add_argument('--align_deployments',
+        action='store_true',
+        help='Split each request at the instrument deployment start and end times')
+    arg_parser.add_argument('-c', '--concurrency',
+        type=int,
+        default=1,
+        help='Maximum number of simultaneous deployment event requests sent with --align_deployments <Default:1>')
+    arg_parser.add_argument('--ledger',
+        nargs='?',
+        const=default_ledger_path(),
+        help='Skip the time ranges recorded in the request ledger by send_async_requests.py <Default:{:s}>'.format(default_ledger_path()))
+    arg_parser.add_argument('-p', '--processes',
+        type=int,
+        default=1,
+        help='Number of processes used to build the urls.  The output is the same for any number of processes <Default:1>')
     arg_parser.add_argument('-b', '--baseurl',
         dest='base_url',
         help='Specify an alternate uFrame server URL. Must start with \'http://\'.  Must be specified if UFRAME_BASE_URL environment variable is not set')
@@ -135,9 +208,17 @@ if __name__ == '__main__':
         type=int,
         default=120,
         help='Specify the timeout, in seconds <Default:120>')
+    arg_parser.add_argument('--refresh_toc',
+        action='store_true',
+        help='Ignore the cached table of contents and fetch it from the UFrame instance')
     arg_parser.add_argument('-v', '--verbose',
         action='store_true',
         help='Verbose display')
+    arg_parser.add_argument('--metrics',
+        nargs='?',
+        const='text',
+        choices=['text', 'json'],
+        help='Print the request, decode and index timings, bytes transferred and cache hits to STDERR on exit, as a text table <Default> or JSON')
     arg_parser.add_argument('-u', '--user',
         dest='user',
         default='_nouser',
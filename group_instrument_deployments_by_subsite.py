@@ -4,11 +4,12 @@ import argparse
 import sys
 import json
 from UFrame import UFrame
-from UFrame.Events import group_instrument_deployment_events_by_subsite
+from UFrame.Events import group_instrument_deployment_events, GROUP_KEYS
 
 def main(args):
-    '''Retrieve all instrument deployment events, group them by array subsite,
-    and print the response as a JSON object'''
+    '''Retrieve the deployment events of all instruments, group them by array
+    subsite, or optionally by array, node or instrument class, and print the
+    response as a JSON object'''
     
     status = 1
     
@@ -18,22 +19,21 @@ def main(args):
     else:
         uframe = UFrame(timeout=args.timeout)
         
-    # Fetch the events request
-    uframe.fetch_events()
-    if not uframe.events:
-        sys.stderr.write('No events requested: {:s}\n'.format(uframe))
+    if not uframe.instruments:
+        sys.stderr.write('No instruments found: {:s}\n'.format(uframe))
         sys.stdout.write('[]\n')
         return status
         
-    # Get only the .DeploymentEvents
-    deployment_events = uframe.search_events_by_type('.DeploymentEvent')
+    # Fetch the deployment events of every instrument
+    deployment_events = uframe.get_deployment_events(concurrency=args.concurrency,
+        refresh=args.refresh)
     if not deployment_events:
-        sys.stderr.write('No .DeploymentEvents found: {:s}\n'.format(uframe))
+        sys.stderr.write('No deployment events found: {:s}\n'.format(uframe))
         sys.stdout.write('[]\n')
         return status
         
     # Create the grouping of instrument deployments organized by array subsite
-    instruments = group_instrument_deployment_events_by_subsite(deployment_events)
+    instruments = group_instrument_deployment_events(deployment_events, group_by=args.group_by)
     
     # JSON encode and print to STDOUT
     sys.stdout.write('{:s}\n'.format(json.dumps(instruments)))
@@ -52,7 +52,20 @@ if __name__ == '__main__':
         type=int,
         default=120,
         help='Specify the timeout, in seconds <Default:120>')
+    arg_parser.add_argument('-g', '--group_by',
+        dest='group_by',
+        default='subsite',
+        choices=GROUP_KEYS,
+        help='Group the instrument deployments by array, subsite, node or instrument class <Default:subsite>')
+    arg_parser.add_argument('-c', '--concurrency',
+        type=int,
+        default=1,
+        help='Maximum number of simultaneous deployment event requests <Default:1>')
+    arg_parser.add_argument('--refresh',
+        dest='refresh',
+        action='store_true',
+        help='Ignore the cached deployment events and fetch them from the UFrame instance')
 
     parsed_args = arg_parser.parse_args()
 
-    sys.exit(main(parsed_args))
\ No newline at end of file
+    sys.exit(main(parsed_args))
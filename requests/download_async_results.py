@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import os
+from UFrame.AsyncResults import AsyncResultDownloader, async_result_destination
+
+def main(args):
+    '''Download the files created by one or more UFrame asynchronous requests.
+    Each url is an asynchronous result directory url (see print_async_endpoints.py),
+    ie:
+
+    https://opendap-test.oceanobservatories.org/async_results/fujj/20160816T045513-CE05MOAS-GL311-05-CTDGVM000-telemetered-ctdgv_m_glider_instrument
+
+    By default, the files are written to:
+
+    ./fujj/20160816T045513-CE05MOAS-GL311-05-CTDGVM000-telemetered-ctdgv_m_glider_instrument
+
+    where fujj is the user and
+    20160816T045513-CE05MOAS-GL311-05-CTDGVM000-telemetered-ctdgv_m_glider_instrument
+    is the timestamped stream directory.  Files are downloaded concurrently.
+    Interrupted downloads are resumed and files that have already been downloaded
+    are skipped.  Urls are read from STDIN if none are specified.'''
+
+    exit_code = 0
+
+    urls = args.urls
+    if not urls and args.infile:
+        if not os.path.isfile(args.infile):
+            sys.stderr.write('Invalid file specified: {:s}\n'.format(args.infile))
+            return 1
+        try:
+            with open(args.infile, 'r') as fid:
+                urls = fid.readlines()
+        except IOError as e:
+            sys.stderr.write('{:s}\n'.format(e))
+            return 1
+    elif not urls and not sys.stdin.isatty():
+        urls = sys.stdin.readlines()
+
+    # Ignore any commented out urls
+    urls = [u.strip() for u in urls if u.strip() and not u.startswith('#')]
+    if not urls:
+        sys.stderr.write('No url(s) specified\n')
+        return 1
+
+    root = os.curdir
+    if args.directory:
+        if not os.path.isdir(args.directory):
+            sys.stderr.write('Invalid destination specified: {:s}\n'.format(args.directory))
+            return 1
+        root = args.directory
+
+    downloader = AsyncResultDownloader(concurrency=args.concurrency,
+        timeout=args.timeout,
+        force=args.force)
+
+    if args.wait:
+        ready_urls = []
+        for url in urls:
+            sys.stdout.write('Waiting for: {:s}\n'.format(url))
+            if not downloader.wait(url, interval=args.poll_interval, timeout=args.max_wait):
+                sys.stderr.write('Request did not complete: {:s}\n'.format(url))
+                exit_code = 1
+                continue
+            ready_urls.append(url)
+        urls = ready_urls
+
+    for url in urls:
+        sys.stdout.write('Fetching: {:s}\n'.format(url))
+        sys.stdout.write('Destination: {:s}\n'.format(async_result_destination(url,
+            root=root,
+            user=args.user,
+            prefix=args.prefix)))
+
+    for result in downloader.download(urls, destination=root, user=args.user, prefix=args.prefix):
+        if result['status'] == 'failed':
+            sys.stderr.write('Failed: {:s} ({:s})\n'.format(result['url'], result['reason']))
+            exit_code = 1
+        elif args.verbose:
+            sys.stdout.write('{:s}: {:s} ({:d} bytes)\n'.format(result['status'].capitalize(),
+                result['path'],
+                result['bytes']))
+
+    return exit_code
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument('urls',
+        nargs='*',
+        help='One or more UFrame asynchronous result urls')
+    arg_parser.add_argument('-i', '--infile',
+        dest='infile',
+        help='Filename containing the asynchronous result urls, one per line')
+    arg_parser.add_argument('-u', '--user',
+        dest='user',
+        help='Specify an alternate user directory for writing')
+    arg_parser.add_argument('-p', '--prefix',
+        dest='prefix',
+        help='Specify an alternate parent directory for writing')
+    arg_parser.add_argument('-d', '--directory',
+        dest='directory',
+        help='Specify an alternate root directory for writing')
+    arg_parser.add_argument('-f', '--force',
+        dest='force',
+        action='store_true',
+        help='Download all files, even if they have already been downloaded')
+    arg_parser.add_argument('-c', '--concurrency',
+        dest='concurrency',
+        type=int,
+        default=4,
+        help='Maximum number of files downloaded at once')
+    arg_parser.add_argument('-w', '--wait',
+        dest='wait',
+        action='store_true',
+        help='Wait for each request to complete before downloading the files')
+    arg_parser.add_argument('--poll_interval',
+        dest='poll_interval',
+        type=float,
+        default=30,
+        help='Number of seconds between request status checks, used with -w')
+    arg_parser.add_argument('--max_wait',
+        dest='max_wait',
+        type=float,
+        help='Maximum number of seconds to wait for each request, used with -w')
+    arg_parser.add_argument('-t', '--timeout',
+        dest='timeout',
+        type=float,
+        default=120,
+        help='Request timeout, in seconds')
+    arg_parser.add_argument('-v', '--verbose',
+        dest='verbose',
+        action='store_true',
+        help='Display the result of each file download')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+import argparse
+import sys
+import os
+import json
+import sqlite3
+from UFrame.Ledger import RequestLedger, default_ledger_path
+from UFrame.AsyncResults import AsyncRequestPoller, AsyncResultDownloader, load_async_request
+
+def main(args):
+    '''Poll the status of one or more asynchronous UFrame requests, using the JSON
+    responses written by send_async_requests.py, until each request has completed.
+    Completed requests are printed as they complete and, if specified, appended to
+    a manifest file containing one JSON job object per line.  Requests already
+    listed in the manifest are not polled again.  Requests whose files are
+    downloaded are recorded in the request ledger, if specified.'''
+
+    exit_code = 0
+
+    if not args.json_files:
+        sys.stderr.write('No UFrame asynchronous json response files specified\n')
+        return 1
+
+    # Skip requests that have already completed
+    completed_files = set()
+    if args.manifest and os.path.isfile(args.manifest):
+        try:
+            with open(args.manifest, 'r') as fid:
+                for line in fid:
+                    if line.strip():
+                        completed_files.add(os.path.realpath(json.loads(line)['json_file']))
+        except (IOError, ValueError, KeyError) as e:
+            sys.stderr.write('Invalid manifest {:s}: {:s}\n'.format(args.manifest, e))
+            return 1
+
+    jobs = []
+    for json_file in args.json_files:
+        if os.path.realpath(json_file) in completed_files:
+            continue
+        job = load_async_request(json_file)
+        if not job:
+            exit_code = 1
+            continue
+        jobs.append(job)
+
+    if not jobs:
+        return exit_code
+
+    poller = AsyncRequestPoller(concurrency=args.concurrency,
+        initial_interval=args.initial_interval,
+        max_interval=args.max_interval,
+        rate_limit=args.rate_limit,
+        timeout=args.timeout)
+
+    downloader = None
+    if args.download:
+        if not os.path.isdir(args.directory):
+            sys.stderr.write('Invalid destination specified: {:s}\n'.format(args.directory))
+            return 1
+        downloader = AsyncResultDownloader(concurrency=args.concurrency,
+            timeout=args.timeout,
+            transport=poller.transport)
+            
+    ledger = None
+    if args.download and args.ledger:
+        try:
+            ledger = RequestLedger(path=args.ledger)
+        except (OSError, sqlite3.Error) as e:
+            sys.stderr.write('Invalid request ledger {:s}: {:s}\n'.format(args.ledger, e))
+            return 1
+
+    for job in poller.poll(jobs, timeout=args.max_wait):
+
+        sys.stdout.write('Completed: {:s} ({:s})\n'.format(job['url'], job['json_file']))
+
+        if downloader:
+            downloaded = True
+            for result in downloader.download([job['url']], destination=args.directory):
+                if result['status'] == 'failed':
+                    sys.stderr.write('Failed: {:s} ({:s})\n'.format(result['url'], result['reason']))
+                    downloaded = False
+                    exit_code = 1
+                    
+            if ledger is not None and downloaded and job['requestUrl']:
+                ledger.record_url(job['requestUrl'], status='downloaded')
+
+        if args.manifest:
+            try:
+                with open(args.manifest, 'a') as fid:
+                    fid.write('{:s}\n'.format(json.dumps(job)))
+            except IOError as e:
+                sys.stderr.write('{:s}\n'.format(e))
+                exit_code = 1
+
+    for job in poller.pending:
+        sys.stderr.write('Request did not complete: {:s} ({:s})\n'.format(job['url'], job['json_file']))
+        exit_code = 1
+
+    return exit_code
+
+if __name__ == '__main__':
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument('json_files',
+        nargs='*',
+        help='One or more UFrame asynchronous json response file(s)')
+    arg_parser.add_argument('-m', '--manifest',
+        dest='manifest',
+        help='File the completed requests are appended to')
+    arg_parser.add_argument('-c', '--concurrency',
+        dest='concurrency',
+        type=int,
+        default=4,
+        help='Maximum number of status checks in flight')
+    arg_parser.add_argument('--rate_limit',
+        dest='rate_limit',
+        type=float,
+        help='Maximum number of status checks per second sent to a single host')
+    arg_parser.add_argument('--initial_interval',
+        dest='initial_interval',
+        type=float,
+        default=30,
+        help='Number of seconds between the first and second status checks of each request')
+    arg_parser.add_argument('--max_interval',
+        dest='max_interval',
+        type=float,
+        default=900,
+        help='Maximum number of seconds between status checks of each request')
+    arg_parser.add_argument('--max_wait',
+        dest='max_wait',
+        type=float,
+        help='Maximum number of seconds to poll')
+    arg_parser.add_argument('--download',
+        dest='download',
+        action='store_true',
+        help='Download the files for each request as soon as it completes')
+    arg_parser.add_argument('-d', '--directory',
+        dest='directory',
+        default=os.curdir,
+        help='Used with --download, specify the root directory for writing')
+    arg_parser.add_argument('--ledger',
+        nargs='?',
+        const=default_ledger_path(),
+        help='Used with --download, record each downloaded request in the request ledger <Default:{:s}>'.format(default_ledger_path()))
+    arg_parser.add_argument('-t', '--timeout',
+        dest='timeout',
+        type=float,
+        default=120,
+        help='Request timeout, in seconds')
+
+    parsed_args = arg_parser.parse_args()
+
+    sys.exit(main(parsed_args))
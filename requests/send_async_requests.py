@@ -7,6 +7,8 @@ import requests
 import re
 import datetime
 import json
+from UFrame.Dispatch import RequestDispatcher
+from UFrame.AsyncResults import async_request_file_name
 
 def main(args):
     '''Validate and send one or more asynchronous UFrame requests.  The JSON 
@@ -51,22 +53,13 @@ def main(args):
     #sys.stdout.write('Request JSON destination: {:s}\n'.format(json_destination))
     
     failed_requests = []
-    for url in urls:
-        
-        request_url = url.strip()
-        
-        if args.verbose:
-            sys.stdout.write('Sending request: {:s}\n'.format(request_url))
-        
-        response = send_async_request(url)
+    
+    def handle_response(response):
         if not response['status']:
             failed_requests.append(response)
-            continue
+            return
             
-        fname = '{:s}-{:s}.request.json'.format(response['stream'],
-            datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S.%s'))
-        
-        response_json_file = os.path.join(json_destination, fname)
+        response_json_file = os.path.join(json_destination, async_request_file_name(response))
         try:
             sys.stdout.write('Writing response: {:s}\n'.format(response_json_file))
             fid = open(response_json_file, 'w')
@@ -74,7 +67,27 @@ def main(args):
             fid.close()
         except IOError as e:
             sys.stderr.write('{:s}\n'.format(e))
-            continue
+            
+    if args.concurrency > 1:
+        if args.verbose:
+            for url in urls:
+                sys.stdout.write('Sending request: {:s}\n'.format(url.strip()))
+                
+        # Write each response as soon as the request completes
+        dispatcher = RequestDispatcher(send_async_request,
+            concurrency=args.concurrency,
+            rate_limit=args.rate_limit)
+        for response in dispatcher.dispatch(urls):
+            handle_response(response)
+    else:
+        for url in urls:
+            
+            request_url = url.strip()
+            
+            if args.verbose:
+                sys.stdout.write('Sending request: {:s}\n'.format(request_url))
+            
+            handle_response(send_async_request(url))
     
     # Write the array of failed request responses to a separate file    
     if failed_requests:
@@ -246,6 +259,13 @@ if __name__ == '__main__':
     arg_parser.add_argument('-d', '--destination',
         dest='dest',
         help='Directory for writing UFrame json responses')
+    arg_parser.add_argument('-c', '--concurrency',
+        type=int,
+        default=1,
+        help='Maximum number of requests sent concurrently <Default:1>')
+    arg_parser.add_argument('--rate_limit',
+        type=float,
+        help='Maximum number of requests per second sent to each UFrame instance')
     arg_parser.add_argument('-v', '--verbose',
         dest='verbose',
         action='store_true',
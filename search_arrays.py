@@ -30,15 +30,16 @@ def main(args):
     
     uframe = UFrame(base_url=base_url,
         timeout=args.timeout,
-        validate=args.validate_uframe)
+        validate=args.validate_uframe,
+        refresh_toc=args.refresh_toc)
     
     # Fetch the table of contents from UFrame
     if args.verbose:
         t0 = datetime.datetime.utcnow()
         sys.stderr.write('Fetching and creating UFrame table of contents...')
 
-    # Automatically called on instantiation of the instance
-#    uframe.fetch_toc()
+    # Fetch the UFrame table of contents
+    uframe.fetch_toc(refresh=args.refresh_toc)
     
     if args.verbose:
         t1 = datetime.datetime.utcnow()
@@ -76,6 +77,9 @@ if __name__ == '__main__':
         type=int,
         default=120,
         help='Specify the timeout, in seconds (Default is 120 seconds).')
+    arg_parser.add_argument('--refresh_toc',
+        action='store_true',
+        help='Ignore the cached table of contents and fetch it from the UFrame instance')
     arg_parser.add_argument('--validate_uframe',
         action='store_true',
         help='Attempt to validate the UFrame instance <Default:False>')
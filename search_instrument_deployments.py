@@ -27,7 +27,8 @@ def main(args):
         
     events = uframe.search_instrument_deployments(args.reference_designator,
         ref_des_search_string=args.filter,
-        status=args.status)
+        status=args.status,
+        refresh=args.refresh)
     
     if not events:
         sys.stderr.write('No events found for reference designator: {:s}\n'.format(args.reference_designator))
@@ -87,6 +88,10 @@ if __name__ == '__main__':
         type=int,
         default=120,
         help='Request timeout, in seconds <Default=120>.')
+    arg_parser.add_argument('--refresh',
+        dest='refresh',
+        action='store_true',
+        help='Ignore the cached deployment events and fetch them from the UFrame instance')
             
     parsed_args = arg_parser.parse_args()
     #print parsed_args
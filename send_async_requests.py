@@ -6,11 +6,17 @@ import json
 import argparse
 import datetime
 import re
-from UFrame import UFrame
+import sqlite3
+from UFrame.Pool import UFramePool
+from UFrame.Ledger import RequestLedger, default_ledger_path
+from UFrame.Metrics import Metrics
+from UFrame.AsyncResults import async_request_file_name
 
 def main(args):
     '''Send one or more asynchronous UFrame requests and write the JSON responses
-    to the current working directory.  All urls prefixed with a # are ignored'''
+    to the current working directory.  All urls prefixed with a # are ignored.
+    The time range of each successful request is recorded in the request ledger,
+    if specified, so that build_instrument_requests.py does not request it again'''
     
     request_urls = args.request_urls
     if not request_urls and args.file:
@@ -37,16 +43,29 @@ def main(args):
         sys.stderr.write('Invalid JSON response destination: {:s}\n'.format(json_destination))
         return 1
         
+    # Open the ledger the successful requests are recorded in
+    ledger = None
+    if args.ledger:
+        try:
+            ledger = RequestLedger(path=args.ledger)
+        except (OSError, sqlite3.Error) as e:
+            sys.stderr.write('Invalid request ledger {:s}: {:s}\n'.format(args.ledger, e))
+            return 1
+            
     # Regex to capture the UFrame base url from each request url
     http_regex = re.compile('(http|ftp|https)://([\w_-]+(?:(?:\.[\w_-]+)+))([\w.,@?^=%&:/~+#-]*[\w@?^=%&/~+#-])?')
 
-    uframe = None
+    # Pair each request url with its UFrame instance and group the request urls
+    # by instance for sending concurrently
+    request_pairs = []
+    base_urls = []
+    instance_urls = {}
     for url in request_urls:
         
         # Remove any trailing whitespace from the request
         url = url.strip()
         
-        if url.startswith('#'):
+        if not url or url.startswith('#'):
             continue
             
         # Pull the UFrame base_url out of the request
@@ -57,36 +76,79 @@ def main(args):
         
         # Create the UFrame base url
         uframe_base_url = '://'.join(match.groups()[:2])
+        if uframe_base_url not in instance_urls:
+            base_urls.append(uframe_base_url)
+            instance_urls[uframe_base_url] = []
             
-        # Create the UFrame client instance with the base url if it's different from
-        # the previous request
-        if not uframe or uframe.base_url != uframe_base_url:
-            uframe = UFrame(base_url=uframe_base_url,
-                timeout=args.timeout)
-                
-        # Send the request
-        uframe_response = uframe.send_async_requests(url)
+        instance_urls[uframe_base_url].append(url)
+        request_pairs.append((uframe_base_url, url))
         
-        # We're only sending one request, so are only receiving one response
-        response = uframe_response[0]
-        if response['status_code'] != 200:
-            sys.stderr.write('Request failed: {:s}\n'.format(response['reason']))
+    # Keep one UFrame client for each instance, so that clients are only created
+    # once no matter how the instances are mixed in the request urls
+    # All clients share the metrics
+    metrics = Metrics()
+    if args.metrics:
+        metrics.dump_at_exit(fmt=args.metrics)
         
-        fname = '{:s}-{:s}.request.json'.format(response['stream'],
-            datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S.%s'))
+    pool = UFramePool(max_clients=max(len(base_urls), 1),
+        timeout=args.timeout,
+        metrics=metrics)
         
-        response_json_file = os.path.join(json_destination, fname)
-        try:
-            if args.verbose:
-                sys.stdout.write('Writing response: {:s}\n'.format(response_json_file))
-                
-            fid = open(response_json_file, 'w')
-            json.dump(response, fid)
-            fid.close()
-        except IOError as e:
-            sys.stderr.write('{:s}\n'.format(e))
+    # Urls of the failed requests
+    failures = []
+    
+    def handle_response(response):
+        if not write_response(response, json_destination, args.verbose, ledger):
+            failures.append(response['requestUrl'])
+            
+    if args.concurrency > 1:
+        for uframe_base_url in base_urls:
+            # Send the requests concurrently and write each response as soon as
+            # the request completes
+            pool.get(uframe_base_url).dispatch_async_requests(instance_urls[uframe_base_url],
+                concurrency=args.concurrency,
+                rate_limit=args.rate_limit,
+                callback=handle_response)
+    else:
+        # Send the requests in order
+        for (uframe_base_url, url) in request_pairs:
+            
+            # Send the request
+            uframe_response = pool.get(uframe_base_url).send_async_requests(url)
+            
+            # We're only sending one request, so are only receiving one response
+            handle_response(uframe_response[0])
             
-    return
+    if failures:
+        sys.stderr.write('{:d} of {:d} requests failed\n'.format(len(failures), len(request_pairs)))
+        return 1
+        
+    return 0
+    
+def write_response(response, json_destination, verbose=False, ledger=None):
+    '''Write the request response to a uniquely named JSON file in
+    json_destination and record successful requests in the ledger, if specified.
+    Returns True if the request was successful'''
+    
+    if response['status_code'] != 200:
+        sys.stderr.write('Request failed: {:s}\n'.format(response['reason']))
+    elif ledger is not None and response['status']:
+        ledger.record_url(response['requestUrl'])
+    
+    fname = async_request_file_name(response)
+    
+    response_json_file = os.path.join(json_destination, fname)
+    try:
+        if verbose:
+            sys.stdout.write('Writing response: {:s}\n'.format(response_json_file))
+            
+        fid = open(response_json_file, 'w')
+        json.dump(response, fid)
+        fid.close()
+    except IOError as e:
+        sys.stderr.write('{:s}\n'.format(e))
+        
+    return bool(response['status'])
     
 if __name__ == '__main__':
 
@@ -102,6 +164,22 @@ if __name__ == '__main__':
         type=int,
         default=120,
         help='Specify the UFrame request timeout, in seconds <Default:120>')
+    arg_parser.add_argument('-c', '--concurrency',
+        type=int,
+        default=1,
+        help='Maximum number of requests sent concurrently to each UFrame instance <Default:1>')
+    arg_parser.add_argument('--rate_limit',
+        type=float,
+        help='Maximum number of requests per second sent to each UFrame instance')
+    arg_parser.add_argument('--ledger',
+        nargs='?',
+        const=default_ledger_path(),
+        help='Record the time range of each successful request in the request ledger <Default:{:s}>'.format(default_ledger_path()))
+    arg_parser.add_argument('--metrics',
+        nargs='?',
+        const='text',
+        choices=['text', 'json'],
+        help='Print the request timings, bytes transferred and retries to STDERR on exit, as a text table <Default> or JSON')
     arg_parser.add_argument('-v', '--verbose',
         help='Print the send status of each request')
 